@@ -0,0 +1,361 @@
+"""
+动作回放缓存
+
+回归任务每晚在相同的画面上执行相同的步骤，每一步都要付出 UI-TARS 的模型推理开销。
+这里记录验证通过的步骤中 UI-TARS 实际执行的底层动作（屏幕坐标的点击、输入、按键），
+以“规范化的步骤文本 + 执行前画面的感知哈希”为键：两者都匹配时直接通过本地输入驱动回放，
+画面不匹配时照常调用 UI-TARS，回放后验证失败时删除该条目并退回 UI-TARS。
+
+原生执行器直接返回屏幕坐标的动作；CLI / 工作进程的动作轨迹中，SDK 已把坐标归一化到 0-1，
+按屏幕尺寸换算。坐标不在 0-1 范围内（坐标空间未知）或动作缺少必需的参数（坐标、输入内容、按键）时不记录，
+避免回放时点到错误的位置或输入错误的内容。
+
+条目按应用版本（ACTION_CACHE_APP_VERSION）区分，版本变化后旧版本的条目不再命中并在加载时清理；
+屏幕分辨率不同的条目也不会命中。缓存保存在本机的 JSON 文件中（坐标只对本机屏幕有效），内容变化时原子写入。
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import config
+from action.action_driver import get_action_driver
+from action.ui_tars_native import CoordinateMapper, parse_action_arguments, UI_TARS_NATIVE_ACTION_DELAY, UI_TARS_NATIVE_WAIT_SECONDS
+from action.ui_tars_trace import UITarsTraceParser
+from util.image_handle import ImageHandle
+from util.json_store import load_json, atomic_write_json
+from util.perceptual_hash import phash, hamming_distance
+from util.step_text import normalize_step
+
+# 是否启用动作回放缓存
+ACTION_CACHE_ENABLED = config.config_dict.get("ACTION_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+# 缓存文件路径
+ACTION_CACHE_PATH = config.config_dict.get("ACTION_CACHE_PATH", "action_cache.json")
+# 被测应用的版本（版本变化后旧条目失效）
+ACTION_CACHE_APP_VERSION = config.config_dict.get("ACTION_CACHE_APP_VERSION", "")
+# 执行前画面的感知哈希（64 位 pHash）允许的最大汉明距离
+ACTION_CACHE_MAX_DISTANCE = int(config.config_dict.get("ACTION_CACHE_MAX_DISTANCE", "4"))
+# 同一步骤最多保留的画面数（超过时淘汰最久未使用的条目）
+ACTION_CACHE_MAX_SCREENS_PER_STEP = int(config.config_dict.get("ACTION_CACHE_MAX_SCREENS_PER_STEP", "5"))
+
+# 不需要回放的动作
+_SKIPPED_ACTIONS = ("finished", "call_user")
+# 动作轨迹中的坐标参数
+_COORDINATE_KEYS = ("start_box", "point", "end_box", "end_point")
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+# 各类动作回放时必需的参数（见 action_driver）
+_REQUIRED_FIELDS = {
+    "click": ("x", "y"),
+    "left_single": ("x", "y"),
+    "left_double": ("x", "y"),
+    "right_single": ("x", "y"),
+    "hover": ("x", "y"),
+    "mouse_move": ("x", "y"),
+    "drag": ("x", "y", "end_x", "end_y"),
+    "select": ("x", "y", "end_x", "end_y"),
+    "type": ("content",),
+    "hotkey": ("key",),
+}
+
+
+def _missing_fields(action: dict) -> List[str]:
+    """动作缺少的必需参数"""
+    return [field for field in _REQUIRED_FIELDS.get(action["type"], ()) if action.get(field) in (None, "")]
+
+
+class ActionCache:
+    """动作回放缓存"""
+
+    def __init__(
+        self,
+        path: str = ACTION_CACHE_PATH,
+        app_version: str = ACTION_CACHE_APP_VERSION,
+        max_distance: int = ACTION_CACHE_MAX_DISTANCE
+    ):
+        """
+        Args:
+            path: 缓存文件路径
+            app_version: 被测应用的版本
+            max_distance: 执行前画面感知哈希允许的最大汉明距离
+        """
+        self.path = path
+        self.app_version = app_version
+        self.max_distance = max_distance
+        self.mapper = CoordinateMapper()
+        # 动作轨迹中已归一化到 0-1 的坐标按屏幕尺寸换算
+        self.normalized_mapper = CoordinateMapper(coordinate_scale=1)
+        self._lock = threading.Lock()
+        # 写入文件的锁与版本号（快照在 _lock 内生成、在锁外写入，避免旧快照覆盖新快照）
+        self._save_lock = threading.Lock()
+        self._version = 0
+        self._saved_version = 0
+        # 规范化的步骤文本 -> 条目列表（只包含当前应用版本的条目）
+        self._entries: Optional[Dict[str, List[dict]]] = None
+        self.lookups = 0
+        self.hits = 0
+        self.screen_mismatches = 0
+        self.replays = 0
+        self.replay_errors = 0
+        self.verification_failures = 0
+        self.recorded = 0
+        self.unknown_coordinates = 0
+        self.incomplete_actions = 0
+        self.invalidated = 0
+
+    def _load(self) -> Dict[str, List[dict]]:
+        """首次使用时加载缓存文件，丢弃其它应用版本的条目"""
+        if self._entries is None:
+            self._entries = {}
+            for entry in load_json(self.path, {}).get("entries", []):
+                if entry.get("app_version") != self.app_version:
+                    self.invalidated += 1
+                    continue
+                self._entries.setdefault(entry["step"], []).append(entry)
+            if self.invalidated:
+                print(f"[动作缓存] 已清理 {self.invalidated} 个其它应用版本的条目")
+                self._write(*self._snapshot())
+        return self._entries
+
+    def _snapshot(self) -> Tuple[int, List[dict]]:
+        """条目变化后的新版本号与所有条目的副本（持有锁时调用）"""
+        self._version += 1
+        return self._version, [dict(entry) for step_entries in self._entries.values() for entry in step_entries]
+
+    def _write(self, version: int, entries: List[dict]):
+        """原子写入缓存文件（比已写入版本旧的快照直接丢弃）"""
+        with self._save_lock:
+            if version <= self._saved_version:
+                return
+            atomic_write_json(self.path, {"entries": entries})
+            self._saved_version = version
+
+    def _find(self, step_key: str, screen_hash: str, screen_size: List[int]) -> Tuple[Optional[dict], Optional[int]]:
+        """查找画面最接近的条目，返回 (条目, 汉明距离)"""
+        best, best_distance = None, None
+        for entry in self._load().get(step_key, []):
+            if entry["screen_size"] != screen_size:
+                continue
+            distance = hamming_distance(entry["screen_hash"], screen_hash)
+            if best_distance is None or distance < best_distance:
+                best, best_distance = entry, distance
+        return best, best_distance
+
+    async def _screen_key(self, image: ImageHandle) -> Tuple[str, List[int]]:
+        """执行前画面的感知哈希与屏幕尺寸"""
+        screen_hash = await asyncio.to_thread(phash, image.data)
+        return screen_hash, list(await self.mapper.screen_size())
+
+    async def lookup(self, step: str, image: Optional[ImageHandle]) -> Optional[dict]:
+        """
+        查找可回放的动作
+
+        Args:
+            step: 步骤文本
+            image: 执行前的截图
+
+        Returns:
+            命中的条目（{"step", "screen_hash", "actions", "distance", ...}），未命中时返回 None
+        """
+        if image is None or not image.data:
+            return None
+        screen_hash, screen_size = await self._screen_key(image)
+        step_key = normalize_step(step)
+        with self._lock:
+            self.lookups += 1
+            entry, distance = self._find(step_key, screen_hash, screen_size)
+            if entry is None or distance > self.max_distance:
+                if entry is not None:
+                    self.screen_mismatches += 1
+                return None
+            self.hits += 1
+            return {**entry, "distance": distance}
+
+    async def replay(self, entry: dict, instruction: str = "") -> dict:
+        """
+        通过本地输入驱动回放条目中的动作
+
+        Returns:
+            与 UITars.run 相同格式的结果，"executor" 为 "replay"
+        """
+        started = time.monotonic()
+        logs = [f"replay screen_hash={entry['screen_hash']} distance={entry.get('distance')}"]
+        error = None
+        try:
+            driver = get_action_driver()
+            for index, action in enumerate(entry["actions"]):
+                if index:
+                    await asyncio.sleep(UI_TARS_NATIVE_ACTION_DELAY)
+                if action["type"] == "wait":
+                    await asyncio.sleep(UI_TARS_NATIVE_WAIT_SECONDS)
+                else:
+                    await asyncio.to_thread(driver.execute, action)
+                logs.append(f"{action['type']} {json.dumps(action, ensure_ascii=False)}")
+        except Exception as e:
+            error = f"回放失败: {type(e).__name__}: {str(e)}"
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self.replays += 1
+            if error:
+                self.replay_errors += 1
+        parser = UITarsTraceParser()
+        parser.feed_text("\n".join(logs))
+        return {
+            "success": error is None,
+            "instruction": instruction,
+            "target": "nut-js",
+            "returncode": 0 if error is None else 1,
+            "stdout": "\n".join(logs),
+            "stderr": error or "",
+            "error": error,
+            "elapsed": round(elapsed, 3),
+            "executor": "replay",
+            "trace": parser.trace(elapsed),
+        }
+
+    async def _actions_of(self, result: dict, image: ImageHandle) -> Optional[List[dict]]:
+        """UI-TARS 执行结果中的动作（屏幕坐标）；坐标空间未知时返回 None"""
+        if result.get("actions") is not None:
+            # 原生执行器直接返回已执行的动作（屏幕坐标）
+            actions = result["actions"]
+        else:
+            # CLI / 工作进程只有动作轨迹，坐标已由 SDK 归一化到 0-1
+            actions = []
+            for action in (result.get("trace") or {}).get("actions", []):
+                # 展示用的 "arguments" 可能被截断，使用完整解析的 "inputs"
+                inputs = action.get("inputs")
+                if inputs is None:
+                    inputs = parse_action_arguments(action["arguments"])
+                values = [
+                    float(number)
+                    for key in _COORDINATE_KEYS if inputs.get(key)
+                    for number in _NUMBER.findall(inputs[key])
+                ]
+                if any(value < 0 or value > 1 for value in values):
+                    return None
+                actions.append(await self.normalized_mapper.resolve({"type": action["type"], "inputs": inputs}, image))
+        return [action for action in actions if action["type"] not in _SKIPPED_ACTIONS]
+
+    async def record(self, step: str, image: Optional[ImageHandle], result: dict) -> bool:
+        """
+        记录验证通过的 UI-TARS 执行结果
+
+        Args:
+            step: 步骤文本
+            image: 执行前的截图
+            result: UITars.run 的执行结果
+
+        Returns:
+            是否写入了缓存
+        """
+        if image is None or not image.data or result.get("executor") == "replay":
+            return False
+        actions = await self._actions_of(result, image)
+        if actions is None:
+            with self._lock:
+                self.unknown_coordinates += 1
+            print(f"[动作缓存] 动作轨迹的坐标不是 0-1 归一化坐标，坐标空间未知，不记录: {step}")
+            return False
+        incomplete = [(action["type"], _missing_fields(action)) for action in actions if _missing_fields(action)]
+        if incomplete:
+            with self._lock:
+                self.incomplete_actions += 1
+            print(f"[动作缓存] 动作缺少必需的参数 {incomplete}，不记录: {step}")
+            return False
+        if not actions:
+            return False
+        screen_hash, screen_size = await self._screen_key(image)
+        step_key = normalize_step(step)
+        now = time.time()
+        with self._lock:
+            entries = self._load().setdefault(step_key, [])
+            existing, distance = self._find(step_key, screen_hash, screen_size)
+            if existing is not None and distance <= self.max_distance:
+                entries.remove(existing)
+            entries.append({
+                "step": step_key,
+                "app_version": self.app_version,
+                "screen_hash": screen_hash,
+                "screen_size": screen_size,
+                "actions": actions,
+                "created_at": now,
+                "last_used_at": now,
+            })
+            if len(entries) > ACTION_CACHE_MAX_SCREENS_PER_STEP:
+                entries.sort(key=lambda entry: entry["last_used_at"])
+                del entries[:len(entries) - ACTION_CACHE_MAX_SCREENS_PER_STEP]
+            self.recorded += 1
+            snapshot = self._snapshot()
+        await asyncio.to_thread(self._write, *snapshot)
+        return True
+
+    async def mark_used(self, entry: dict):
+        """回放验证通过后更新条目的最近使用时间"""
+        with self._lock:
+            for cached in self._load().get(entry["step"], []):
+                if cached["screen_hash"] == entry["screen_hash"]:
+                    cached["last_used_at"] = time.time()
+                    cached["hits"] = cached.get("hits", 0) + 1
+            snapshot = self._snapshot()
+        await asyncio.to_thread(self._write, *snapshot)
+
+    async def invalidate_entry(self, entry: dict):
+        """回放后验证失败：删除该条目，下次执行该步骤时调用 UI-TARS"""
+        with self._lock:
+            self.verification_failures += 1
+            entries = self._load().get(entry["step"], [])
+            remaining = [cached for cached in entries if cached["screen_hash"] != entry["screen_hash"]]
+            self.invalidated += len(entries) - len(remaining)
+            self._entries[entry["step"]] = remaining
+            snapshot = self._snapshot()
+        await asyncio.to_thread(self._write, *snapshot)
+        print(f"[动作缓存] 回放后验证失败，已删除条目: {entry['step']}")
+
+    def clear(self) -> int:
+        """清空缓存（应用版本不变但界面已变化时使用），返回删除的条目数"""
+        with self._lock:
+            count = sum(len(entries) for entries in self._load().values())
+            self._entries = {}
+            self.invalidated += count
+            self._write(*self._snapshot())
+            return count
+
+    def metrics(self) -> dict:
+        """
+        获取缓存指标
+
+        Returns:
+            查找次数、命中次数与命中率、画面不匹配次数、回放与验证失败次数、条目数等
+        """
+        with self._lock:
+            entries = sum(len(step_entries) for step_entries in self._load().values())
+            return {
+                "enabled": ACTION_CACHE_ENABLED,
+                "app_version": self.app_version,
+                "entries": entries,
+                "steps": len(self._entries),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else None,
+                "screen_mismatches": self.screen_mismatches,
+                "replays": self.replays,
+                "replay_errors": self.replay_errors,
+                "verification_failures": self.verification_failures,
+                "recorded": self.recorded,
+                "unknown_coordinates": self.unknown_coordinates,
+                "incomplete_actions": self.incomplete_actions,
+                "invalidated": self.invalidated,
+            }
+
+
+# 全局动作缓存实例
+_action_cache: ActionCache = None
+
+
+def get_action_cache() -> ActionCache:
+    """获取全局动作缓存实例（单例模式）"""
+    global _action_cache
+    if _action_cache is None:
+        _action_cache = ActionCache()
+    return _action_cache
@@ -0,0 +1,235 @@
+"""
+本地输入驱动
+
+原生 UI-TARS 执行器把模型预测的动作（已换算为屏幕坐标）交给输入驱动执行。
+驱动可插拔：内置 pyautogui（桌面）与 dry-run（只记录动作，不操作桌面，用于离线验证），
+也可以通过 register_action_driver 注册自定义驱动。自定义驱动继承 ActionDriver 并实现 execute，
+或继承 DispatchingActionDriver 并实现各类动作的方法。
+
+动作格式: {"type": "click", "x": 100, "y": 200}
+    click / left_double / right_single / hover: x, y
+    drag: x, y, end_x, end_y
+    type: content（以换行结尾时输入后按回车）
+    hotkey: key（空格或 + 分隔，如 "ctrl c"）
+    scroll: x, y（可选）, direction（up / down / left / right）
+"""
+import sys
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional
+
+try:
+    import pyautogui
+    PYAUTOGUI_AVAILABLE = True
+except Exception:
+    # 没有显示环境时导入 pyautogui 也会失败
+    PYAUTOGUI_AVAILABLE = False
+
+try:
+    import pyperclip
+    PYPERCLIP_AVAILABLE = True
+except ImportError:
+    PYPERCLIP_AVAILABLE = False
+
+import config
+
+# 原生执行器使用的输入驱动（pyautogui / dry-run / 自定义注册的名称）
+UI_TARS_ACTION_DRIVER = config.config_dict.get("UI_TARS_ACTION_DRIVER", "pyautogui")
+# 每次滚动的滚轮格数
+ACTION_SCROLL_AMOUNT = int(config.config_dict.get("ACTION_SCROLL_AMOUNT", "5"))
+
+# UI-TARS 按键名与 pyautogui 按键名不一致的部分
+_KEY_ALIASES = {
+    "arrowup": "up",
+    "arrowdown": "down",
+    "arrowleft": "left",
+    "arrowright": "right",
+    "control": "ctrl",
+    "escape": "esc",
+    "return": "enter",
+    "meta": "win",
+    "cmd": "command",
+}
+
+
+def split_keys(key: str) -> List[str]:
+    """把 UI-TARS 的组合键（"ctrl c" / "ctrl+c"）拆分为按键列表"""
+    keys = key.replace("+", " ").lower().split()
+    return [_KEY_ALIASES.get(k, k) for k in keys]
+
+
+class ActionDriver(ABC):
+    """输入驱动基类"""
+
+    name = "base"
+
+    @abstractmethod
+    def execute(self, action: dict):
+        """
+        执行一个动作
+
+        Args:
+            action: 动作（屏幕坐标，见模块说明）
+
+        Raises:
+            ValueError: 不支持的动作类型
+        """
+        raise NotImplementedError
+
+
+class DispatchingActionDriver(ActionDriver):
+    """按动作类型分派到对应方法的输入驱动基类"""
+
+    def execute(self, action: dict):
+        action_type = action["type"]
+        if action_type in ("click", "left_single"):
+            self.click(action["x"], action["y"])
+        elif action_type == "left_double":
+            self.double_click(action["x"], action["y"])
+        elif action_type == "right_single":
+            self.right_click(action["x"], action["y"])
+        elif action_type in ("hover", "mouse_move"):
+            self.move(action["x"], action["y"])
+        elif action_type in ("drag", "select"):
+            self.drag(action["x"], action["y"], action["end_x"], action["end_y"])
+        elif action_type == "type":
+            self.type_text(action.get("content", ""))
+        elif action_type == "hotkey":
+            self.hotkey(split_keys(action.get("key", "")))
+        elif action_type == "scroll":
+            self.scroll(action.get("x"), action.get("y"), action.get("direction", "down"))
+        else:
+            raise ValueError(f"不支持的动作类型: {action_type}")
+
+    @abstractmethod
+    def click(self, x: float, y: float):
+        raise NotImplementedError
+
+    @abstractmethod
+    def double_click(self, x: float, y: float):
+        raise NotImplementedError
+
+    @abstractmethod
+    def right_click(self, x: float, y: float):
+        raise NotImplementedError
+
+    @abstractmethod
+    def move(self, x: float, y: float):
+        raise NotImplementedError
+
+    @abstractmethod
+    def drag(self, x: float, y: float, end_x: float, end_y: float):
+        raise NotImplementedError
+
+    @abstractmethod
+    def type_text(self, content: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def hotkey(self, keys: List[str]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def scroll(self, x: Optional[float], y: Optional[float], direction: str):
+        raise NotImplementedError
+
+
+class PyAutoGUIDriver(DispatchingActionDriver):
+    """通过 pyautogui 操作本机桌面"""
+
+    name = "pyautogui"
+
+    def __init__(self):
+        if not PYAUTOGUI_AVAILABLE:
+            raise RuntimeError("pyautogui 不可用（未安装或没有显示环境），请执行 pip install pyautogui")
+        # 动作之间的等待由执行器控制
+        pyautogui.PAUSE = 0
+
+    def click(self, x: float, y: float):
+        pyautogui.click(x, y)
+
+    def double_click(self, x: float, y: float):
+        pyautogui.doubleClick(x, y)
+
+    def right_click(self, x: float, y: float):
+        pyautogui.rightClick(x, y)
+
+    def move(self, x: float, y: float):
+        pyautogui.moveTo(x, y)
+
+    def drag(self, x: float, y: float, end_x: float, end_y: float):
+        pyautogui.moveTo(x, y)
+        pyautogui.dragTo(end_x, end_y, duration=0.3, button="left")
+
+    def type_text(self, content: str):
+        submit = content.endswith("\n")
+        text = content.rstrip("\n")
+        if text.isascii():
+            pyautogui.write(text)
+        elif PYPERCLIP_AVAILABLE:
+            # pyautogui 无法直接输入中文等非 ASCII 字符，通过剪贴板粘贴
+            pyperclip.copy(text)
+            pyautogui.hotkey("command" if sys.platform == "darwin" else "ctrl", "v")
+        else:
+            raise RuntimeError("输入非 ASCII 文本需要 pyperclip，请执行 pip install pyperclip")
+        if submit:
+            pyautogui.press("enter")
+
+    def hotkey(self, keys: List[str]):
+        pyautogui.hotkey(*keys)
+
+    def scroll(self, x: Optional[float], y: Optional[float], direction: str):
+        if x is not None and y is not None:
+            pyautogui.moveTo(x, y)
+        if direction in ("up", "down"):
+            pyautogui.scroll(ACTION_SCROLL_AMOUNT if direction == "up" else -ACTION_SCROLL_AMOUNT)
+        else:
+            pyautogui.hscroll(ACTION_SCROLL_AMOUNT if direction == "right" else -ACTION_SCROLL_AMOUNT)
+
+
+class DryRunDriver(ActionDriver):
+    """只记录动作、不操作桌面的驱动（离线验证用）"""
+
+    name = "dry-run"
+
+    def __init__(self):
+        self.actions: List[dict] = []
+
+    def execute(self, action: dict):
+        self.actions.append(dict(action))
+        print(f"[输入驱动] dry-run: {action}")
+
+
+# 驱动名称 -> 驱动类
+_DRIVERS: Dict[str, Callable[[], ActionDriver]] = {
+    PyAutoGUIDriver.name: PyAutoGUIDriver,
+    DryRunDriver.name: DryRunDriver,
+}
+
+
+def register_action_driver(name: str, factory: Callable[[], ActionDriver]):
+    """注册自定义输入驱动（之后可通过 UI_TARS_ACTION_DRIVER 选择）"""
+    _DRIVERS[name] = factory
+
+
+# 全局输入驱动实例（按名称缓存）
+_action_drivers: Dict[str, ActionDriver] = {}
+_driver_lock = threading.Lock()
+
+
+def get_action_driver(name: str = UI_TARS_ACTION_DRIVER) -> ActionDriver:
+    """
+    获取输入驱动实例（每种驱动只创建一次）
+
+    Raises:
+        RuntimeError: 驱动不存在或不可用
+    """
+    with _driver_lock:
+        driver = _action_drivers.get(name)
+        if driver is None:
+            factory = _DRIVERS.get(name)
+            if factory is None:
+                raise RuntimeError(f"未知的输入驱动: {name}（可选: {', '.join(_DRIVERS)}）")
+            driver = factory()
+            _action_drivers[name] = driver
+        return driver
@@ -60,16 +60,25 @@ USER_PROMPT = """
 {task}
 """
 
+# 画面状态索引中从当前画面出发、已经成功执行过的步骤路径
+PROVEN_PATHS_PROMPT = """
+# 从当前画面出发已验证可行的步骤路径（仅供参考，与测试任务相关时优先采用）
+{proven_paths}
+"""
+
 
 class DecomposeTaskAction(Action):
 
     def __init__(self, llm: ChatOpenAI):
         super().__init__(name="decompose_task", description="拆解测试任务", llm=llm)
 
-    async def run(self, history_tasks: str, background_knowledge: str, task: str) -> str:
+    async def run(self, history_tasks: str, background_knowledge: str, task: str, proven_paths: str = "") -> str:
+        user_prompt = USER_PROMPT.format(history_tasks=history_tasks, background_knowledge=background_knowledge, task=task)
+        if proven_paths:
+            user_prompt += PROVEN_PATHS_PROMPT.format(proven_paths=proven_paths)
         messages = [
             SystemMessage(content=SYSTEM_PROMPT),
-            HumanMessage(content=USER_PROMPT.format(history_tasks=history_tasks, background_knowledge=background_knowledge, task=task))
+            HumanMessage(content=user_prompt)
         ]
 
         response = await self.llm.ainvoke(messages)
@@ -0,0 +1,160 @@
+"""
+分析前置判断
+
+在调用 AnalyzeStep（多模态 LLM）之前，先在本地对比执行前后的截图（低分辨率灰度图 + 变化区域统计），
+按配置的策略直接得出结论，省去明显不需要 LLM 判断的调用。每次判断都会记录下来用于审计。
+"""
+import json
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+
+import config
+from util.frame_diff import decode_gray_thumbnail, changed_stats
+
+# 是否开启分析前置判断
+ANALYSIS_GATE_ENABLED = config.config_dict.get("ANALYSIS_GATE_ENABLED", "true").lower() in ("1", "true", "yes")
+# 变化像素比例不超过该值视为“画面没有变化”（默认只有完全没有变化才算）
+ANALYSIS_GATE_NO_CHANGE_THRESHOLD = float(config.config_dict.get("ANALYSIS_GATE_NO_CHANGE_THRESHOLD", "0"))
+# 画面没有变化时的策略：fail（直接判定失败，进入优化流程）/ analyze（仍交给 LLM 判断）
+ANALYSIS_GATE_NO_CHANGE_POLICY = config.config_dict.get("ANALYSIS_GATE_NO_CHANGE_POLICY", "fail").lower()
+# 步骤包含这些关键词时，本身就可能不改变界面（如查看、确认），画面没有变化时仍交给 LLM 判断
+ANALYSIS_GATE_PASSIVE_KEYWORDS = [
+    keyword.strip()
+    for keyword in config.config_dict.get(
+        "ANALYSIS_GATE_PASSIVE_KEYWORDS", "查看,检查,确认,验证,观察,等待,复制,截图"
+    ).split(",")
+    if keyword.strip()
+]
+# 判断记录文件（JSON Lines），为空时只打印日志
+ANALYSIS_GATE_AUDIT_LOG = config.config_dict.get("ANALYSIS_GATE_AUDIT_LOG", "")
+# 对比使用的灰度图宽度（像素）
+ANALYSIS_GATE_THUMBNAIL_WIDTH = int(config.config_dict.get("ANALYSIS_GATE_THUMBNAIL_WIDTH", "480"))
+
+# 判断结果
+DECISION_ANALYZE = "analyze"
+DECISION_FAIL = "fail"
+
+
+class AnalysisGate:
+    """分析前置判断：本地对比执行前后截图，按策略决定是否需要 LLM 判断"""
+
+    def __init__(
+        self,
+        no_change_threshold: float = ANALYSIS_GATE_NO_CHANGE_THRESHOLD,
+        no_change_policy: str = ANALYSIS_GATE_NO_CHANGE_POLICY,
+        passive_keywords: Optional[List[str]] = None,
+        audit_log: str = ANALYSIS_GATE_AUDIT_LOG,
+        thumbnail_width: int = ANALYSIS_GATE_THUMBNAIL_WIDTH
+    ):
+        """
+        初始化前置判断
+
+        Args:
+            no_change_threshold: 变化像素比例不超过该值视为没有变化
+            no_change_policy: 画面没有变化时的策略（fail / analyze）
+            passive_keywords: 本身可能不改变界面的步骤关键词
+            audit_log: 判断记录文件路径（JSON Lines），为空时不写文件
+            thumbnail_width: 对比使用的灰度图宽度
+        """
+        self.no_change_threshold = no_change_threshold
+        self.no_change_policy = no_change_policy
+        self.passive_keywords = ANALYSIS_GATE_PASSIVE_KEYWORDS if passive_keywords is None else passive_keywords
+        self.audit_log = audit_log
+        self.thumbnail_width = thumbnail_width
+        self._audit_lock = threading.Lock()
+
+    def expects_change(self, step_text: str) -> bool:
+        """
+        判断步骤执行后界面是否应该发生变化
+
+        Args:
+            step_text: 步骤描述
+
+        Returns:
+            步骤不包含“查看、确认”等关键词时返回 True
+        """
+        return not any(keyword in step_text for keyword in self.passive_keywords)
+
+    def evaluate(self, step_text: str, previous_image: Optional[bytes], current_image: Optional[bytes]) -> dict:
+        """
+        对比执行前后的截图并给出判断
+
+        Args:
+            step_text: 步骤描述
+            previous_image: 执行前的截图
+            current_image: 执行后的截图
+
+        Returns:
+            判断记录: {"decision": analyze / fail, "rule": 命中的规则, "reason": 说明,
+                     "expects_change": 步骤是否应改变界面, "identical": 两张截图字节是否完全相同,
+                     "changed_ratio"/"changed_pixels"/"mean_abs_diff"/"bbox": 变化统计, "elapsed_ms": 耗时}
+        """
+        started = time.perf_counter()
+        record = {
+            "decision": DECISION_ANALYZE,
+            "rule": "default",
+            "reason": "交给 LLM 判断",
+            "step": step_text,
+            "expects_change": self.expects_change(step_text),
+            "identical": False,
+        }
+        try:
+            if not previous_image or not current_image:
+                record["rule"] = "missing_image"
+                record["reason"] = "缺少执行前或执行后的截图"
+            else:
+                record["identical"] = previous_image == current_image
+                if record["identical"]:
+                    record.update({"changed_ratio": 0.0, "changed_pixels": 0, "mean_abs_diff": 0.0, "bbox": None})
+                else:
+                    record.update(changed_stats(
+                        decode_gray_thumbnail(previous_image, self.thumbnail_width),
+                        decode_gray_thumbnail(current_image, self.thumbnail_width)
+                    ))
+                if record["changed_ratio"] <= self.no_change_threshold:
+                    if not record["expects_change"]:
+                        record["rule"] = "no_change_passive_step"
+                        record["reason"] = "画面没有变化，但步骤本身可能不改变界面，交给 LLM 判断"
+                    elif self.no_change_policy == DECISION_FAIL:
+                        record["decision"] = DECISION_FAIL
+                        record["rule"] = "no_change"
+                        record["reason"] = "执行后画面没有任何变化，步骤未生效"
+                    else:
+                        record["rule"] = "no_change"
+                        record["reason"] = "执行后画面没有变化，按策略交给 LLM 判断"
+        except Exception as e:
+            # 前置判断失败时不影响流程，交给 LLM 判断
+            record["rule"] = "error"
+            record["reason"] = f"前置判断失败: {str(e)}"
+        record["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        self._audit(record)
+        return record
+
+    def _audit(self, record: dict):
+        """记录判断结果"""
+        print(
+            f"[分析前置判断] {record['decision']}（规则: {record['rule']}，"
+            f"变化比例: {record.get('changed_ratio')}，耗时: {record['elapsed_ms']}ms）: {record['reason']}"
+        )
+        if not self.audit_log:
+            return
+        try:
+            line = json.dumps({"time": datetime.now().isoformat(), **record}, ensure_ascii=False)
+            with self._audit_lock, open(self.audit_log, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except Exception as e:
+            print(f"[分析前置判断] 写入判断记录失败: {str(e)}")
+
+
+# 全局前置判断实例
+_analysis_gate: AnalysisGate = None
+
+
+def get_analysis_gate() -> AnalysisGate:
+    """获取全局分析前置判断实例（单例模式）"""
+    global _analysis_gate
+    if _analysis_gate is None:
+        _analysis_gate = AnalysisGate()
+    return _analysis_gate
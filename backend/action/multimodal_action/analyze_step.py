@@ -1,8 +1,10 @@
+import asyncio
 from action.multimodal_action.multimodal_action import MultimodalAction
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage
 from typing import Optional, List
 from util.markdown_util import MarkdownUtil
+from util.image_preparation import prepare_step_images
 
 SYSTEM_PROMPT = """
 你是一个UI自动化测试步骤分析助手。
@@ -28,6 +30,9 @@ USER_PROMPT = """
 # 当前执行的步骤
 {current_step}
 
+# 图片说明
+{image_notes}
+
 # 输出结构
 ## 思考
 你的思考过程
@@ -43,29 +48,38 @@ USER_PROMPT = """
 class AnalyzeStep(MultimodalAction):
     def __init__(self, llm: ChatOpenAI):
         super().__init__(name="analyze_step", description="分析步骤", llm=llm)
+        # 最近一次调用发送的图片统计（模式、变化区域、上传字节数与像素数）
+        self.last_image_stats: Optional[dict] = None
 
     async def run(self, history_steps, current_step, previous_image, current_image, task) -> str:
         """
         分析步骤执行结果
         
         Args:
-            previous_image: 执行前的截图
-            current_image: 执行后的截图
+            previous_image: 执行前的截图（字节数据或图片句柄）
+            current_image: 执行后的截图（字节数据或图片句柄）
             step: 步骤描述文本
             
         Returns:
             分析结果文本
         """
-        # 构建图片列表（过滤掉 None 值）
-        images: List = []
-        if previous_image:
-            images.append(previous_image)
-        if current_image:
-            images.append(current_image)
+        # 构建图片列表：全屏缩略图 + 变化区域的局部放大图（变化区域过大时为完整截图）
+        images, image_notes, self.last_image_stats = await asyncio.to_thread(
+            prepare_step_images, previous_image, current_image
+        )
+        print(
+            f"[分析步骤] 发送图片: {self.last_image_stats['mode']}，{self.last_image_stats['images']} 张，"
+            f"{self.last_image_stats['upload_bytes'] / 1024:.0f} KB（原始 {self.last_image_stats['original_bytes'] / 1024:.0f} KB）"
+        )
         
         # 构建多模态消息
-        human_message = self._create_multimodal_message(
-            text=USER_PROMPT.format(history_steps=history_steps, current_step=current_step, task=task),
+        human_message = await self._acreate_multimodal_message(
+            text=USER_PROMPT.format(
+                history_steps=history_steps,
+                current_step=current_step,
+                task=task,
+                image_notes=image_notes
+            ),
             images=images
         )
         
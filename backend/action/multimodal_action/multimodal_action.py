@@ -2,11 +2,16 @@
 多模态 Action 基类
 支持图片输入的多模态 Action，继承自 Action
 """
-import base64
+import asyncio
 from typing import Any, Optional, Union, List, Dict
 from action.action import Action
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage
+from util.image_profile import ImageProfile, resolve_image_profile
+from util.image_handle import ImageHandle
+
+# 支持的图片源：图片句柄、字节数据、data URI 或不带前缀的 base64 字符串
+ImageSource = Union[ImageHandle, bytes, str]
 
 
 class MultimodalAction(Action):
@@ -16,6 +21,11 @@ class MultimodalAction(Action):
     提供图片处理功能，支持：
     - Base64 编码的图片
     - 截图工具生成的图片
+    - 图片句柄（ImageHandle，同一帧在多个 Action 间传递时只编码一次）
+    
+    字节数据与图片句柄发送前按图片规格（按 Action 与模型选择）缩放和编码，
+    每次调用使用的规格与图片大小记录在 image_calls 中。在协程中应使用 _acreate_multimodal_message，
+    缩放与编码在线程中执行，不阻塞事件循环。
     """
     
     def __init__(
@@ -33,67 +43,89 @@ class MultimodalAction(Action):
             llm: LLM 实例（支持多模态的模型）
         """
         super().__init__(name=name, description=description, llm=llm)
+        self._image_profile: Optional[ImageProfile] = None
+        # 每次调用发送的图片规格与大小
+        self.image_calls: List[Dict[str, Any]] = []
+    
+    @property
+    def model_name(self) -> str:
+        """LLM 模型名称"""
+        return getattr(self.llm, "model_name", "") or ""
     
-    def _is_base64(self, data: str) -> bool:
-        """判断是否为 base64 编码的图片"""
-        # 检查是否包含 data URI 前缀
-        if data.startswith("data:image/"):
-            return True
-        # 检查是否为纯 base64 字符串（简单判断）
-        try:
-            base64.b64decode(data, validate=True)
-            return len(data) > 100  # base64 图片通常较长
-        except:
-            return False
+    @property
+    def image_profile(self) -> ImageProfile:
+        """当前 Action 使用的图片规格（首次使用时按 Action 名称与模型选择）"""
+        if self._image_profile is None:
+            self._image_profile = resolve_image_profile(self.name, self.model_name)
+        return self._image_profile
+    
+    def _apply_image_profile(self, images: List[ImageSource]) -> List[ImageHandle]:
+        """
+        让图片符合图片规格，并记录本次调用的规格与大小
+        
+        Args:
+            images: 图片列表（base64 字符串原样发送，不按规格处理）
+        
+        Returns:
+            图片句柄列表
+        """
+        profile = self.image_profile
+        prepared = []
+        image_stats = []
+        for image in images:
+            if isinstance(image, str):
+                prepared.append(ImageHandle.of(image))
+                continue
+            image, stats = ImageHandle.of(image).fit(profile)
+            image_stats.append(stats)
+            prepared.append(image)
+        if image_stats:
+            call = {
+                "action": self.name,
+                "model": self.model_name,
+                "profile": profile.name,
+                "format": profile.image_format,
+                "images": image_stats,
+                "input_bytes": sum(stats["input_bytes"] for stats in image_stats),
+                "upload_bytes": sum(stats["output_bytes"] for stats in image_stats),
+                "cached": sum(1 for stats in image_stats if stats.get("cached")),
+            }
+            self.image_calls.append(call)
+            print(
+                f"[{self.name}] 图片规格 {profile.name}（{profile.image_format}）: "
+                f"{len(image_stats)} 张（复用 {call['cached']} 张），"
+                f"{call['input_bytes'] / 1024:.0f} KB -> {call['upload_bytes'] / 1024:.0f} KB"
+            )
+        return prepared
     
     def _image_to_base64_data_uri(
         self,
-        image_source: Union[str, bytes],
+        image_source: ImageSource,
         mime_type: Optional[str] = None
     ) -> str:
         """
-        将图片转换为 base64 data URI 格式
+        将图片转换为 base64 data URI 格式（图片句柄的 data URI 只计算一次）
         
         Args:
-            image_source: 图片源（base64 字符串或字节数据）
-            mime_type: MIME 类型（如果为 None 则自动推断）
+            image_source: 图片源（图片句柄、base64 字符串或字节数据）
+            mime_type: MIME 类型（如果为 None 则根据文件头推断）
         
         Returns:
             base64 data URI 字符串，格式: data:image/png;base64,...
         """
-        # 如果已经是 data URI 格式，直接返回
-        if isinstance(image_source, str) and image_source.startswith("data:image/"):
-            return image_source
-        
-        # 如果是 base64 字符串（无前缀），添加前缀
-        if isinstance(image_source, str) and self._is_base64(image_source):
-            if not image_source.startswith("data:image/"):
-                mime_type = mime_type or "image/png"
-                return f"data:{mime_type};base64,{image_source}"
-            return image_source
-        
-        # 如果是字节数据
-        if isinstance(image_source, bytes):
-            image_bytes = image_source
-            mime_type = mime_type or "image/png"
-        else:
-            raise ValueError(f"不支持的图片源类型: {type(image_source)}")
-        
-        # 转换为 base64
-        base64_data = base64.b64encode(image_bytes).decode("utf-8")
-        return f"data:{mime_type};base64,{base64_data}"
+        return ImageHandle.of(image_source, mime_type).data_uri
     
     def _create_multimodal_content(
         self,
         text: Optional[str] = None,
-        images: Optional[List[Union[str, bytes]]] = None
+        images: Optional[List[ImageSource]] = None
     ) -> Union[str, List[Dict[str, Any]]]:
         """
         创建多模态消息内容
         
         Args:
             text: 文本内容
-            images: 图片列表（base64 或字节数据）
+            images: 图片列表（图片句柄、base64 或字节数据）
         
         Returns:
             多模态内容（字符串或内容列表）
@@ -102,6 +134,35 @@ class MultimodalAction(Action):
         if not images:
             return text or ""
         
+        # 按图片规格缩放和编码
+        return self._build_multimodal_content(text, self._apply_image_profile(images))
+    
+    async def _acreate_multimodal_content(
+        self,
+        text: Optional[str] = None,
+        images: Optional[List[ImageSource]] = None
+    ) -> Union[str, List[Dict[str, Any]]]:
+        """
+        创建多模态消息内容（图片按规格缩放和编码时可能多次编码，在线程中执行）
+        
+        Args:
+            text: 文本内容
+            images: 图片列表（图片句柄、base64 或字节数据）
+        
+        Returns:
+            多模态内容（字符串或内容列表）
+        """
+        if not images:
+            return text or ""
+        prepared = await asyncio.to_thread(self._apply_image_profile, images)
+        return self._build_multimodal_content(text, prepared)
+    
+    def _build_multimodal_content(
+        self,
+        text: Optional[str],
+        images: List[ImageHandle]
+    ) -> Union[str, List[Dict[str, Any]]]:
+        """用已符合图片规格的图片句柄构建多模态内容"""
         # 构建多模态内容列表
         content_parts = []
         
@@ -129,14 +190,14 @@ class MultimodalAction(Action):
     def _create_multimodal_message(
         self,
         text: Optional[str] = None,
-        images: Optional[List[Union[str, bytes]]] = None
+        images: Optional[List[ImageSource]] = None
     ) -> HumanMessage:
         """
         创建多模态 HumanMessage
         
         Args:
             text: 文本内容
-            images: 图片列表（base64 或字节数据）
+            images: 图片列表（图片句柄、base64 或字节数据）
         
         Returns:
             HumanMessage 实例
@@ -144,13 +205,31 @@ class MultimodalAction(Action):
         content = self._create_multimodal_content(text=text, images=images)
         return HumanMessage(content=content)
     
+    async def _acreate_multimodal_message(
+        self,
+        text: Optional[str] = None,
+        images: Optional[List[ImageSource]] = None
+    ) -> HumanMessage:
+        """
+        创建多模态 HumanMessage（不阻塞事件循环）
+        
+        Args:
+            text: 文本内容
+            images: 图片列表（图片句柄、base64 或字节数据）
+        
+        Returns:
+            HumanMessage 实例
+        """
+        content = await self._acreate_multimodal_content(text=text, images=images)
+        return HumanMessage(content=content)
+    
     async def run(self, **kwargs) -> Any:
         """
         执行 Action（子类需要实现）
         
         子类可以重写此方法，使用以下辅助方法处理多模态输入：
-        - _create_multimodal_content(): 创建多模态内容
-        - _create_multimodal_message(): 创建多模态消息
+        - _create_multimodal_content() / _acreate_multimodal_content(): 创建多模态内容
+        - _create_multimodal_message() / _acreate_multimodal_message(): 创建多模态消息
         - _image_to_base64_data_uri(): 转换图片格式
         
         Args:
@@ -165,7 +244,7 @@ class MultimodalAction(Action):
         """
         raise NotImplementedError("子类必须实现 run 方法")
     
-    def _extract_images_from_kwargs(self, kwargs: Dict[str, Any]) -> List[Union[str, bytes]]:
+    def _extract_images_from_kwargs(self, kwargs: Dict[str, Any]) -> List[ImageSource]:
         """
         从 kwargs 中提取图片参数
         
@@ -52,15 +52,24 @@ USER_PROMPT = """
 {remaining_steps}
 """
 
+# 画面状态索引中从当前画面出发、已经成功执行过的步骤路径
+PROVEN_PATHS_PROMPT = """
+# 从当前画面出发已验证可行的步骤路径（仅供参考，与总任务相关时优先采用）
+{proven_paths}
+"""
+
 
 
 class OptimizeStep(MultimodalAction):
     def __init__(self, llm: ChatOpenAI):
         super().__init__(name="optimize_step", description="优化步骤", llm=llm)
 
-    async def run(self, remaining_steps, current_image, task, history_steps) -> str:
-        human_message = self._create_multimodal_message(
-            text=USER_PROMPT.format(remaining_steps=remaining_steps,history_steps=history_steps,task=task),
+    async def run(self, remaining_steps, current_image, task, history_steps, proven_paths: str = "") -> str:
+        text = USER_PROMPT.format(remaining_steps=remaining_steps,history_steps=history_steps,task=task)
+        if proven_paths:
+            text += PROVEN_PATHS_PROMPT.format(proven_paths=proven_paths)
+        human_message = await self._acreate_multimodal_message(
+            text=text,
             images=[current_image]
         )
         messages = [
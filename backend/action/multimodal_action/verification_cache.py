@@ -0,0 +1,247 @@
+"""
+验证缓存
+
+AnalyzeStep 每一步都调用多模态 LLM 验证，即使某个步骤已经通过了上百次、执行后的画面也完全一样。
+这里按步骤文本保存 LLM 验证通过的（执行前画面, 执行后画面）感知哈希对（已知正确的指纹），
+执行前后的画面都与某个指纹一致时直接在本地判定通过。
+全屏 pHash 对局部变化（勾选复选框、在输入框中输入、选中列表行）不敏感，这类步骤执行前后的哈希几乎相同，
+没点中时的画面也会“一致”。因此只有步骤明显改变了画面（执行前后的哈希距离超过阈值）时才在本地判定，
+否则始终交给 LLM 验证，也不记录指纹。
+命中时仍按采样率抽取一部分交给 LLM 验证：LLM 判定失败说明界面发生了漂移，删除对应指纹。
+指纹保存在本机的 JSON 文件中。
+"""
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+import config
+from util.json_store import load_json, atomic_write_json
+from util.perceptual_hash import dhash, phash, hamming_distance
+from util.step_text import normalize_step
+
+# 是否启用验证缓存
+VERIFICATION_CACHE_ENABLED = config.config_dict.get("VERIFICATION_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+# 指纹文件路径
+VERIFICATION_CACHE_PATH = config.config_dict.get("VERIFICATION_CACHE_PATH", "verification_cache.json")
+# 感知哈希算法: phash（对缩放与压缩更稳定）/ dhash（计算更快）
+VERIFICATION_CACHE_HASH = config.config_dict.get("VERIFICATION_CACHE_HASH", "phash").lower()
+# 与已知正确指纹的最大汉明距离（64 位哈希）
+VERIFICATION_CACHE_MAX_DISTANCE = int(config.config_dict.get("VERIFICATION_CACHE_MAX_DISTANCE", "4"))
+# 命中时仍交给 LLM 验证的比例（用于发现界面漂移）
+VERIFICATION_CACHE_SAMPLE_RATE = float(config.config_dict.get("VERIFICATION_CACHE_SAMPLE_RATE", "0.05"))
+# 同一步骤最多保留的指纹数（超过时淘汰最久未命中的指纹）
+VERIFICATION_CACHE_MAX_FINGERPRINTS = int(config.config_dict.get("VERIFICATION_CACHE_MAX_FINGERPRINTS", "10"))
+
+_HASH_FUNCTIONS = {"phash": phash, "dhash": dhash}
+
+# 判断结果
+DECISION_PASS = "pass"
+DECISION_ANALYZE = "analyze"
+
+
+class VerificationCache:
+    """验证缓存：已知正确的执行后画面指纹"""
+
+    def __init__(
+        self,
+        path: str = VERIFICATION_CACHE_PATH,
+        hash_name: str = VERIFICATION_CACHE_HASH,
+        max_distance: int = VERIFICATION_CACHE_MAX_DISTANCE,
+        sample_rate: float = VERIFICATION_CACHE_SAMPLE_RATE
+    ):
+        """
+        Args:
+            path: 指纹文件路径
+            hash_name: 感知哈希算法（phash / dhash）
+            max_distance: 与已知正确指纹的最大汉明距离
+            sample_rate: 命中时仍交给 LLM 验证的比例
+        """
+        if hash_name not in _HASH_FUNCTIONS:
+            raise ValueError(f"未知的感知哈希算法: {hash_name}（可选: {', '.join(_HASH_FUNCTIONS)}）")
+        self.path = path
+        self.hash_name = hash_name
+        self.max_distance = max_distance
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        # 规范化的步骤文本 -> 指纹列表（只包含当前哈希算法的指纹）
+        self._fingerprints: Optional[Dict[str, List[dict]]] = None
+        self.checks = 0
+        self.hits = 0
+        self.local_passes = 0
+        self.sampled = 0
+        self.drifts = 0
+        self.learned = 0
+
+    def _load(self) -> Dict[str, List[dict]]:
+        """首次使用时加载指纹文件"""
+        if self._fingerprints is None:
+            self._fingerprints = {}
+            for fingerprint in load_json(self.path, {}).get("fingerprints", []):
+                # 没有执行前画面哈希的旧指纹无法判断步骤是否改变了画面，丢弃
+                if fingerprint.get("hash_name") == self.hash_name and fingerprint.get("before_hash"):
+                    self._fingerprints.setdefault(fingerprint["step"], []).append(fingerprint)
+        return self._fingerprints
+
+    def _save(self):
+        """原子写入指纹文件（持有锁时调用）"""
+        fingerprints = [fingerprint for step_fingerprints in self._fingerprints.values() for fingerprint in step_fingerprints]
+        atomic_write_json(self.path, {"fingerprints": fingerprints})
+
+    def _nearest(self, step_key: str, before_hash: str, screen_hash: str) -> tuple:
+        """执行前画面一致的指纹中，执行后画面距离最近的指纹，返回 (指纹, 汉明距离)"""
+        best, best_distance = None, None
+        for fingerprint in self._load().get(step_key, []):
+            if hamming_distance(fingerprint["before_hash"], before_hash) > self.max_distance:
+                continue
+            distance = hamming_distance(fingerprint["hash"], screen_hash)
+            if best_distance is None or distance < best_distance:
+                best, best_distance = fingerprint, distance
+        return best, best_distance
+
+    def _changed(self, before_hash: str, screen_hash: str) -> bool:
+        """步骤是否明显改变了画面（执行前后的哈希距离超过阈值）"""
+        return hamming_distance(before_hash, screen_hash) > self.max_distance
+
+    def check(self, step_text: str, previous_image: Optional[bytes], current_image: Optional[bytes]) -> dict:
+        """
+        判断执行前后的画面是否与已知正确的指纹一致
+
+        Args:
+            step_text: 步骤文本
+            previous_image: 执行前的截图
+            current_image: 执行后的截图
+
+        Returns:
+            {"decision": pass / analyze, "hit", "sampled", "distance", "hash", "before_hash", "reason", "elapsed_ms"}；
+            decision 为 analyze 时需要交给 LLM 验证，之后调用 learn 反馈结果
+        """
+        started = time.perf_counter()
+        record = {
+            "decision": DECISION_ANALYZE, "hit": False, "sampled": False, "distance": None,
+            "hash": None, "before_hash": None, "reason": "没有匹配的已知正确画面",
+        }
+        if previous_image and current_image:
+            try:
+                record["before_hash"] = _HASH_FUNCTIONS[self.hash_name](previous_image)
+                record["hash"] = _HASH_FUNCTIONS[self.hash_name](current_image)
+            except Exception as e:
+                record["hash"] = None
+                record["reason"] = f"计算感知哈希失败: {str(e)}"
+        else:
+            record["reason"] = "缺少执行前或执行后的截图"
+        if record["hash"] is not None and not self._changed(record["before_hash"], record["hash"]):
+            # 局部变化在全屏哈希上看不出来，无法区分“执行成功”与“没点中”
+            record["reason"] = "执行前后的画面哈希几乎相同（可能只有局部变化），交给 LLM 验证"
+        elif record["hash"] is not None:
+            step_key = normalize_step(step_text)
+            with self._lock:
+                self.checks += 1
+                fingerprint, distance = self._nearest(step_key, record["before_hash"], record["hash"])
+                record["distance"] = distance
+                if fingerprint is not None and distance <= self.max_distance:
+                    self.hits += 1
+                    record["hit"] = True
+                    if random.random() < self.sample_rate:
+                        # 抽样交给 LLM 验证，用于发现界面漂移
+                        self.sampled += 1
+                        record["sampled"] = True
+                        record["reason"] = f"命中已知正确画面（汉明距离 {distance}），抽样交给 LLM 验证"
+                    else:
+                        self.local_passes += 1
+                        fingerprint["hits"] = fingerprint.get("hits", 0) + 1
+                        fingerprint["last_hit_at"] = time.time()
+                        record["decision"] = DECISION_PASS
+                        record["reason"] = f"与已知正确画面一致（汉明距离 {distance}），本地判定通过"
+        record["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        print(f"[验证缓存] {record['decision']}（耗时: {record['elapsed_ms']}ms）: {record['reason']}")
+        return record
+
+    def learn(self, step_text: str, check: dict, passed: bool):
+        """
+        根据 LLM 的验证结果更新指纹
+
+        通过且步骤明显改变了画面时记录（或刷新）指纹；抽样验证失败时删除命中的指纹（界面已漂移）。
+
+        Args:
+            step_text: 步骤文本
+            check: check 返回的判断记录
+            passed: LLM 是否判定通过
+        """
+        screen_hash, before_hash = check.get("hash"), check.get("before_hash")
+        if screen_hash is None or before_hash is None:
+            return
+        if passed and not self._changed(before_hash, screen_hash):
+            # 执行前后画面几乎相同的步骤不能在本地判定，不记录指纹
+            return
+        step_key = normalize_step(step_text)
+        now = time.time()
+        with self._lock:
+            fingerprints = self._load().setdefault(step_key, [])
+            if not passed:
+                if not check.get("hit"):
+                    return
+                remaining = [
+                    fingerprint for fingerprint in fingerprints
+                    if hamming_distance(fingerprint["hash"], screen_hash) > self.max_distance
+                    or hamming_distance(fingerprint["before_hash"], before_hash) > self.max_distance
+                ]
+                self.drifts += 1
+                print(f"[验证缓存] 抽样验证失败，删除 {len(fingerprints) - len(remaining)} 个指纹: {step_key}")
+                self._fingerprints[step_key] = remaining
+            else:
+                fingerprint, distance = self._nearest(step_key, before_hash, screen_hash)
+                if fingerprint is not None and distance <= self.max_distance:
+                    fingerprint["last_hit_at"] = now
+                    fingerprint["confirmations"] = fingerprint.get("confirmations", 0) + 1
+                else:
+                    fingerprints.append({
+                        "step": step_key,
+                        "hash_name": self.hash_name,
+                        "before_hash": before_hash,
+                        "hash": screen_hash,
+                        "created_at": now,
+                        "last_hit_at": now,
+                    })
+                    self.learned += 1
+                    if len(fingerprints) > VERIFICATION_CACHE_MAX_FINGERPRINTS:
+                        fingerprints.sort(key=lambda item: item["last_hit_at"])
+                        del fingerprints[:len(fingerprints) - VERIFICATION_CACHE_MAX_FINGERPRINTS]
+            self._save()
+
+    def metrics(self) -> dict:
+        """
+        获取验证缓存指标
+
+        Returns:
+            检查次数、命中次数与命中率、本地通过次数（省去的 LLM 调用）、抽样次数、漂移次数、指纹数等
+        """
+        with self._lock:
+            fingerprints = self._load()
+            return {
+                "enabled": VERIFICATION_CACHE_ENABLED,
+                "hash": self.hash_name,
+                "max_distance": self.max_distance,
+                "sample_rate": self.sample_rate,
+                "fingerprints": sum(len(step_fingerprints) for step_fingerprints in fingerprints.values()),
+                "steps": len(fingerprints),
+                "checks": self.checks,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.checks, 3) if self.checks else None,
+                "local_passes": self.local_passes,
+                "sampled": self.sampled,
+                "drifts": self.drifts,
+                "learned": self.learned,
+            }
+
+
+# 全局验证缓存实例
+_verification_cache: VerificationCache = None
+
+
+def get_verification_cache() -> VerificationCache:
+    """获取全局验证缓存实例（单例模式）"""
+    global _verification_cache
+    if _verification_cache is None:
+        _verification_cache = VerificationCache()
+    return _verification_cache
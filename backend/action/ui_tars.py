@@ -2,15 +2,31 @@
 UI-TARS Desktop Action
 将 UI-TARS 客户端功能直接集成到 Action 中，用于执行桌面自动化任务
 """
-import json
-import subprocess
-import sys
-from pathlib import Path
-from typing import Any, Optional, Tuple
+import asyncio
+import shlex
+import time
+from typing import Any, Optional
 
-from starlette.middleware import P
+import config
 from action.action import Action
 from langchain_openai import ChatOpenAI
+from action.ui_tars_worker import (
+    UITarsWorker,
+    UI_TARS_WORKER_ENABLED,
+    UI_TARS_WORKER_COMMAND,
+    WORKER_DIR,
+    WORKER_SCRIPT,
+)
+from action.ui_tars_launcher import resolve_cli_launcher, write_cli_config
+from action.ui_tars_native import NativeUITarsExecutor, UI_TARS_NATIVE_ENABLED
+from action.ui_tars_trace import UITarsTraceParser, get_trace_metrics
+from util.image_handle import ImageHandle
+from util.process_runner import run_process, ProgressCallback
+
+# 单个步骤的超时时间（秒），超时后结束 CLI 的整个进程组；0 表示不限制
+UI_TARS_STEP_TIMEOUT = float(config.config_dict.get("UI_TARS_STEP_TIMEOUT", "300")) or None
+# 每个输出流保留的最大字节数（超过时只保留最近的输出）
+UI_TARS_OUTPUT_LIMIT = int(config.config_dict.get("UI_TARS_OUTPUT_LIMIT", str(1024 * 1024)))
 
 
 class UITars(Action):
@@ -24,6 +40,8 @@ class UITars(Action):
         model: Optional[str] = None,
         use_responses_api: bool = False,
         ui_tars_cli_path: Optional[str] = None,
+        use_worker: bool = UI_TARS_WORKER_ENABLED,
+        use_native: bool = UI_TARS_NATIVE_ENABLED,
     ):
         """
         初始化 UI-TARS
@@ -35,6 +53,8 @@ class UITars(Action):
             model: 模型名称
             use_responses_api: 是否使用 Responses API
             ui_tars_cli_path: UI-TARS CLI 的路径（如果已安装）
+            use_worker: 是否通过常驻工作进程执行指令（启动失败时退回每次调用 CLI）
+            use_native: 是否在进程内执行指令（输入驱动不可用或使用 Responses API 时退回工作进程 / CLI）
         """
         super().__init__(
             name="ui_tars",
@@ -48,12 +68,9 @@ class UITars(Action):
         self.model = model
         self.use_responses_api = use_responses_api
         
-        # CLI 路径配置
+        # CLI 启动方式（进程内只解析一次）
         self.ui_tars_cli_path = ui_tars_cli_path
-        self.config_file_path = Path.home() / ".ui-tars-cli.json"
-        
-        # 尝试查找本地 UI-TARS-desktop 项目的 CLI
-        self.local_cli_path = self._find_local_cli()
+        self.launcher = resolve_cli_launcher(ui_tars_cli_path)
         
         # 确保配置完整
         if not all([self.base_url, self.api_key, self.model]):
@@ -63,9 +80,44 @@ class UITars(Action):
         
         # 保存配置到 CLI 配置文件
         self._save_cli_config()
+        
+        # 常驻工作进程在第一次执行指令时启动
+        self.use_worker = use_worker
+        self._worker: Optional[UITarsWorker] = None
+        
+        # 原生执行器在第一次执行指令时创建（只操作本机桌面，不支持 Responses API）
+        self.use_native = use_native and not use_responses_api
+        self._native: Optional[NativeUITarsExecutor] = None
+    
+    def _get_native(self) -> NativeUITarsExecutor:
+        """获取原生执行器（首次调用时创建，每个实例只创建一次）"""
+        if self._native is None:
+            self._native = NativeUITarsExecutor(base_url=self.base_url, api_key=self.api_key, model=self.model)
+        return self._native
+    
+    def _get_worker(self) -> UITarsWorker:
+        """获取常驻工作进程（首次调用时创建，每个实例只创建一次）"""
+        if self._worker is None:
+            command = shlex.split(UI_TARS_WORKER_COMMAND) if UI_TARS_WORKER_COMMAND else ["node", WORKER_SCRIPT]
+            self._worker = UITarsWorker(
+                command=command,
+                env={
+                    "UI_TARS_BASE_URL": self.base_url,
+                    "UI_TARS_API_KEY": self.api_key,
+                    "UI_TARS_MODEL": self.model,
+                    "UI_TARS_USE_RESPONSES_API": "true" if self.use_responses_api else "false",
+                },
+                cwd=WORKER_DIR if not UI_TARS_WORKER_COMMAND else None,
+            )
+        return self._worker
+    
+    def close(self):
+        """关闭常驻工作进程"""
+        if self._worker is not None:
+            self._worker.close()
     
     def _save_cli_config(self):
-        """保存配置到 UI-TARS CLI 配置文件"""
+        """保存配置到 UI-TARS CLI 配置文件（内容没有变化时不写入）"""
         config = {
             "baseURL": self.base_url,
             "apiKey": self.api_key,
@@ -74,108 +126,45 @@ class UITars(Action):
         }
         
         try:
-            with open(self.config_file_path, "w", encoding="utf-8") as f:
-                json.dump(config, f, indent=2, ensure_ascii=False)
+            write_cli_config(config)
         except Exception as e:
             print(f"警告: 无法保存 CLI 配置文件: {e}")
     
-    def _find_npx_command(self) -> Optional[str]:
-        """查找可用的 npx 命令"""
-        if sys.platform == "win32":
-            for cmd_name in ["npx.cmd", "npx"]:
-                try:
-                    result = subprocess.run(
-                        ["where", cmd_name],
-                        capture_output=True,
-                        text=True,
-                        timeout=5
-                    )
-                    if result.returncode == 0 and result.stdout.strip():
-                        return cmd_name
-                except:
-                    continue
-        else:
-            try:
-                result = subprocess.run(
-                    ["which", "npx"],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                if result.returncode == 0:
-                    return "npx"
-            except:
-                pass
-        return None
-    
-    
-    def _find_local_cli(self) -> Optional[str]:
-        """查找本地 UI-TARS-desktop 项目的 CLI"""
-        # 从当前文件位置向上查找 UI-TARS-desktop 目录
-        current_file = Path(__file__).resolve()
-        project_root = current_file.parent.parent.parent  # action -> backend -> project root
-        
-        # 可能的 UI-TARS-desktop 路径
-        possible_paths = [
-            project_root / "UI-TARS-desktop" / "packages" / "ui-tars" / "cli" / "bin" / "index.js",
-            project_root.parent / "UI-TARS-desktop" / "packages" / "ui-tars" / "cli" / "bin" / "index.js",
-            Path("UI-TARS-desktop") / "packages" / "ui-tars" / "cli" / "bin" / "index.js",
-        ]
-        
-        for cli_path in possible_paths:
-            if cli_path.exists():
-                return str(cli_path)
-        
-        return None
+    def _attach_trace(self, result: dict, parser: UITarsTraceParser, total_seconds: Optional[float]) -> dict:
+        """把解析出的动作轨迹写入结果并计入全局指标"""
+        trace = parser.trace(total_seconds)
+        result["trace"] = trace
+        get_trace_metrics().record(trace)
+        print(
+            f"[UI-TARS] 动作轨迹: {trace['action_count']} 个动作 {trace['action_types']}，"
+            f"循环 {trace['loop_iterations']} 次，模型 {trace['model_calls']} 次共 {trace['model_ms']:.0f}ms，"
+            f"耗时拆分: {trace['breakdown']}"
+        )
+        return result
     
-    def _check_global_cli(self) -> Tuple[bool, Optional[str]]:
-        """检查全局安装的 UI-TARS CLI 是否可用"""
-        if sys.platform == "win32":
-            # Windows: 检查 ui-tars 命令是否可用
-            try:
-                result = subprocess.run(
-                    ["where", "ui-tars"],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                if result.returncode == 0 and result.stdout.strip():
-                    cli_path = result.stdout.strip().split('\n')[0]
-                    return True, cli_path
-            except:
-                pass
-        else:
-            # Unix-like: 检查 ui-tars 命令是否可用
-            try:
-                result = subprocess.run(
-                    ["which", "ui-tars"],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                if result.returncode == 0:
-                    cli_path = result.stdout.strip()
-                    return True, cli_path
-            except:
-                pass
-        
-        return False, None
+    def _print_progress(self, event: dict):
+        """打印 CLI 的实时输出"""
+        print(f"[UI-TARS] {event['stream']} +{event['elapsed']:.1f}s: {event['line']}")
     
-    def _execute_command(
+    async def _execute_command(
         self,
         instruction: str,
         target: str = "nut-js",
-        timeout: Optional[int] = None,
-        verbose: bool = False
+        timeout: Optional[float] = None,
+        verbose: bool = False,
+        on_progress: Optional[ProgressCallback] = None
     ) -> dict[str, Any]:
         """
         执行自然语言指令（内部方法）
         
+        CLI 的 stdout / stderr 按行实时回调；超时或任务被取消时结束整个进程组（包括 npx 派生的 node 进程）。
+        
         Args:
             instruction: 自然语言指令，例如 "打开微信"、"点击开始菜单" 等
             target: 目标操作器类型，可选值: "nut-js" (桌面), "adb" (Android)
             timeout: 超时时间（秒），None 表示不设置超时
             verbose: 是否显示详细输出
+            on_progress: 进度回调（{"stream", "line", "elapsed"}），为 None 时打印输出
         
         Returns:
             包含执行结果的字典
@@ -183,107 +172,56 @@ class UITars(Action):
         if not instruction or not instruction.strip():
             raise ValueError("指令不能为空")
         
-        # 构建命令
-        # 优先级：1. 用户指定的路径 2. 本地项目 CLI 3. 全局 CLI 4. npx
-        if self.ui_tars_cli_path:
-            cmd = [self.ui_tars_cli_path, "start"]
-        elif self.local_cli_path:
-            cmd = ["node", self.local_cli_path, "start"]
-        else:
-            # 检查全局 CLI 或使用 npx
-            global_cli_installed, cli_path = self._check_global_cli()
-            if global_cli_installed:
-                # 如果 cli_path 存在，根据文件类型决定执行方式
-                if cli_path and Path(cli_path).suffix.lower() == '.js':
-                    cmd = ["node", cli_path, "start"]
-                else:
-                    # 使用命令名称（全局安装的 CLI）
-                    cmd = ["cmd", "/c", "ui-tars", "start"] if sys.platform == "win32" else ["ui-tars", "start"]
-            else:
-                npx_cmd = self._find_npx_command() or "npx"
-                if sys.platform == "win32":
-                    cmd = ["cmd", "/c", npx_cmd, "@ui-tars/cli@latest", "start"]
-                else:
-                    cmd = [npx_cmd, "@ui-tars/cli@latest", "start"]
-        
-        # 添加参数
-        cmd.extend([
-            "-t", target,
-            "-q", instruction.strip()
-        ])
+        # 启动命令在初始化时已解析（指定路径 > 本地项目 CLI > 全局 CLI > 固定版本的 npx）
+        cmd = self.launcher.build("-t", target, "-q", instruction.strip())
         
         if verbose:
             print(f"执行命令: {' '.join(cmd)}")
             print(f"指令: {instruction}")
-            if self.local_cli_path:
-                print(f"使用本地 CLI: {self.local_cli_path}")
-            elif self.ui_tars_cli_path:
-                print(f"使用指定 CLI: {self.ui_tars_cli_path}")
-            else:
-                print("使用全局 CLI 或 npx")
+            print(f"启动方式: {self.launcher.kind}")
+            if self.launcher.cwd:
+                print(f"工作目录: {self.launcher.cwd}")
         
         try:
-            # 设置执行参数
-            shell = sys.platform == "win32" and cmd[0] == "cmd"
-            cwd = None
-            
-            # 如果使用本地 CLI，设置工作目录为 UI-TARS-desktop 根目录
-            if self.local_cli_path and cmd[0] == "node" and self.local_cli_path in cmd[1]:
-                ui_tars_root = Path(self.local_cli_path).parent.parent.parent.parent.parent
-                if ui_tars_root.exists() and (ui_tars_root / "package.json").exists():
-                    cwd = str(ui_tars_root)
-                    if verbose:
-                        print(f"工作目录: {cwd}")
-            
-            result = subprocess.run(
+            result = await run_process(
                 cmd,
-                capture_output=True,
-                text=True,
                 timeout=timeout,
-                encoding="utf-8",
-                errors="replace",
-                shell=shell,
-                cwd=cwd
+                cwd=self.launcher.cwd,
+                on_event=on_progress or self._print_progress,
+                output_limit=UI_TARS_OUTPUT_LIMIT
             )
-            print(result.stderr)
-            
-            # 返回结果
-            return {
-                "success": result.returncode == 0,
-                "instruction": instruction,
-                "target": target,
-                "returncode": result.returncode,
-                "stdout": result.stdout,
-                "stderr": result.stderr,
-                "error": result.stderr if result.returncode != 0 else None
-            }
-        
-        except subprocess.TimeoutExpired:
-            return {
-                "success": False,
-                "instruction": instruction,
-                "target": target,
-                "error": f"执行超时（{timeout}秒）"
-            }
-        
         except FileNotFoundError as e:
-            error_detail = str(e)
             return {
                 "success": False,
                 "instruction": instruction,
                 "target": target,
-                "error": f"找不到命令: {error_detail}"
+                "error": f"找不到命令: {str(e)}"
             }
-        
-        except Exception as e:
-            error_msg = str(e)
-            
+        except OSError as e:
             return {
                 "success": False,
                 "instruction": instruction,
                 "target": target,
-                "error": error_msg
+                "error": str(e)
             }
+        
+        if result["timed_out"]:
+            error = f"执行超时（{timeout}秒）"
+        elif result["returncode"] != 0:
+            error = result["stderr"]
+        else:
+            error = None
+        return {
+            "success": error is None,
+            "instruction": instruction,
+            "target": target,
+            "returncode": result["returncode"],
+            "stdout": result["stdout"],
+            "stderr": result["stderr"],
+            "error": error,
+            "elapsed": result["elapsed"],
+            "output_dropped_bytes": result["stdout_dropped_bytes"] + result["stderr_dropped_bytes"],
+        }
     
     async def run(
         self,
@@ -291,8 +229,10 @@ class UITars(Action):
         query: str = "",
         instruction: Optional[str] = None,
         target: str = "nut-js",
-        timeout: Optional[int] = None,
-        verbose: bool = False
+        timeout: Optional[float] = UI_TARS_STEP_TIMEOUT,
+        verbose: bool = False,
+        on_progress: Optional[ProgressCallback] = None,
+        screenshot: Optional[ImageHandle] = None
     ) -> dict[str, Any]:
         """
         执行自然语言指令
@@ -302,8 +242,10 @@ class UITars(Action):
             query: 执行指令（主要参数，例如 "打开微信"、"点击开始菜单" 等）
             instruction: 自然语言指令（如果提供，将优先使用此参数）
             target: 目标操作器类型，可选值: "nut-js" (桌面), "adb" (Android)
-            timeout: 超时时间（秒），None 表示不设置超时
+            timeout: 单个步骤的超时时间（秒，默认 UI_TARS_STEP_TIMEOUT），None 表示不设置超时
             verbose: 是否显示详细输出
+            on_progress: CLI 输出的进度回调（为 None 时打印输出）
+            screenshot: 执行前的截图（原生执行器第一轮直接使用，不再重新截图）
             
         Returns:
             包含执行结果的字典，格式：
@@ -314,7 +256,8 @@ class UITars(Action):
                 "returncode": int,
                 "stdout": str,
                 "stderr": str,
-                "error": Optional[str]
+                "error": Optional[str],
+                "trace": dict  # 动作轨迹（见 ui_tars_trace.UITarsTraceParser.trace）
             }
         """
         # 优先使用 instruction 参数，否则使用 query 参数
@@ -322,16 +265,48 @@ class UITars(Action):
         
         if not instruction_text or not instruction_text.strip():
             raise ValueError("指令不能为空，请提供 query 或 instruction 参数")
+        instruction_text = instruction_text.strip()
+        parser = UITarsTraceParser()
+        
+        if self.use_native and target == "nut-js":
+            try:
+                native = self._get_native()
+            except RuntimeError as e:
+                print(f"[UI-TARS] 原生执行器不可用，改为工作进程 / CLI: {str(e)}")
+                self.use_native = False
+            else:
+                result = await native.run(instruction_text, target=target, screenshot=screenshot, timeout=timeout)
+                parser.feed_text(result.get("stdout"))
+                return self._attach_trace(result, parser, result.get("elapsed"))
         
-        # 使用 asyncio.to_thread 将同步的 subprocess.run 转换为异步执行
-        # 这样可以避免阻塞事件循环，确保顺序执行
-        import asyncio
-        result = await asyncio.to_thread(
-            self._execute_command,
-            instruction=instruction_text.strip(),
+        if self.use_worker:
+            # 工作进程请求是阻塞调用，放到线程中执行；工作进程自身负责超时
+            started = time.monotonic()
+            try:
+                result = await asyncio.to_thread(
+                    self._get_worker().run, instruction_text, target=target, timeout=timeout
+                )
+                parser.feed_text(result.get("stdout"))
+                return self._attach_trace(result, parser, time.monotonic() - started)
+            except asyncio.CancelledError:
+                # 线程中的请求无法取消：结束工作进程，让桌面不再被继续操作，也不让它一直占着执行锁
+                await asyncio.shield(asyncio.to_thread(self._worker.cancel))
+                raise
+            except RuntimeError as e:
+                print(f"[UI-TARS] 常驻工作进程不可用，改为每次调用 CLI: {str(e)}")
+                self.use_worker = False
+        
+        progress = on_progress or self._print_progress
+        
+        def on_event(event: dict):
+            parser.feed_event(event)
+            progress(event)
+        
+        result = await self._execute_command(
+            instruction=instruction_text,
             target=target,
             timeout=timeout,
-            verbose=verbose
+            verbose=verbose,
+            on_progress=on_event
         )
-        
-        return result
+        return self._attach_trace(result, parser, result.get("elapsed"))
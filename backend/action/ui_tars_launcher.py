@@ -0,0 +1,168 @@
+"""
+UI-TARS CLI 启动方式解析
+
+启动时解析一次 CLI 的启动命令并缓存：指定路径 > 本地 UI-TARS-desktop 项目 > 全局 ui-tars > npx。
+查找只使用 shutil.which，不再为每个步骤执行 which / where 子进程；
+npx 使用固定版本并优先离线缓存，不会每次都访问 npm registry 解析 @latest。
+CLI 配置文件只在内容变化时原子写入。
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import config
+
+# 通过 npx 启动时使用的 @ui-tars/cli 固定版本
+UI_TARS_CLI_VERSION = config.config_dict.get("UI_TARS_CLI_VERSION", "1.2.0")
+# UI-TARS CLI 配置文件路径
+UI_TARS_CLI_CONFIG_PATH = config.config_dict.get("UI_TARS_CLI_CONFIG_PATH", str(Path.home() / ".ui-tars-cli.json"))
+
+LAUNCHER_PATH = "path"
+LAUNCHER_LOCAL = "local"
+LAUNCHER_GLOBAL = "global"
+LAUNCHER_NPX = "npx"
+
+
+class CliLauncher:
+    """解析后的 CLI 启动方式"""
+
+    def __init__(self, kind: str, command: List[str], cwd: Optional[str] = None):
+        """
+        Args:
+            kind: 启动方式（path / local / global / npx）
+            command: 启动命令（不含 -t / -q 参数）
+            cwd: 工作目录
+        """
+        self.kind = kind
+        self.command = command
+        self.cwd = cwd
+
+    def build(self, *args: str) -> List[str]:
+        """拼接完整命令"""
+        return self.command + list(args)
+
+    def to_dict(self) -> dict:
+        """转换为字典"""
+        return {"kind": self.kind, "command": self.command, "cwd": self.cwd}
+
+
+def find_local_cli() -> Optional[str]:
+    """查找本地 UI-TARS-desktop 项目的 CLI"""
+    # 从当前文件位置向上查找 UI-TARS-desktop 目录
+    project_root = Path(__file__).resolve().parent.parent.parent  # action -> backend -> project root
+    possible_paths = [
+        project_root / "UI-TARS-desktop" / "packages" / "ui-tars" / "cli" / "bin" / "index.js",
+        project_root.parent / "UI-TARS-desktop" / "packages" / "ui-tars" / "cli" / "bin" / "index.js",
+        Path("UI-TARS-desktop") / "packages" / "ui-tars" / "cli" / "bin" / "index.js",
+    ]
+    for cli_path in possible_paths:
+        if cli_path.exists():
+            return str(cli_path)
+    return None
+
+
+def _windows_wrap(command: List[str]) -> List[str]:
+    """Windows 上的 .cmd 脚本通过 cmd /c 启动"""
+    return ["cmd", "/c"] + command if sys.platform == "win32" else command
+
+
+def _resolve(cli_path: Optional[str]) -> CliLauncher:
+    """按优先级解析启动方式"""
+    if cli_path:
+        return CliLauncher(LAUNCHER_PATH, [cli_path, "start"])
+
+    local_cli = find_local_cli()
+    if local_cli:
+        # 工作目录设为 UI-TARS-desktop 根目录（packages/ui-tars/cli/bin/index.js 向上 5 级）
+        ui_tars_root = Path(local_cli).parent.parent.parent.parent.parent
+        cwd = str(ui_tars_root) if (ui_tars_root / "package.json").exists() else None
+        return CliLauncher(LAUNCHER_LOCAL, ["node", local_cli, "start"], cwd)
+
+    global_cli = shutil.which("ui-tars")
+    if global_cli:
+        if Path(global_cli).suffix.lower() == ".js":
+            return CliLauncher(LAUNCHER_GLOBAL, ["node", global_cli, "start"])
+        return CliLauncher(LAUNCHER_GLOBAL, _windows_wrap([global_cli, "start"]))
+
+    npx = shutil.which("npx") or "npx"
+    return CliLauncher(
+        LAUNCHER_NPX,
+        _windows_wrap([npx, "--yes", "--prefer-offline", f"@ui-tars/cli@{UI_TARS_CLI_VERSION}", "start"]),
+    )
+
+
+# 指定路径 -> 解析结果（进程内只解析一次）
+_launchers: Dict[Optional[str], CliLauncher] = {}
+_launcher_lock = threading.Lock()
+
+
+def resolve_cli_launcher(cli_path: Optional[str] = None) -> CliLauncher:
+    """
+    获取 CLI 启动方式（首次调用时解析并打印选择结果，之后直接返回缓存）
+
+    Args:
+        cli_path: 用户指定的 CLI 路径
+
+    Returns:
+        启动方式
+    """
+    with _launcher_lock:
+        launcher = _launchers.get(cli_path)
+        if launcher is None:
+            launcher = _resolve(cli_path)
+            _launchers[cli_path] = launcher
+            print(f"[UI-TARS] 启动方式: {launcher.kind}，命令: {' '.join(launcher.command)}")
+        return launcher
+
+
+# 最近一次写入（或确认无需写入）的 CLI 配置
+_written_cli_config: Optional[dict] = None
+_config_lock = threading.Lock()
+
+
+def write_cli_config(cli_config: dict, path: str = UI_TARS_CLI_CONFIG_PATH) -> bool:
+    """
+    写入 CLI 配置文件：内容没有变化时跳过，变化时先写临时文件再原子替换
+
+    Args:
+        cli_config: 配置内容
+        path: 配置文件路径
+
+    Returns:
+        是否写入了文件
+    """
+    global _written_cli_config
+    with _config_lock:
+        if _written_cli_config == cli_config:
+            return False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                if json.load(f) == cli_config:
+                    _written_cli_config = dict(cli_config)
+                    return False
+        except (OSError, ValueError):
+            pass
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(prefix=".ui-tars-cli.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(cli_config, f, indent=2, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            # 配置包含 API 密钥，只允许当前用户读写
+            os.chmod(temp_path, 0o600)
+            os.replace(temp_path, path)
+        except Exception:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+        _written_cli_config = dict(cli_config)
+        print(f"[UI-TARS] 已更新 CLI 配置文件: {path}")
+        return True
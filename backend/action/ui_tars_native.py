@@ -0,0 +1,369 @@
+"""
+原生 UI-TARS 执行器
+
+在当前进程内完成 UI-TARS 的“截图 -> 模型预测 -> 执行动作”循环，不再为每个步骤启动 Node CLI：
+- 模型调用通过共享的 httpx 连接池（keep-alive / HTTP/2）访问 UI_TARS_BASE_URL 的 OpenAI 兼容接口
+- 第一轮直接使用执行图已经截取的“执行前截图”
+- 动作通过可插拔的输入驱动执行（见 action_driver）
+
+每个动作按工作进程日志的格式（"<type> {inputs} cost=<ms>"）记录在 stdout 中，动作轨迹解析方式与 CLI / 工作进程一致。
+"""
+import asyncio
+import io
+import json
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+import config
+from action.action_driver import ActionDriver, get_action_driver
+from util.http_client import get_http_client
+from util.image_handle import ImageHandle
+from util.screenshot_util import ScreenshotUtil, capture_async, smart_resize, MAX_PIXELS_V1_5
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# 是否在进程内执行 UI-TARS 指令（不启动 CLI / 工作进程；输入驱动不可用时退回原有方式）
+UI_TARS_NATIVE_ENABLED = config.config_dict.get("UI_TARS_NATIVE_ENABLED", "false").lower() in ("1", "true", "yes")
+# 单条指令最多的“截图 -> 预测 -> 动作”循环次数
+UI_TARS_NATIVE_MAX_LOOPS = int(config.config_dict.get("UI_TARS_NATIVE_MAX_LOOPS", "25"))
+# 每次请求携带的最近截图数（更早的轮次只保留模型输出的文本）
+UI_TARS_NATIVE_HISTORY_IMAGES = int(config.config_dict.get("UI_TARS_NATIVE_HISTORY_IMAGES", "5"))
+# 模型坐标的归一化范围（UI-TARS 1.0 为 1000）；0 表示坐标为发送图片经 smart_resize 后的像素坐标（UI-TARS 1.5）
+UI_TARS_COORDINATE_SCALE = float(config.config_dict.get("UI_TARS_COORDINATE_SCALE", "1000"))
+# 像素坐标模式下 smart_resize 的最大像素数（与模型服务端的图片处理配置一致）
+UI_TARS_SMART_RESIZE_MAX_PIXELS = int(config.config_dict.get("UI_TARS_SMART_RESIZE_MAX_PIXELS", str(MAX_PIXELS_V1_5)))
+# 执行动作后到下一次截图前的等待时间（秒）
+UI_TARS_NATIVE_ACTION_DELAY = float(config.config_dict.get("UI_TARS_NATIVE_ACTION_DELAY", "0.5"))
+# wait() 动作的等待时间（秒）
+UI_TARS_NATIVE_WAIT_SECONDS = float(config.config_dict.get("UI_TARS_NATIVE_WAIT_SECONDS", "5"))
+# Thought 使用的语言
+UI_TARS_NATIVE_LANGUAGE = config.config_dict.get("UI_TARS_NATIVE_LANGUAGE", "Chinese")
+
+# 与 @ui-tars/sdk 的桌面 (computer use) 提示词一致
+COMPUTER_USE_PROMPT = """You are a GUI agent. You are given a task and your action history, with screenshots. You need to perform the next action to complete the task.
+
+## Output Format
+```
+Thought: ...
+Action: ...
+```
+
+## Action Space
+
+click(start_box='[x1, y1, x2, y2]')
+left_double(start_box='[x1, y1, x2, y2]')
+right_single(start_box='[x1, y1, x2, y2]')
+drag(start_box='[x1, y1, x2, y2]', end_box='[x3, y3, x4, y4]')
+hotkey(key='')
+type(content='') #If you want to submit your input, use "\\n" at the end of `content`.
+scroll(start_box='[x1, y1, x2, y2]', direction='down or up or right or left')
+wait() #Sleep for 5s and take a screenshot to check for any changes.
+finished()
+call_user() # Submit the task and call the user when the task is unsolvable, or when you need the user's help.
+
+## Note
+- Use {language} in `Thought` part.
+- Write a small plan and finally summarize your next action (with its target element) in one sentence in `Thought` part.
+
+## User Instruction
+{instruction}
+"""
+
+_THOUGHT = re.compile(r"Thought:\s*(.*?)\s*(?=Action:|$)", re.DOTALL)
+_ACTION_CALL = re.compile(r"(\w+)\((.*)\)\s*$", re.DOTALL)
+# 参数: key='value' / key="value"（值中允许转义字符）
+_ARGUMENT = re.compile(r"(\w+)\s*=\s*(?:'((?:\\.|[^'\\])*)'|\"((?:\\.|[^\"\\])*)\")", re.DOTALL)
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+# 结束循环的动作
+_FINISHED = "finished"
+_CALL_USER = "call_user"
+_WAIT = "wait"
+
+
+def _unescape(value: str) -> str:
+    """还原模型输出中的转义字符（\\n、\\'、\\\"）"""
+    return value.replace("\\n", "\n").replace("\\'", "'").replace('\\"', '"').replace("\\\\", "\\")
+
+
+def parse_action_arguments(arguments: str) -> Dict[str, str]:
+    """
+    解析动作参数
+
+    Args:
+        arguments: JSON（工作进程日志）或 key='value' 形式（模型原始输出）的参数
+
+    Returns:
+        {参数名: 原始值}
+    """
+    try:
+        inputs = json.loads(arguments)
+        if isinstance(inputs, dict):
+            return {key: str(value) for key, value in inputs.items()}
+    except ValueError:
+        pass
+    return {
+        key: _unescape(single if single is not None else double)
+        for key, single, double in _ARGUMENT.findall(arguments)
+    }
+
+
+def parse_prediction(text: str) -> Tuple[Optional[str], List[dict]]:
+    """
+    解析模型输出
+
+    Args:
+        text: 模型输出（"Thought: ...\\nAction: click(start_box='(100,200)')"）
+
+    Returns:
+        (思考内容, 动作列表)；动作为 {"type", "inputs": {参数名: 原始值}}，多个动作之间以空行分隔
+    """
+    thought_match = _THOUGHT.search(text)
+    thought = thought_match.group(1).strip() if thought_match else None
+    action_text = text.split("Action:", 1)[1] if "Action:" in text else text
+    actions = []
+    for block in re.split(r"\n\s*\n", action_text.strip()):
+        call = _ACTION_CALL.match(block.strip())
+        if not call:
+            continue
+        actions.append({"type": call.group(1), "inputs": parse_action_arguments(call.group(2))})
+    return thought, actions
+
+
+def _box_center(value: str) -> Optional[Tuple[float, float]]:
+    """坐标参数的中心点：4 个数为区域，2 个数为点"""
+    numbers = [float(number) for number in _NUMBER.findall(value)]
+    if len(numbers) >= 4:
+        return (numbers[0] + numbers[2]) / 2, (numbers[1] + numbers[3]) / 2
+    if len(numbers) >= 2:
+        return numbers[0], numbers[1]
+    return None
+
+
+class CoordinateMapper:
+    """把模型输出的坐标换算为屏幕坐标"""
+
+    def __init__(self, coordinate_scale: float = UI_TARS_COORDINATE_SCALE):
+        """
+        Args:
+            coordinate_scale: 模型坐标的归一化范围，0 表示发送图片经 smart_resize 后的像素坐标
+        """
+        self.coordinate_scale = coordinate_scale
+        self._screen_size: Optional[Tuple[int, int]] = None
+
+    async def screen_size(self) -> Tuple[int, int]:
+        """屏幕尺寸（首次调用时获取后缓存）"""
+        if self._screen_size is None:
+            self._screen_size = await asyncio.to_thread(ScreenshotUtil.get_screen_size)
+        return self._screen_size
+
+    @staticmethod
+    def _image_size(image: ImageHandle) -> Tuple[int, int]:
+        """图片尺寸（只读取文件头）"""
+        if not PIL_AVAILABLE:
+            raise RuntimeError("按像素坐标换算需要 Pillow，请执行 pip install Pillow")
+        with Image.open(io.BytesIO(image.data)) as img:
+            return img.size
+
+    async def _to_screen(self, value: str, image: ImageHandle) -> Optional[Tuple[int, int]]:
+        """把模型输出的坐标换算为屏幕坐标"""
+        center = _box_center(value)
+        if center is None:
+            return None
+        screen_width, screen_height = await self.screen_size()
+        if self.coordinate_scale > 0:
+            width = height = self.coordinate_scale
+        else:
+            # UI-TARS 1.5 的坐标基于模型实际看到的尺寸（宽高取整到 28 的倍数并限制总像素数），而不是发送图片的原始尺寸
+            width, height = smart_resize(*self._image_size(image), max_pixels=UI_TARS_SMART_RESIZE_MAX_PIXELS)
+        return round(center[0] / width * screen_width), round(center[1] / height * screen_height)
+
+    async def resolve(self, action: dict, image: ImageHandle) -> dict:
+        """
+        把模型动作转换为输入驱动的动作
+
+        Args:
+            action: {"type", "inputs": {参数名: 原始值}}
+            image: 模型预测时看到的截图（按像素坐标换算时使用其尺寸）
+
+        Returns:
+            屏幕坐标的动作（见 action_driver）
+        """
+        inputs = action["inputs"]
+        resolved = {"type": action["type"]}
+        start = inputs.get("start_box") or inputs.get("point")
+        if start:
+            point = await self._to_screen(start, image)
+            if point is not None:
+                resolved["x"], resolved["y"] = point
+        end = inputs.get("end_box") or inputs.get("end_point")
+        if end:
+            point = await self._to_screen(end, image)
+            if point is not None:
+                resolved["end_x"], resolved["end_y"] = point
+        for key in ("content", "key", "direction"):
+            if key in inputs:
+                resolved[key] = inputs[key]
+        return resolved
+
+
+class NativeUITarsExecutor:
+    """在进程内执行 UI-TARS 指令"""
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        model: str,
+        driver: Optional[ActionDriver] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+        max_loops: int = UI_TARS_NATIVE_MAX_LOOPS,
+        coordinate_scale: float = UI_TARS_COORDINATE_SCALE
+    ):
+        """
+        Args:
+            base_url: VLM 模型的基础 URL（OpenAI 兼容接口）
+            api_key: API 密钥
+            model: 模型名称
+            driver: 输入驱动（为 None 时使用 UI_TARS_ACTION_DRIVER 指定的驱动）
+            http_client: HTTP 客户端（为 None 时使用全局共享连接池）
+            max_loops: 最大循环次数
+            coordinate_scale: 模型坐标的归一化范围，0 表示发送图片经 smart_resize 后的像素坐标
+
+        Raises:
+            RuntimeError: 输入驱动不可用
+        """
+        self.endpoint = base_url.rstrip("/") + "/chat/completions"
+        self.api_key = api_key
+        self.model = model
+        self.driver = driver or get_action_driver()
+        self._http_client = http_client
+        self.max_loops = max_loops
+        self.mapper = CoordinateMapper(coordinate_scale)
+
+    async def _predict(self, messages: List[dict]) -> Tuple[str, float]:
+        """调用模型，返回 (模型输出, 耗时毫秒)"""
+        client = self._http_client or get_http_client()
+        started = time.perf_counter()
+        response = await client.post(
+            self.endpoint,
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            json={
+                "model": self.model,
+                "messages": messages,
+                "temperature": 0,
+                "max_tokens": 1000,
+            },
+        )
+        response.raise_for_status()
+        content = response.json()["choices"][0]["message"]["content"] or ""
+        return content, (time.perf_counter() - started) * 1000
+
+    def _build_messages(self, instruction: str, history: List[Tuple[ImageHandle, Optional[str]]]) -> List[dict]:
+        """构造请求消息：提示词 + 各轮截图与模型输出（只保留最近几张截图）"""
+        prompt = COMPUTER_USE_PROMPT.format(language=UI_TARS_NATIVE_LANGUAGE, instruction=instruction)
+        messages = [{"role": "user", "content": prompt}]
+        first_image = max(0, len(history) - UI_TARS_NATIVE_HISTORY_IMAGES)
+        for index, (image, prediction) in enumerate(history):
+            if index >= first_image:
+                messages.append({
+                    "role": "user",
+                    "content": [{"type": "image_url", "image_url": {"url": image.data_uri}}],
+                })
+            if prediction is not None:
+                messages.append({"role": "assistant", "content": prediction})
+        return messages
+
+    async def _loop(
+        self,
+        instruction: str,
+        screenshot: Optional[ImageHandle],
+        logs: List[str],
+        executed: List[dict]
+    ) -> Tuple[bool, Optional[str], int]:
+        """执行循环，返回 (是否完成, 错误信息, 循环次数)"""
+        history: List[Tuple[ImageHandle, Optional[str]]] = []
+        for loop in range(1, self.max_loops + 1):
+            if screenshot is None:
+                image_bytes, _ = await capture_async()
+                screenshot = ImageHandle(image_bytes)
+            history.append((screenshot, None))
+            prediction, cost_ms = await self._predict(self._build_messages(instruction, history))
+            history[-1] = (screenshot, prediction)
+            thought, actions = parse_prediction(prediction)
+            if thought:
+                logs.append(f"Thought: {thought}")
+            if not actions:
+                return False, f"无法解析模型输出: {prediction[:200]}", loop
+            for index, action in enumerate(actions):
+                # 同一次预测的多个动作共享一次模型调用，耗时只记在第一个动作上
+                cost = f" cost={cost_ms:.0f}ms" if index == 0 else ""
+                logs.append(f"{action['type']} {json.dumps(action['inputs'], ensure_ascii=False)}{cost}")
+                if action["type"] == _FINISHED:
+                    return True, None, loop
+                if action["type"] == _CALL_USER:
+                    return False, "模型请求用户协助（call_user）", loop
+                if action["type"] == _WAIT:
+                    await asyncio.sleep(UI_TARS_NATIVE_WAIT_SECONDS)
+                    executed.append({"type": _WAIT})
+                    continue
+                resolved = await self.mapper.resolve(action, screenshot)
+                await asyncio.to_thread(self.driver.execute, resolved)
+                executed.append(resolved)
+            screenshot = None
+            await asyncio.sleep(UI_TARS_NATIVE_ACTION_DELAY)
+        return False, f"超过最大循环次数（{self.max_loops}）", self.max_loops
+
+    async def run(
+        self,
+        instruction: str,
+        target: str = "nut-js",
+        screenshot: Optional[ImageHandle] = None,
+        timeout: Optional[float] = None
+    ) -> Dict:
+        """
+        执行自然语言指令
+
+        Args:
+            instruction: 自然语言指令
+            target: 目标操作器类型（只用于结果记录，原生执行器只操作本机桌面）
+            screenshot: 执行前的截图（为 None 时重新截图）
+            timeout: 超时时间（秒），None 表示不限制
+
+        Returns:
+            与 CLI 执行结果相同格式的字典，另含 "executor": "native"、"loops" 与已执行的动作 "actions"（屏幕坐标）
+        """
+        started = time.monotonic()
+        logs: List[str] = []
+        executed: List[dict] = []
+        loops = 0
+        try:
+            success, error, loops = await asyncio.wait_for(self._loop(instruction, screenshot, logs, executed), timeout)
+        except asyncio.TimeoutError:
+            success, error = False, f"执行超时（{timeout}秒）"
+        except httpx.HTTPError as e:
+            success, error = False, f"模型调用失败: {str(e)}"
+        except Exception as e:
+            success, error = False, f"{type(e).__name__}: {str(e)}"
+        if loops:
+            logs.append(f"loop_count={loops}")
+        return {
+            "success": success,
+            "instruction": instruction,
+            "target": target,
+            "returncode": 0 if success else 1,
+            "stdout": "\n".join(logs),
+            "stderr": error or "",
+            "error": error,
+            "elapsed": round(time.monotonic() - started, 3),
+            "executor": "native",
+            "loops": loops,
+            "actions": executed,
+        }
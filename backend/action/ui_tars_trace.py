@@ -0,0 +1,248 @@
+"""
+UI-TARS 动作轨迹
+
+把 UI-TARS 的输出（CLI 的逐行输出或常驻工作进程返回的日志）解析为结构化的动作轨迹：
+预测的动作、坐标、模型调用耗时与循环次数，并结合输出时间把步骤耗时拆分为
+进程启动、模型推理和动作执行（含其它开销）三部分。轨迹写入 step_results，并在全局指标中汇总。
+动作的 "arguments" 只保留前 500 个字符用于展示，完整的参数解析在 "inputs" 中（动作回放缓存据此重建动作）。
+"""
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+from action.ui_tars_native import parse_action_arguments
+
+# 模型原始输出: Action: click(start_box='(100,200)')
+_RAW_ACTION = re.compile(r"Action:\s*(\w+)\((.*)\)\s*$")
+# 解析后的 JSON: "action_type": "click", "action_inputs": {...}
+_JSON_ACTION_TYPE = re.compile(r"\"action_type\"\s*:\s*\"(\w+)\"")
+_JSON_ACTION_INPUTS = re.compile(r"\"action_inputs\"\s*:\s*(\{[^{}]*\})")
+# 工作进程日志: click {"start_box": "(100,200)"} cost=1234ms
+_WORKER_ACTION = re.compile(r"^(\w+)\s+(\{.*\})(?:\s+cost=\d+(?:\.\d+)?ms)?\s*$")
+# Thought: ...
+_THOUGHT = re.compile(r"Thought:\s*(.+)$")
+# 参数键值对（值为括号、方括号或引号包围的内容）
+_KEY_VALUE = re.compile(r"[\"']?(\w+)[\"']?\s*[=:]\s*(\[[^\]]*\]|\([^)]*\)|'[^']*'|\"[^\"]*\")")
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+# 模型调用耗时（只匹配固定位置的标记，不在动作参数等自由文本中查找，每行最多一次）:
+#   工作进程日志行尾: click {...} cost=1234ms
+#   SDK 对话记录的 timing 字段: "timing": {"start": ..., "end": ..., "cost": 1234}
+#   SDK 日志前缀: [UITarsModel] cost: 1234ms / [GUIAgent] costTime: 1.2s
+_LATENCIES = (
+    re.compile(r"\scost=(\d+(?:\.\d+)?)(ms)\s*$"),
+    re.compile(r"\"timing\"\s*:\s*\{[^{}]*\"cost\"\s*:\s*(\d+(?:\.\d+)?)()"),
+    re.compile(r"^\[(?:UITarsModel|GUIAgent)[^\]]*\]\s*(?:costTime|cost|latency)\s*[=:：]\s*(\d+(?:\.\d+)?)\s*(ms|s)?", re.IGNORECASE),
+)
+# 循环次数: loopCnt: 3 / loop_count=3
+_LOOP = re.compile(r"loop_?(?:cnt|count|iteration)s?[\"']?\s*[=:：]\s*(\d+)", re.IGNORECASE)
+
+# 多种格式同时出现时（同一个动作可能既打印原始输出又打印解析结果），只采用信息最完整的一种
+_SOURCE_PRIORITY = ("json", "worker", "raw")
+
+
+def _coordinates(arguments: str) -> List[dict]:
+    """从动作参数中提取坐标：4 个数为区域（取中心点），2 个数为点"""
+    coordinates = []
+    for key, value in _KEY_VALUE.findall(arguments):
+        key = key.lower()
+        if not (key.endswith("box") or key.endswith("coords") or key.endswith("point")):
+            continue
+        numbers = [float(number) for number in _NUMBER.findall(value)]
+        if len(numbers) >= 4:
+            x1, y1, x2, y2 = numbers[:4]
+            coordinates.append({"name": key, "x": (x1 + x2) / 2, "y": (y1 + y2) / 2, "box": [x1, y1, x2, y2]})
+        elif len(numbers) >= 2:
+            coordinates.append({"name": key, "x": numbers[0], "y": numbers[1]})
+    return coordinates
+
+
+class UITarsTraceParser:
+    """逐行解析 UI-TARS 输出，生成动作轨迹"""
+
+    def __init__(self):
+        self._actions: Dict[str, List[dict]] = {source: [] for source in _SOURCE_PRIORITY}
+        self._thought: Optional[str] = None
+        self.model_latencies_ms: List[float] = []
+        self.loop_iterations = 0
+        self.first_output_at: Optional[float] = None
+        self.last_output_at: Optional[float] = None
+        self.lines = 0
+
+    def feed_event(self, event: dict):
+        """解析一条进度事件（process_runner 的 {"stream", "line", "elapsed"}）"""
+        self.feed(event["line"], event.get("elapsed"))
+
+    def feed_text(self, text: Optional[str]):
+        """解析一段完整输出（没有逐行时间）"""
+        for line in (text or "").splitlines():
+            self.feed(line)
+
+    def feed(self, line: str, elapsed: Optional[float] = None):
+        """
+        解析一行输出
+
+        Args:
+            line: 输出行
+            elapsed: 该行距进程启动的秒数（未知时为 None）
+        """
+        line = line.strip()
+        if not line:
+            return
+        self.lines += 1
+        if elapsed is not None:
+            if self.first_output_at is None:
+                self.first_output_at = elapsed
+            self.last_output_at = elapsed
+
+        thought = _THOUGHT.search(line)
+        if thought:
+            self._thought = thought.group(1).strip()
+
+        for pattern in _LATENCIES:
+            match = pattern.search(line)
+            if match:
+                value = float(match.group(1))
+                self.model_latencies_ms.append(value * 1000 if (match.group(2) or "").lower() == "s" else value)
+                break
+
+        for match in _LOOP.finditer(line):
+            self.loop_iterations = max(self.loop_iterations, int(match.group(1)))
+
+        action_type = _JSON_ACTION_TYPE.search(line)
+        if action_type:
+            inputs = _JSON_ACTION_INPUTS.search(line)
+            self._add("json", action_type.group(1), inputs.group(1) if inputs else "", elapsed)
+            return
+        worker_action = _WORKER_ACTION.match(line)
+        if worker_action:
+            self._add("worker", worker_action.group(1), worker_action.group(2), elapsed)
+            return
+        raw_action = _RAW_ACTION.search(line)
+        if raw_action:
+            self._add("raw", raw_action.group(1), raw_action.group(2), elapsed)
+
+    def _add(self, source: str, action_type: str, arguments: str, elapsed: Optional[float]):
+        self._actions[source].append({
+            "type": action_type,
+            "coordinates": _coordinates(arguments),
+            "arguments": arguments[:500],
+            "inputs": parse_action_arguments(arguments),
+            "thought": self._thought,
+            "at": elapsed,
+        })
+        self._thought = None
+
+    @property
+    def actions(self) -> List[dict]:
+        """采用信息最完整的一种格式解析出的动作"""
+        for source in _SOURCE_PRIORITY:
+            if self._actions[source]:
+                return self._actions[source]
+        return []
+
+    def trace(self, total_seconds: Optional[float] = None) -> dict:
+        """
+        生成动作轨迹
+
+        Args:
+            total_seconds: 步骤总耗时（秒）
+
+        Returns:
+            {"actions", "action_count", "action_types", "loop_iterations", "model_calls", "model_ms",
+             "total_s", "breakdown": {"startup_s", "model_s", "action_and_overhead_s"}}
+        """
+        actions = self.actions
+        model_ms = round(sum(self.model_latencies_ms), 1)
+        # 没有明确的循环次数时，以模型调用次数（或动作数）估计
+        loop_iterations = self.loop_iterations or len(self.model_latencies_ms) or len(actions)
+        breakdown = None
+        if total_seconds is not None:
+            # 第一行输出之前的时间视为进程启动（Node 启动、模块加载、npx 解析）
+            startup_s = self.first_output_at or 0.0
+            model_s = model_ms / 1000
+            breakdown = {
+                "startup_s": round(startup_s, 3),
+                "model_s": round(model_s, 3),
+                "action_and_overhead_s": round(max(0.0, total_seconds - startup_s - model_s), 3),
+            }
+        return {
+            "actions": actions,
+            "action_count": len(actions),
+            "action_types": dict(Counter(action["type"] for action in actions)),
+            "loop_iterations": loop_iterations,
+            "model_calls": len(self.model_latencies_ms),
+            "model_ms": model_ms,
+            "total_s": None if total_seconds is None else round(total_seconds, 3),
+            "breakdown": breakdown,
+        }
+
+
+class UITarsTraceMetrics:
+    """动作轨迹的全局汇总指标"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.steps = 0
+        self.actions = 0
+        self.loop_iterations = 0
+        self.model_calls = 0
+        self.model_ms = 0.0
+        self.total_s = 0.0
+        self.startup_s = 0.0
+        self.timed_model_s = 0.0
+        self.action_and_overhead_s = 0.0
+        self.action_types: Counter = Counter()
+
+    def record(self, trace: dict):
+        """记录一次执行的轨迹"""
+        with self._lock:
+            self.steps += 1
+            self.actions += trace["action_count"]
+            self.loop_iterations += trace["loop_iterations"]
+            self.model_calls += trace["model_calls"]
+            self.model_ms += trace["model_ms"]
+            self.action_types.update(trace["action_types"])
+            if trace["breakdown"] is not None:
+                self.total_s += trace["total_s"]
+                self.startup_s += trace["breakdown"]["startup_s"]
+                self.timed_model_s += trace["breakdown"]["model_s"]
+                self.action_and_overhead_s += trace["breakdown"]["action_and_overhead_s"]
+
+    def snapshot(self) -> dict:
+        """
+        获取汇总指标
+
+        Returns:
+            执行次数、动作数、循环次数、模型调用次数与耗时，以及耗时在启动/模型/动作之间的占比
+        """
+        with self._lock:
+            steps = self.steps or 1
+            total_s = self.total_s or None
+            return {
+                "steps": self.steps,
+                "actions": self.actions,
+                "action_types": dict(self.action_types),
+                "avg_actions_per_step": round(self.actions / steps, 2),
+                "avg_loop_iterations": round(self.loop_iterations / steps, 2),
+                "model_calls": self.model_calls,
+                "avg_model_ms": round(self.model_ms / self.model_calls, 1) if self.model_calls else None,
+                "total_s": round(self.total_s, 3),
+                "share": None if total_s is None else {
+                    "startup": round(self.startup_s / total_s, 3),
+                    "model": round(self.timed_model_s / total_s, 3),
+                    "action_and_overhead": round(self.action_and_overhead_s / total_s, 3),
+                },
+            }
+
+
+# 全局轨迹指标实例
+_trace_metrics: UITarsTraceMetrics = None
+
+
+def get_trace_metrics() -> UITarsTraceMetrics:
+    """获取全局动作轨迹指标实例（单例模式）"""
+    global _trace_metrics
+    if _trace_metrics is None:
+        _trace_metrics = UITarsTraceMetrics()
+    return _trace_metrics
@@ -0,0 +1,346 @@
+"""
+UI-TARS 常驻工作进程客户端
+
+每次通过 CLI 执行指令都要付出 Node 启动、模块加载、npx 包解析和模型客户端初始化的开销。
+这里启动一个长期运行的工作进程（ui_tars_worker/worker.mjs），通过 stdin/stdout 上的 JSON Lines 协议发送指令：
+每个 UITars 实例只启动一次，空闲一段时间后先做健康检查，进程崩溃或卡死时自动重启。
+协议说明见 ui_tars_worker/worker.mjs，离线验证可使用替身 ui_tars_worker/fake_worker.py。
+"""
+import atexit
+import json
+import os
+import subprocess
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import config
+
+# 是否通过常驻工作进程执行 UI-TARS 指令（启动失败时退回每次调用 CLI）
+UI_TARS_WORKER_ENABLED = config.config_dict.get("UI_TARS_WORKER_ENABLED", "false").lower() in ("1", "true", "yes")
+# 自定义工作进程命令（如替身 "python ui_tars_worker/fake_worker.py"），为空时使用 node ui_tars_worker/worker.mjs
+UI_TARS_WORKER_COMMAND = config.config_dict.get("UI_TARS_WORKER_COMMAND", "")
+# 等待工作进程就绪的超时时间（秒）
+UI_TARS_WORKER_STARTUP_TIMEOUT = float(config.config_dict.get("UI_TARS_WORKER_STARTUP_TIMEOUT", "60"))
+# 空闲超过该时间（秒）后，执行指令前先做一次健康检查
+UI_TARS_WORKER_HEALTH_INTERVAL = float(config.config_dict.get("UI_TARS_WORKER_HEALTH_INTERVAL", "30"))
+# 健康检查的超时时间（秒）
+UI_TARS_WORKER_PING_TIMEOUT = float(config.config_dict.get("UI_TARS_WORKER_PING_TIMEOUT", "5"))
+
+# 工作进程脚本所在目录
+WORKER_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ui_tars_worker")
+WORKER_SCRIPT = os.path.join(WORKER_DIR, "worker.mjs")
+
+
+class WorkerCrashed(RuntimeError):
+    """工作进程在返回结果前退出"""
+
+
+class UITarsWorker:
+    """UI-TARS 常驻工作进程（JSON Lines over stdin/stdout）"""
+
+    def __init__(
+        self,
+        command: List[str],
+        env: Optional[Dict[str, str]] = None,
+        cwd: Optional[str] = None,
+        startup_timeout: float = UI_TARS_WORKER_STARTUP_TIMEOUT,
+        health_interval: float = UI_TARS_WORKER_HEALTH_INTERVAL,
+        ping_timeout: float = UI_TARS_WORKER_PING_TIMEOUT
+    ):
+        """
+        Args:
+            command: 工作进程命令
+            env: 额外的环境变量（模型配置通过环境变量传递，不出现在命令行中）
+            cwd: 工作目录
+            startup_timeout: 等待就绪的超时时间（秒）
+            health_interval: 空闲超过该时间后先做健康检查（秒）
+            ping_timeout: 健康检查的超时时间（秒）
+        """
+        self.command = command
+        self.env = env or {}
+        self.cwd = cwd
+        self.startup_timeout = startup_timeout
+        self.health_interval = health_interval
+        self.ping_timeout = ping_timeout
+        self._process: Optional[subprocess.Popen] = None
+        # 当前进程的就绪事件（每次启动新建，旧进程的读取线程只能设置旧进程的事件）
+        self._ready = threading.Event()
+        # 当前进程的输出结束事件（读取线程读到 EOF 后设置，此后发出的请求不会再有响应）
+        self._closed = threading.Event()
+        # 同一时间只执行一条指令（只有一个桌面）
+        self._run_lock = threading.Lock()
+        # 请求 ID -> 等待事件 / 响应
+        self._pending_lock = threading.Lock()
+        self._waiters: Dict[int, threading.Event] = {}
+        self._responses: Dict[int, dict] = {}
+        self._next_id = 0
+        self._last_response_at = 0.0
+        self.version: Optional[str] = None
+        self.starts = 0
+        self.restarts = 0
+        self.requests = 0
+        atexit.register(self.close)
+
+    @property
+    def alive(self) -> bool:
+        """工作进程是否在运行（输出已结束的进程视为已退出，即使退出码尚未可用）"""
+        return self._process is not None and self._process.poll() is None and not self._closed.is_set()
+
+    def start(self):
+        """
+        启动工作进程并等待就绪（已在运行时无副作用）
+
+        Raises:
+            RuntimeError: 启动失败或等待就绪超时
+        """
+        if self.alive and self._ready.is_set():
+            return
+        self._kill()
+        ready = threading.Event()
+        closed = threading.Event()
+        self._ready = ready
+        self._closed = closed
+        started = time.perf_counter()
+        try:
+            process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding="utf-8",
+                errors="replace",
+                bufsize=1,
+                cwd=self.cwd,
+                env={**os.environ, **self.env},
+            )
+        except OSError as e:
+            raise RuntimeError(f"无法启动 UI-TARS 工作进程 {self.command}: {str(e)}")
+        self._process = process
+        threading.Thread(target=self._read_stdout, args=(process, ready, closed), name="ui-tars-worker-stdout", daemon=True).start()
+        threading.Thread(target=self._read_stderr, args=(process,), name="ui-tars-worker-stderr", daemon=True).start()
+        if not ready.wait(self.startup_timeout):
+            self._kill()
+            raise RuntimeError(f"UI-TARS 工作进程未能在 {self.startup_timeout}s 内就绪")
+        if not self.alive:
+            returncode = process.poll()
+            self._kill()
+            raise RuntimeError(f"UI-TARS 工作进程启动后退出（退出码: {returncode}）")
+        self.starts += 1
+        self._last_response_at = time.monotonic()
+        print(
+            f"[UI-TARS 工作进程] 已启动（pid: {process.pid}，版本: {self.version}，"
+            f"耗时: {time.perf_counter() - started:.2f}s）"
+        )
+
+    def restart(self, reason: str):
+        """重启工作进程"""
+        print(f"[UI-TARS 工作进程] 重启: {reason}")
+        self.restarts += 1
+        self._kill()
+        self.start()
+
+    def _read_stdout(self, process: subprocess.Popen, ready: threading.Event, closed: threading.Event):
+        """读取协议消息（工作进程退出时标记输出结束并唤醒所有等待中的请求）"""
+        try:
+            self._dispatch(process, ready)
+        except (OSError, ValueError):
+            # 结束进程时管道被关闭
+            pass
+        # 就绪前退出时不必等到启动超时（只设置该进程自己的就绪事件，重启中的新进程不受影响）
+        ready.set()
+        with self._pending_lock:
+            # 在锁内标记，request 注册等待后在锁内检查，不会漏掉 EOF 之后注册的请求
+            closed.set()
+            # 已被新进程替换时，等待中的请求属于新进程，不能唤醒
+            if self._process is process or self._process is None:
+                for waiter in self._waiters.values():
+                    waiter.set()
+
+    def _dispatch(self, process: subprocess.Popen, ready: threading.Event):
+        """逐行分发协议消息"""
+        for line in process.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                message = json.loads(line)
+            except ValueError:
+                print(f"[UI-TARS 工作进程] 无法解析的输出: {line[:200]}")
+                continue
+            message_type = message.get("type")
+            if message_type == "ready":
+                self.version = message.get("version")
+                ready.set()
+            elif message_type == "event":
+                data = message.get("data", {})
+                print(f"[UI-TARS 工作进程] {data.get('status')}: {data.get('action')}")
+            elif message.get("id") is not None:
+                with self._pending_lock:
+                    waiter = self._waiters.get(message["id"])
+                    if waiter is not None:
+                        self._responses[message["id"]] = message
+                        waiter.set()
+            else:
+                print(f"[UI-TARS 工作进程] {message}")
+
+    def _read_stderr(self, process: subprocess.Popen):
+        """转发工作进程日志"""
+        try:
+            for line in process.stderr:
+                line = line.rstrip()
+                if line:
+                    print(f"[UI-TARS 工作进程] {line}")
+        except (OSError, ValueError):
+            pass
+
+    def request(self, message: Dict[str, Any], timeout: Optional[float] = None) -> dict:
+        """
+        发送一个请求并等待响应
+
+        Args:
+            message: 请求内容（不含 id）
+            timeout: 超时时间（秒），None 表示一直等待
+
+        Returns:
+            响应消息
+
+        Raises:
+            TimeoutError: 等待响应超时
+            WorkerCrashed: 工作进程在返回响应前退出
+        """
+        process, closed = self._process, self._closed
+        if process is None or process.poll() is not None:
+            raise WorkerCrashed("UI-TARS 工作进程未运行")
+        waiter = threading.Event()
+        with self._pending_lock:
+            self._next_id += 1
+            request_id = self._next_id
+            self._waiters[request_id] = waiter
+            # 读取线程已读到 EOF 时不会再唤醒该请求（进程退出码可能尚未可用）
+            exited = closed.is_set()
+        try:
+            if exited:
+                raise WorkerCrashed("UI-TARS 工作进程已退出")
+            try:
+                process.stdin.write(json.dumps({"id": request_id, **message}, ensure_ascii=False) + "\n")
+                process.stdin.flush()
+            except (BrokenPipeError, OSError, ValueError):
+                raise WorkerCrashed("UI-TARS 工作进程已退出")
+            if not waiter.wait(timeout):
+                raise TimeoutError(f"UI-TARS 工作进程 {timeout}s 内未响应")
+            with self._pending_lock:
+                response = self._responses.pop(request_id, None)
+            if response is None:
+                raise WorkerCrashed(f"UI-TARS 工作进程已退出（退出码: {process.poll()}）")
+            self._last_response_at = time.monotonic()
+            return response
+        finally:
+            with self._pending_lock:
+                self._waiters.pop(request_id, None)
+                self._responses.pop(request_id, None)
+
+    def ping(self, timeout: Optional[float] = None) -> bool:
+        """健康检查：工作进程在超时前响应 pong 时返回 True"""
+        try:
+            return self.request({"type": "ping"}, timeout or self.ping_timeout).get("type") == "pong"
+        except (TimeoutError, WorkerCrashed):
+            return False
+
+    def ensure_healthy(self):
+        """确保工作进程可用：未启动时启动，已退出时重启，空闲较久时先做健康检查"""
+        if self._process is None:
+            self.start()
+        elif not self.alive:
+            self.restart(f"进程已退出（退出码: {self._process.poll()}）")
+        elif time.monotonic() - self._last_response_at > self.health_interval and not self.ping():
+            self.restart("健康检查无响应")
+
+    def run(self, instruction: str, target: str = "nut-js", timeout: Optional[float] = None) -> dict:
+        """
+        执行一条自然语言指令
+
+        Args:
+            instruction: 自然语言指令
+            target: 目标操作器类型（nut-js / adb）
+            timeout: 超时时间（秒），超时后重启工作进程
+
+        Returns:
+            与 UITars._execute_command 相同格式的结果字典
+
+        Raises:
+            RuntimeError: 工作进程无法启动
+        """
+        with self._run_lock:
+            self.ensure_healthy()
+            self.requests += 1
+            result = {"instruction": instruction, "target": target}
+            try:
+                response = self.request({"type": "run", "instruction": instruction, "target": target}, timeout)
+            except TimeoutError:
+                self._kill()
+                return {**result, "success": False, "error": f"执行超时（{timeout}秒）"}
+            except WorkerCrashed as e:
+                # 不自动重试：指令可能已经部分执行，由调用方决定是否重试；下次调用时重启
+                return {**result, "success": False, "error": str(e)}
+            success = bool(response.get("success"))
+            error = response.get("error")
+            return {
+                **result,
+                "success": success,
+                "returncode": 0 if success else 1,
+                "stdout": "\n".join(response.get("logs") or []),
+                "stderr": error or "",
+                "error": None if success else (error or f"执行未完成（状态: {response.get('status')}）"),
+                "status": response.get("status"),
+            }
+
+    def cancel(self):
+        """
+        取消正在执行的指令：结束工作进程（协议不支持中途取消）
+
+        等待中的请求随即以 WorkerCrashed 返回并释放执行锁，下次执行指令时自动重启。
+        """
+        if self._process is not None:
+            print(f"[UI-TARS 工作进程] 指令被取消，结束工作进程 {self._process.pid}")
+            self._kill()
+
+    def status(self) -> dict:
+        """获取工作进程状态"""
+        return {
+            "command": self.command,
+            "alive": self.alive,
+            "pid": self._process.pid if self.alive else None,
+            "version": self.version,
+            "starts": self.starts,
+            "restarts": self.restarts,
+            "requests": self.requests,
+        }
+
+    def _kill(self):
+        """强制结束工作进程"""
+        process, self._process = self._process, None
+        if process is None:
+            return
+        if process.poll() is None:
+            process.kill()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+        for stream in (process.stdin, process.stdout, process.stderr):
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+    def close(self):
+        """通知工作进程退出，未及时退出时强制结束"""
+        if self.alive:
+            try:
+                self.request({"type": "shutdown"}, timeout=3)
+                self._process.wait(timeout=3)
+            except Exception:
+                pass
+        self._kill()
@@ -1,18 +1,29 @@
 """
 FastAPI 接口 - 对外提供启动任务的入口
 """
+import time
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 import asyncio
-from main import run_task
+from startup import get_startup_monitor, WARM_UP_ON_STARTUP
 from task_storage.database import get_db as get_task_db, init_db
 from task_storage.crud import TaskStorageCRUD
 from business_knowledge.database import get_db as get_business_db, init_db as init_business_db
 from business_knowledge.crud import BusinessKnowledgeCRUD
+from business_knowledge.deferred_embedding import get_answer_embedding_worker
 from reasoning_knowledge.database import get_db as get_reasoning_db, init_db as init_reasoning_db
 from reasoning_knowledge.crud import ReasoningKnowledgeCRUD
+from reasoning_knowledge.deferred_embedding import get_step_embedding_worker
+from knowledge_queue.database import get_db as get_queue_db, init_db as init_queue_db
+from knowledge_queue.crud import KnowledgeQueueCRUD
+from knowledge_queue.worker import get_knowledge_queue_worker
+
+# 执行图（langgraph、langchain 等）在首次执行任务或后台预热时才导入
+get_startup_monitor().record_import("api", time.perf_counter() - _import_started)
 
 # 创建 FastAPI 应用
 app = FastAPI(title="AI 任务执行 API", version="1.0.0")
@@ -50,6 +61,7 @@ class BusinessKnowledgeSearch(BaseModel):
     query_text: str
     top_k: int = 5
     threshold: float = 0.0
+    include_pending: bool = True  # 按答案搜索时是否包含答案向量尚未计算的条目
 
 
 # 推理知识库请求/响应模型
@@ -70,6 +82,7 @@ class ReasoningKnowledgeSearch(BaseModel):
     query_text: str
     top_k: int = 5
     threshold: float = 0.0
+    include_pending: bool = True  # 按步骤搜索时是否包含步骤向量尚未计算的条目
 
 
 # 任务存储搜索请求模型
@@ -88,9 +101,35 @@ async def startup_event():
         init_db()  # 任务存储数据库
         init_business_db()  # 业务知识库
         init_reasoning_db()  # 推理知识库
+        init_queue_db()  # 知识写入队列
         print("[API] 所有数据库初始化完成")
     except Exception as e:
         print(f"[API] 数据库初始化失败: {str(e)}")
+    
+    # 启动延迟向量补全线程（同时补全上次退出前遗留的待计算条目）
+    get_answer_embedding_worker().notify()
+    get_step_embedding_worker().notify()
+    # 启动知识写入队列线程（同时处理上次退出前遗留的条目）
+    get_knowledge_queue_worker().notify()
+    
+    # 解析 UI-TARS CLI 启动方式（只解析一次，结果见 /ready）
+    get_startup_monitor().resolve_ui_tars_launcher()
+    
+    # 后台预热 embedding 模型与执行图，不阻塞启动，就绪状态见 /ready
+    if WARM_UP_ON_STARTUP:
+        get_startup_monitor().start_warm_up()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用退出时关闭共享 HTTP 连接池与截图线程池，并写入画面状态索引中尚未保存的变更"""
+    from util.http_client import close_http_client
+    from util.screenshot_util import shutdown_capture_pool
+    from util.screen_state_index import get_screen_state_index, SCREEN_STATE_INDEX_ENABLED
+    await close_http_client()
+    await asyncio.to_thread(shutdown_capture_pool)
+    if SCREEN_STATE_INDEX_ENABLED:
+        await asyncio.to_thread(get_screen_state_index().flush)
 
 
 @app.get("/")
@@ -105,6 +144,143 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def ready():
+    """
+    就绪检查（模型预热完成前返回 503）
+    
+    Returns:
+        就绪状态，以及导入耗时和各预热步骤耗时
+    """
+    monitor = get_startup_monitor()
+    return JSONResponse(status_code=200 if monitor.ready else 503, content=monitor.status())
+
+
+@app.get("/api/embedding/metrics")
+async def embedding_metrics():
+    """
+    获取 embedding 模型的加载/卸载指标
+    
+    Returns:
+        各知识库已创建的 embedding 服务指标（是否常驻、空闲时长、加载与卸载次数、加载耗时）
+    """
+    from business_knowledge.embedding_service import get_embedding_metrics as get_business_metrics
+    from reasoning_knowledge.embedding_service import get_embedding_metrics as get_reasoning_metrics
+    return {
+        "business_knowledge": get_business_metrics(),
+        "reasoning_knowledge": get_reasoning_metrics(),
+    }
+
+
+@app.get("/api/ui-tars/metrics")
+async def ui_tars_metrics():
+    """
+    获取 UI-TARS 动作轨迹的汇总指标
+    
+    Returns:
+        执行次数、动作数与类型分布、平均循环次数、模型调用耗时，以及耗时在进程启动/模型推理/动作执行之间的占比
+    """
+    from action.ui_tars_trace import get_trace_metrics
+    return get_trace_metrics().snapshot()
+
+
+@app.get("/api/screen-states/status")
+async def screen_state_index_status():
+    """
+    获取画面状态索引状态
+    
+    Returns:
+        状态数、状态转移数（及已验证的转移数）、查找命中率、平均查找耗时、跳过的步骤数
+    """
+    from util.screen_state_index import get_screen_state_index
+    return await asyncio.to_thread(get_screen_state_index().status)
+
+
+@app.get("/api/verification-cache/metrics")
+async def verification_cache_metrics():
+    """
+    获取验证缓存指标
+    
+    Returns:
+        指纹数、检查与命中次数、命中率、本地判定通过次数、抽样验证与界面漂移次数
+    """
+    from action.multimodal_action.verification_cache import get_verification_cache
+    return get_verification_cache().metrics()
+
+
+@app.get("/api/action-cache/metrics")
+async def action_cache_metrics():
+    """
+    获取动作回放缓存指标
+    
+    Returns:
+        条目数、查找与命中次数、命中率、画面不匹配次数、回放后验证失败次数等
+    """
+    from action.action_cache import get_action_cache
+    return get_action_cache().metrics()
+
+
+@app.delete("/api/action-cache")
+async def clear_action_cache():
+    """
+    清空动作回放缓存（被测应用界面变化但版本号未变时使用）
+    
+    Returns:
+        删除的条目数
+    """
+    from action.action_cache import get_action_cache
+    return {"deleted": await asyncio.to_thread(get_action_cache().clear)}
+
+
+@app.get("/api/capture-service/status")
+async def capture_service_status():
+    """
+    获取后台截图服务状态
+    
+    Returns:
+        是否启用/运行、帧率、缓冲区容量、已截帧数与最近一次截图耗时
+    """
+    from util.capture_service import get_capture_service
+    return get_capture_service().status()
+
+
+@app.get("/api/frames/status")
+async def screenshot_archive_status():
+    """
+    获取截图归档状态
+    
+    Returns:
+        归档目录、索引帧数与本进程写入/去重的帧数和字节数
+    """
+    from util.screenshot_archive import get_screenshot_archive
+    return get_screenshot_archive().status()
+
+
+@app.get("/api/frames/{frame_id}")
+async def get_frame(frame_id: str):
+    """
+    按帧 ID 获取归档的截图（帧 ID 见 step_results 中的 frames）
+    
+    Args:
+        frame_id: 帧 ID（内容哈希）
+    
+    Returns:
+        图片数据（流式返回）
+    """
+    from util.screenshot_archive import get_screenshot_archive
+    from util.image_profile import detect_mime_type
+    archive = get_screenshot_archive()
+    header = await asyncio.to_thread(archive.header, frame_id)
+    chunks = None if header is None else await asyncio.to_thread(archive.iter_chunks, frame_id)
+    if chunks is None:
+        raise HTTPException(status_code=404, detail=f"帧 {frame_id} 不存在")
+    return StreamingResponse(
+        chunks,
+        media_type=detect_mime_type(header),
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
+
 @app.post("/api/tasks/run", response_model=TaskResponse)
 async def run_task_api(request: TaskRequest):
     """
@@ -134,6 +310,7 @@ async def run_task_api(request: TaskRequest):
         async def execute_task():
             """后台执行任务"""
             try:
+                from main import run_task
                 result = await run_task(request.task, request.task_id)
                 print(f"[API] 任务执行完成，ID: {result.get('task_id')}")
             except Exception as e:
@@ -163,6 +340,7 @@ async def run_task_api(request: TaskRequest):
     async def execute_task_with_id():
         """使用创建的任务 ID 执行任务"""
         try:
+            from main import run_task
             result = await run_task(request.task, task_id)
             print(f"[API] 任务执行完成，ID: {result.get('task_id')}")
         except Exception as e:
@@ -292,21 +470,35 @@ async def count_tasks():
 # ==================== 业务知识库 API ====================
 
 @app.post("/api/business-knowledge")
-async def create_business_knowledge(request: BusinessKnowledgeCreate):
+async def create_business_knowledge(request: BusinessKnowledgeCreate, queued: bool = False):
     """
     创建业务知识条目
     
     Args:
         request: 业务知识创建请求
+        queued: 是否写入后台队列后立即返回（202）；默认同步写入
         
     Returns:
-        创建的知识条目
+        queued 为 True 时返回队列条目（可通过 /api/knowledge-queue/{id} 查询状态），
+        否则返回创建的知识条目
     """
     if not request.question_text or not request.question_text.strip():
         raise HTTPException(status_code=400, detail="问题文本不能为空")
     if not request.answer_text or not request.answer_text.strip():
         raise HTTPException(status_code=400, detail="答案文本不能为空")
     
+    if queued:
+        db = next(get_queue_db())
+        try:
+            crud = KnowledgeQueueCRUD(db)
+            entry = crud.enqueue_business(
+                question_text=request.question_text,
+                answer_text=request.answer_text
+            )
+            return JSONResponse(status_code=202, content=entry.to_dict())
+        finally:
+            db.close()
+    
     db = next(get_business_db())
     try:
         crud = BusinessKnowledgeCRUD(db)
@@ -458,7 +650,8 @@ async def search_business_knowledge_by_answer(request: BusinessKnowledgeSearch):
         results = crud.search_by_answer(
             query_text=request.query_text,
             top_k=request.top_k,
-            threshold=request.threshold
+            threshold=request.threshold,
+            include_pending=request.include_pending
         )
         return results
     finally:
@@ -485,21 +678,35 @@ async def count_business_knowledge():
 # ==================== 推理知识库 API ====================
 
 @app.post("/api/reasoning-knowledge")
-async def create_reasoning_knowledge(request: ReasoningKnowledgeCreate):
+async def create_reasoning_knowledge(request: ReasoningKnowledgeCreate, queued: bool = False):
     """
     创建推理知识条目
     
     Args:
         request: 推理知识创建请求
+        queued: 是否写入后台队列后立即返回（202）；默认同步写入
         
     Returns:
-        创建的知识条目
+        queued 为 True 时返回队列条目（可通过 /api/knowledge-queue/{id} 查询状态），
+        否则返回创建的知识条目
     """
     if not request.task_text or not request.task_text.strip():
         raise HTTPException(status_code=400, detail="任务文本不能为空")
     if not request.step_text or not request.step_text.strip():
         raise HTTPException(status_code=400, detail="步骤文本不能为空")
     
+    if queued:
+        db = next(get_queue_db())
+        try:
+            crud = KnowledgeQueueCRUD(db)
+            entry = crud.enqueue_reasoning(
+                task_text=request.task_text,
+                step_text=request.step_text
+            )
+            return JSONResponse(status_code=202, content=entry.to_dict())
+        finally:
+            db.close()
+    
     db = next(get_reasoning_db())
     try:
         crud = ReasoningKnowledgeCRUD(db)
@@ -651,7 +858,8 @@ async def search_reasoning_knowledge_by_step(request: ReasoningKnowledgeSearch):
         results = crud.search_by_step(
             query_text=request.query_text,
             top_k=request.top_k,
-            threshold=request.threshold
+            threshold=request.threshold,
+            include_pending=request.include_pending
         )
         return results
     finally:
@@ -675,6 +883,47 @@ async def count_reasoning_knowledge():
         db.close()
 
 
+# ==================== 知识写入队列 API ====================
+
+@app.get("/api/knowledge-queue/pending/count")
+async def count_pending_knowledge():
+    """
+    获取等待写入知识库的条目数
+    
+    Returns:
+        等待写入的条目数
+    """
+    db = next(get_queue_db())
+    try:
+        crud = KnowledgeQueueCRUD(db)
+        count = crud.count_pending()
+        return {"count": count}
+    finally:
+        db.close()
+
+
+@app.get("/api/knowledge-queue/{entry_id}")
+async def get_knowledge_queue_entry(entry_id: int):
+    """
+    查询知识写入状态
+    
+    Args:
+        entry_id: 队列条目 ID（创建知识时返回的 id）
+        
+    Returns:
+        队列条目状态，searchable 为 True 时 knowledge_id 对应的条目已可被检索
+    """
+    db = next(get_queue_db())
+    try:
+        crud = KnowledgeQueueCRUD(db)
+        entry = crud.get_by_id(entry_id)
+        if not entry:
+            raise HTTPException(status_code=404, detail=f"队列条目 ID {entry_id} 不存在")
+        return entry.to_dict()
+    finally:
+        db.close()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,91 @@
+"""
+Embedding 模型加载基准
+
+同时启动多个进程加载 EmbeddingService，报告每个进程的加载耗时与内存占用
+（RSS / PSS / 共享页），用于对比 HuggingFace 缓存加载与本地快照 mmap 加载。
+
+用法（在 backend 目录下）:
+    python -m benchmark.embedding_load_benchmark --processes 4
+    python -m benchmark.embedding_load_benchmark --processes 4 --model-path /models/bge-large-zh-v1.5
+"""
+import argparse
+import multiprocessing
+import time
+from typing import Dict, Optional
+
+
+def read_memory_kb() -> Dict[str, int]:
+    """
+    读取当前进程的内存统计（Linux /proc/self/smaps_rollup）
+
+    Returns:
+        {"rss": ..., "pss": ..., "shared": ...}，单位 KB；非 Linux 平台返回空字典
+    """
+    fields = {"Rss:": "rss", "Pss:": "pss", "Shared_Clean:": "shared_clean", "Shared_Dirty:": "shared_dirty"}
+    result: Dict[str, int] = {}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                parts = line.split()
+                if parts and parts[0] in fields:
+                    result[fields[parts[0]]] = int(parts[1])
+    except OSError:
+        return {}
+    result["shared"] = result.pop("shared_clean", 0) + result.pop("shared_dirty", 0)
+    return result
+
+
+def _load_worker(model_path: Optional[str], start_barrier, done_barrier, queue):
+    """子进程：加载模型、编码一次、上报耗时与内存，等待所有进程加载完成后再退出"""
+    from business_knowledge.embedding_service import EmbeddingService
+
+    start_barrier.wait()
+    started = time.perf_counter()
+    service = EmbeddingService(model_path=model_path)
+    load_seconds = time.perf_counter() - started
+    service.encode_question("基准测试")
+    # 等所有进程都加载完成后再统计，PSS 才能反映进程间共享的权重页
+    done_barrier.wait()
+    memory = read_memory_kb()
+    queue.put({
+        "load_seconds": load_seconds,
+        "mmap_loaded": service.mmap_loaded,
+        **memory,
+    })
+    done_barrier.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding 模型加载基准")
+    parser.add_argument("--processes", type=int, default=2, help="同时加载模型的进程数")
+    parser.add_argument("--model-path", default=None, help="本地模型快照目录（不提供则从 HuggingFace 缓存加载）")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    start_barrier = ctx.Barrier(args.processes)
+    done_barrier = ctx.Barrier(args.processes)
+    queue = ctx.Queue()
+    workers = [
+        ctx.Process(target=_load_worker, args=(args.model_path, start_barrier, done_barrier, queue))
+        for _ in range(args.processes)
+    ]
+    for worker in workers:
+        worker.start()
+    results = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    print(f"模型来源: {args.model_path or 'HuggingFace 缓存'}，进程数: {args.processes}")
+    print(f"{'进程':<6}{'加载耗时(s)':>12}{'mmap':>6}{'RSS(MB)':>10}{'PSS(MB)':>10}{'共享(MB)':>10}")
+    for idx, result in enumerate(results):
+        print(
+            f"{idx:<6}{result['load_seconds']:>12.2f}{'是' if result['mmap_loaded'] else '否':>6}"
+            f"{result.get('rss', 0) / 1024:>10.0f}{result.get('pss', 0) / 1024:>10.0f}"
+            f"{result.get('shared', 0) / 1024:>10.0f}"
+        )
+    total_pss = sum(result.get("pss", 0) for result in results) / 1024
+    print(f"PSS 合计（实际物理内存占用）: {total_pss:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
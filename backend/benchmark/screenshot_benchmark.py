@@ -0,0 +1,174 @@
+"""
+截图编码基准
+
+用合成的 BGRA 帧（与 mss 的原始缓冲区格式一致）对比两条截图编码路径，报告每次截图的耗时（ms）:
+    legacy: BGRA -> RGB -> PNG（mss.tools.to_png）-> 解码 -> 缩放 -> JPEG
+    direct: BGRA -> Image.frombuffer -> 缩放 -> JPEG（PIL / libjpeg-turbo）
+
+--live 时额外测量真实屏幕截图，并对比每次新建 mss 实例与复用线程截图句柄（ScreenGrabber）的单次截图耗时；
+--xwd 时测量从 Xvfb 帧缓冲（mmap）构建图片的耗时。
+
+用法（在 backend 目录下）:
+    python -m benchmark.screenshot_benchmark --repeat 10
+    python -m benchmark.screenshot_benchmark --live    # 需要图形环境
+    python -m benchmark.screenshot_benchmark --xwd /tmp/xvfb/Xvfb_screen0
+"""
+import argparse
+import io
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from util.screenshot_util import (
+    ScreenshotUtil,
+    DEFAULT_MAX_PIXELS,
+    MSS_AVAILABLE,
+    _get_turbojpeg,
+    get_screen_grabber,
+    ScreenGrabber,
+)
+
+RESOLUTIONS: List[Tuple[str, int, int]] = [
+    ("1080p", 1920, 1080),
+    ("1440p", 2560, 1440),
+    ("4K", 3840, 2160),
+]
+
+
+def make_frame(width: int, height: int, seed: int = 0) -> bytes:
+    """
+    生成类似桌面界面的 BGRA 帧：纯色背景 + 色块窗口 + 少量噪声文字区域
+
+    Args:
+        width: 宽度
+        height: 高度
+        seed: 随机种子
+
+    Returns:
+        BGRA 原始像素字节
+    """
+    rng = np.random.default_rng(seed)
+    frame = np.full((height, width, 4), 235, dtype=np.uint8)
+    frame[..., 3] = 255
+    for _ in range(12):
+        x0, y0 = rng.integers(0, width - 200), rng.integers(0, height - 150)
+        x1, y1 = x0 + rng.integers(200, width // 3), y0 + rng.integers(150, height // 3)
+        frame[y0:y1, x0:x1, :3] = rng.integers(0, 255, size=3, dtype=np.uint8)
+        # 窗口内的“文字行”
+        for row in range(y0 + 20, min(y1, height) - 12, 24):
+            text_width = min(x1, width) - x0 - 40
+            if text_width > 0:
+                frame[row:row + 12, x0 + 20:x0 + 20 + text_width, :3] = rng.integers(
+                    0, 255, size=(12, text_width, 1), dtype=np.uint8
+                )
+    return frame.tobytes()
+
+
+def legacy_encode(bgra: bytes, size: Tuple[int, int]) -> bytes:
+    """旧路径：BGRA 转 RGB 后编码 PNG，再解码、缩放并编码 JPEG"""
+    width, height = size
+    rgb = np.frombuffer(bgra, dtype=np.uint8).reshape(height, width, 4)[..., 2::-1].tobytes()
+    if MSS_AVAILABLE:
+        import mss.tools
+        png_bytes = mss.tools.to_png(rgb, size)
+    else:
+        buffer = io.BytesIO()
+        Image.frombytes("RGB", size, rgb).save(buffer, format="PNG")
+        png_bytes = buffer.getvalue()
+    return ScreenshotUtil._compress_image(png_bytes)
+
+
+def direct_encode(bgra: bytes, size: Tuple[int, int], encoder: str) -> bytes:
+    """新路径：直接从 BGRA 缓冲区构建图片，缩放后只编码一次"""
+    image = Image.frombuffer("RGB", size, bgra, "raw", "BGRX", 0, 1)
+    return ScreenshotUtil._encode_image(image, DEFAULT_MAX_PIXELS, encoder=encoder)
+
+
+def grab_per_call() -> bytes:
+    """旧的截图方式：每次截图都新建并关闭 mss 实例"""
+    import mss
+    with mss.mss() as sct:
+        return sct.grab(sct.monitors[1]).bgra
+
+
+def grab_with_grabber() -> bytes:
+    """复用当前线程的截图句柄"""
+    return get_screen_grabber().grab().bgra
+
+
+def measure(func: Callable[[], bytes], repeat: int) -> Dict[str, float]:
+    """
+    多次执行并统计耗时
+
+    Returns:
+        {"mean_ms": ..., "min_ms": ..., "kb": ...}
+    """
+    func()  # 预热（首次创建编码器等）
+    timings = []
+    output = b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        "mean_ms": sum(timings) / len(timings),
+        "min_ms": min(timings),
+        "kb": len(output) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="截图编码基准")
+    parser.add_argument("--repeat", type=int, default=5, help="每种组合的重复次数")
+    parser.add_argument("--live", action="store_true", help="额外测量真实屏幕截图（需要图形环境）")
+    parser.add_argument("--xwd", default=None, help="Xvfb -fbdir 帧缓冲文件（或目录），测量 mmap 截图耗时")
+    args = parser.parse_args()
+
+    paths: List[Tuple[str, Callable[[bytes, Tuple[int, int]], bytes]]] = [
+        ("legacy(png)", legacy_encode),
+        ("direct(pil)", lambda bgra, size: direct_encode(bgra, size, "pil")),
+    ]
+    if _get_turbojpeg("turbojpeg") is not None:
+        paths.append(("direct(turbojpeg)", lambda bgra, size: direct_encode(bgra, size, "turbojpeg")))
+    else:
+        print("libjpeg-turbo 不可用，跳过 turbojpeg 后端（pip install PyTurboJPEG）")
+
+    print(f"{'分辨率':<8}{'路径':<20}{'平均(ms)':>10}{'最快(ms)':>10}{'大小(KB)':>10}")
+    for name, width, height in RESOLUTIONS:
+        bgra = make_frame(width, height)
+        for path_name, encode in paths:
+            result = measure(lambda: encode(bgra, (width, height)), args.repeat)
+            print(
+                f"{name:<8}{path_name:<20}{result['mean_ms']:>10.1f}"
+                f"{result['min_ms']:>10.1f}{result['kb']:>10.0f}"
+            )
+
+    if args.xwd:
+        grabber = ScreenGrabber(args.xwd)
+        image_result = measure(lambda: grabber.grab_image() and b"", args.repeat)
+        pixels_result = measure(lambda: grabber.grab_pixels() is not None and b"", args.repeat)
+        width, height = grabber.screen_size()
+        print(
+            f"Xvfb 帧缓冲 {width}x{height}（{grabber.backend}）: grab_image 平均 {image_result['mean_ms']:.1f} ms，"
+            f"grab_pixels 平均 {pixels_result['mean_ms']:.3f} ms"
+        )
+        grabber.close()
+
+    if args.live:
+        if MSS_AVAILABLE:
+            print(f"{'截图方式':<24}{'平均(ms)':>10}{'最快(ms)':>10}")
+            for grab_name, grab in [("mss.mss() per call", grab_per_call), ("ScreenGrabber", grab_with_grabber)]:
+                result = measure(grab, args.repeat)
+                print(f"{grab_name:<24}{result['mean_ms']:>10.1f}{result['min_ms']:>10.1f}")
+        width, height = ScreenshotUtil.get_screen_size()
+        result = measure(ScreenshotUtil.capture_full_screen_bytes, args.repeat)
+        print(
+            f"真实截图 {width}x{height}: 平均 {result['mean_ms']:.1f} ms，"
+            f"最快 {result['min_ms']:.1f} ms，{result['kb']:.0f} KB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ from business_knowledge.database import init_db, get_db, Base, engine, SessionLo
 from business_knowledge.models import AIBusinessKnowledge
 from business_knowledge.embedding_service import EmbeddingService, get_embedding_service
 from business_knowledge.crud import BusinessKnowledgeCRUD
+from business_knowledge.deferred_embedding import AnswerEmbeddingWorker, get_answer_embedding_worker
 
 __all__ = [
     "init_db",
@@ -16,5 +17,7 @@ __all__ = [
     "EmbeddingService",
     "get_embedding_service",
     "BusinessKnowledgeCRUD",
+    "AnswerEmbeddingWorker",
+    "get_answer_embedding_worker",
 ]
 
@@ -57,6 +57,20 @@ def init_db():
     # 创建所有表
     Base.metadata.create_all(bind=engine)
 
+    # answer_embedding 改为后台延迟计算，旧表需要去掉 NOT NULL 约束
+    with engine.connect() as conn:
+        conn.execute(text("ALTER TABLE ai_business_knowledge ALTER COLUMN answer_embedding DROP NOT NULL"))
+        conn.commit()
+
+        # 两阶段检索的小模型向量列及其 HNSW 索引（旧表补建）
+        small_dim = int(config.config_dict.get("SMALL_EMBEDDING_DIM", "512"))
+        conn.execute(text(f"ALTER TABLE ai_business_knowledge ADD COLUMN IF NOT EXISTS question_embedding_small vector({small_dim})"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_ai_business_knowledge_question_embedding_small "
+            "ON ai_business_knowledge USING hnsw (question_embedding_small vector_cosine_ops)"
+        ))
+        conn.commit()
+
 
 def get_db():
     """获取数据库会话（用于依赖注入）"""
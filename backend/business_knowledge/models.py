@@ -8,8 +8,12 @@ try:
 except ImportError:
     # 如果 pgvector 未安装，使用字符串类型作为后备
     from sqlalchemy import Text as Vector
+import config
 from business_knowledge.database import Base
 
+# 两阶段检索使用的小模型向量维度（bge-small-zh-v1.5 为 512）
+SMALL_EMBEDDING_DIM = int(config.config_dict.get("SMALL_EMBEDDING_DIM", "512"))
+
 
 class AIBusinessKnowledge(Base):
     """AI 业务知识库表模型"""
@@ -38,8 +42,13 @@ class AIBusinessKnowledge(Base):
     )
     answer_embedding = Column(
         Vector(1024),
-        nullable=False,
-        comment="答案向量嵌入"
+        nullable=True,
+        comment="答案向量嵌入（为空表示待后台计算）"
+    )
+    question_embedding_small = Column(
+        Vector(SMALL_EMBEDDING_DIM),
+        nullable=True,
+        comment="问题小模型向量嵌入（两阶段检索候选召回用，为空表示待后台计算）"
     )
 
     def __repr__(self):
@@ -53,5 +62,6 @@ class AIBusinessKnowledge(Base):
             "answer_text": self.answer_text,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "answer_embedding_pending": self.answer_embedding is None,
         }
 
@@ -0,0 +1,19 @@
+"""
+知识写入队列模块
+"""
+from knowledge_queue.database import init_db, get_db, Base, engine, SessionLocal
+from knowledge_queue.models import AIKnowledgeQueue
+from knowledge_queue.worker import KnowledgeQueueWorker, get_knowledge_queue_worker
+from knowledge_queue.crud import KnowledgeQueueCRUD
+
+__all__ = [
+    "init_db",
+    "get_db",
+    "Base",
+    "engine",
+    "SessionLocal",
+    "AIKnowledgeQueue",
+    "KnowledgeQueueWorker",
+    "get_knowledge_queue_worker",
+    "KnowledgeQueueCRUD",
+]
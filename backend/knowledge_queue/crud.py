@@ -0,0 +1,84 @@
+"""
+知识写入队列 CRUD 操作服务
+"""
+from typing import Optional
+from sqlalchemy.orm import Session
+from knowledge_queue.models import AIKnowledgeQueue, KIND_BUSINESS, KIND_REASONING, STATUS_PENDING
+from knowledge_queue.worker import get_knowledge_queue_worker
+
+
+class KnowledgeQueueCRUD:
+    """知识写入队列 CRUD 操作类"""
+
+    def __init__(self, db: Session):
+        """
+        初始化 CRUD 服务
+
+        Args:
+            db: 数据库会话
+        """
+        self.db = db
+
+    def _enqueue(self, kind: str, payload: dict) -> AIKnowledgeQueue:
+        """写入队列并通知后台线程"""
+        entry = AIKnowledgeQueue(kind=kind, payload=payload, status=STATUS_PENDING, attempts=0)
+        self.db.add(entry)
+        self.db.commit()
+        self.db.refresh(entry)
+
+        get_knowledge_queue_worker().notify()
+
+        return entry
+
+    def enqueue_business(self, question_text: str, answer_text: str) -> AIKnowledgeQueue:
+        """
+        受理一条业务知识写入请求（不等待 embedding 计算）
+
+        Args:
+            question_text: 问题文本
+            answer_text: 答案文本
+
+        Returns:
+            队列条目对象
+        """
+        return self._enqueue(KIND_BUSINESS, {
+            "question_text": question_text,
+            "answer_text": answer_text,
+        })
+
+    def enqueue_reasoning(self, task_text: str, step_text: str) -> AIKnowledgeQueue:
+        """
+        受理一条推理知识写入请求（不等待 embedding 计算）
+
+        Args:
+            task_text: 任务文本
+            step_text: 步骤文本
+
+        Returns:
+            队列条目对象
+        """
+        return self._enqueue(KIND_REASONING, {
+            "task_text": task_text,
+            "step_text": step_text,
+        })
+
+    def get_by_id(self, entry_id: int) -> Optional[AIKnowledgeQueue]:
+        """
+        根据 ID 获取队列条目
+
+        Args:
+            entry_id: 队列条目 ID
+
+        Returns:
+            队列条目对象，如果不存在则返回 None
+        """
+        return self.db.query(AIKnowledgeQueue).filter(AIKnowledgeQueue.id == entry_id).first()
+
+    def count_pending(self) -> int:
+        """
+        获取等待写入的条目数
+
+        Returns:
+            等待写入的条目数
+        """
+        return self.db.query(AIKnowledgeQueue).filter(AIKnowledgeQueue.status == STATUS_PENDING).count()
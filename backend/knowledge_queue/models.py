@@ -0,0 +1,56 @@
+"""
+知识写入队列数据库模型定义
+"""
+from sqlalchemy import Column, BigInteger, Integer, Text, func
+from sqlalchemy.dialects.postgresql import TIMESTAMP, JSON
+from knowledge_queue.database import Base
+
+# 队列条目类型
+KIND_BUSINESS = "business"
+KIND_REASONING = "reasoning"
+
+# 队列条目状态
+STATUS_PENDING = "pending"  # 已受理，等待写入
+STATUS_DONE = "done"  # 已写入知识库，可被检索
+STATUS_FAILED = "failed"  # 重试次数用尽，写入失败
+
+
+class AIKnowledgeQueue(Base):
+    """知识写入队列表模型"""
+    __tablename__ = "ai_knowledge_queue"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    kind = Column(Text, nullable=False, comment="知识类型: business / reasoning")
+    payload = Column(JSON, nullable=False, comment="待写入的知识内容")
+    status = Column(Text, nullable=False, default=STATUS_PENDING, index=True, comment="状态")
+    knowledge_id = Column(BigInteger, nullable=True, comment="写入后的知识条目 ID")
+    attempts = Column(Integer, nullable=False, default=0, comment="已尝试次数")
+    error = Column(Text, nullable=True, comment="最近一次失败原因")
+    created_at = Column(
+        TIMESTAMP(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+        comment="受理时间"
+    )
+    processed_at = Column(
+        TIMESTAMP(timezone=True),
+        nullable=True,
+        comment="写入完成时间"
+    )
+
+    def __repr__(self):
+        return f"<AIKnowledgeQueue(id={self.id}, kind='{self.kind}', status='{self.status}')>"
+
+    def to_dict(self):
+        """转换为字典格式"""
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "searchable": self.status == STATUS_DONE,
+            "knowledge_id": self.knowledge_id,
+            "attempts": self.attempts,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "processed_at": self.processed_at.isoformat() if self.processed_at else None,
+        }
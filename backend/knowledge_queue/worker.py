@@ -0,0 +1,262 @@
+"""
+知识写入队列后台线程
+
+批量取出待写入条目，批量计算主向量（问题/任务），并在同一事务中
+插入知识库、标记队列条目完成（每个条目使用独立的保存点，单个条目失败不影响同批的其它条目）。答案/步骤向量仍由各知识库的延迟补全线程计算。
+"""
+import threading
+from typing import Optional
+from sqlalchemy import func
+
+import config
+from knowledge_queue.database import SessionLocal
+from knowledge_queue.models import (
+    AIKnowledgeQueue,
+    KIND_BUSINESS,
+    KIND_REASONING,
+    STATUS_PENDING,
+    STATUS_DONE,
+    STATUS_FAILED,
+)
+from business_knowledge.models import AIBusinessKnowledge
+from business_knowledge.embedding_service import get_embedding_service as get_business_embedding_service
+from business_knowledge.deferred_embedding import get_answer_embedding_worker
+from reasoning_knowledge.models import AIReasoningKnowledge
+from reasoning_knowledge.embedding_service import get_embedding_service as get_reasoning_embedding_service
+from reasoning_knowledge.deferred_embedding import get_step_embedding_worker
+
+# 每批写入的条目数、空闲轮询间隔（秒）与最大重试次数
+KNOWLEDGE_QUEUE_BATCH_SIZE = int(config.config_dict.get("KNOWLEDGE_QUEUE_BATCH_SIZE", "32"))
+KNOWLEDGE_QUEUE_INTERVAL = float(config.config_dict.get("KNOWLEDGE_QUEUE_INTERVAL", "10"))
+KNOWLEDGE_QUEUE_MAX_ATTEMPTS = int(config.config_dict.get("KNOWLEDGE_QUEUE_MAX_ATTEMPTS", "3"))
+
+
+class KnowledgeQueueWorker:
+    """知识写入队列工作线程"""
+
+    def __init__(
+        self,
+        batch_size: int = KNOWLEDGE_QUEUE_BATCH_SIZE,
+        interval: float = KNOWLEDGE_QUEUE_INTERVAL,
+        max_attempts: int = KNOWLEDGE_QUEUE_MAX_ATTEMPTS
+    ):
+        """
+        初始化工作线程
+
+        Args:
+            batch_size: 每批处理的条目数
+            interval: 没有新通知时的轮询间隔（秒），用于处理进程重启前遗留的条目
+            max_attempts: 单个条目的最大尝试次数，超过后标记为失败
+        """
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """启动后台线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run,
+                name="knowledge-queue-worker",
+                daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """停止后台线程"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def notify(self):
+        """通知有新的队列条目，必要时自动启动线程"""
+        self.start()
+        self._wakeup.set()
+
+    def process_batch(self) -> int:
+        """
+        处理一批待写入条目
+
+        主向量按类型批量计算；每个条目在自己的保存点（SAVEPOINT）中写入，
+        单个条目失败（如内容缺字段）只回滚并计入该条目的尝试次数，不影响同批的其它条目。
+
+        Returns:
+            本批处理的条目数（包括失败的条目），0 表示队列已空
+        """
+        db = SessionLocal()
+        entry_ids = []
+        try:
+            # 行锁 + SKIP LOCKED：多进程同时消费时互不重复
+            entries = db.query(AIKnowledgeQueue).filter(
+                AIKnowledgeQueue.status == STATUS_PENDING
+            ).order_by(AIKnowledgeQueue.id).limit(self.batch_size).with_for_update(skip_locked=True).all()
+            if not entries:
+                return 0
+            entry_ids = [entry.id for entry in entries]
+
+            embeddings = {}
+            embeddings.update(self._encode(
+                [entry for entry in entries if entry.kind == KIND_BUSINESS],
+                "question_text",
+                lambda texts: get_business_embedding_service().encode_question(texts)
+            ))
+            embeddings.update(self._encode(
+                [entry for entry in entries if entry.kind == KIND_REASONING],
+                "task_text",
+                lambda texts: get_reasoning_embedding_service().encode_task(texts)
+            ))
+
+            written_kinds = set()
+            for entry in entries:
+                # 未知类型的条目直接标记失败
+                if entry.kind not in (KIND_BUSINESS, KIND_REASONING):
+                    entry.status = STATUS_FAILED
+                    entry.error = f"未知的知识类型: {entry.kind}"
+                    continue
+                try:
+                    # 先 flush 拿到知识条目 ID，再与队列状态在同一事务中提交
+                    with db.begin_nested():
+                        knowledge = self._build_knowledge(entry, embeddings.get(entry.id))
+                        db.add(knowledge)
+                        db.flush()
+                        entry.knowledge_id = knowledge.id
+                        entry.status = STATUS_DONE
+                        entry.attempts += 1
+                        entry.error = None
+                        entry.processed_at = func.now()
+                    written_kinds.add(entry.kind)
+                except Exception as e:
+                    print(f"[知识写入队列] 条目 {entry.id} 写入失败: {type(e).__name__}: {str(e)}")
+                    self._count_attempt(entry, f"{type(e).__name__}: {str(e)}")
+            db.commit()
+
+            if KIND_BUSINESS in written_kinds:
+                get_answer_embedding_worker().notify()
+            if KIND_REASONING in written_kinds:
+                get_step_embedding_worker().notify()
+
+            return len(entries)
+        except Exception as e:
+            db.rollback()
+            print(f"[知识写入队列] 批量写入失败: {str(e)}")
+            self._record_failure(db, entry_ids, str(e))
+            return len(entry_ids)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _encode(entries, text_key: str, encode) -> dict:
+        """
+        批量计算主向量
+
+        内容缺字段的条目不参与计算；批量计算失败时逐条计算，找出出错的条目。
+
+        Returns:
+            队列条目 ID -> 向量；计算失败的条目 ID -> 异常
+        """
+        results = {}
+        valid = []
+        for entry in entries:
+            try:
+                valid.append((entry, entry.payload[text_key]))
+            except Exception as e:
+                results[entry.id] = e
+        if not valid:
+            return results
+        try:
+            for (entry, _), embedding in zip(valid, encode([text for _, text in valid])):
+                results[entry.id] = embedding
+        except Exception:
+            for entry, text in valid:
+                try:
+                    results[entry.id] = encode([text])[0]
+                except Exception as e:
+                    results[entry.id] = e
+        return results
+
+    @staticmethod
+    def _build_knowledge(entry: AIKnowledgeQueue, embedding):
+        """按队列条目构造知识条目（答案/步骤向量由延迟补全线程计算）"""
+        if isinstance(embedding, Exception):
+            raise embedding
+        if embedding is None:
+            raise ValueError("主向量未计算")
+        if entry.kind == KIND_BUSINESS:
+            return AIBusinessKnowledge(
+                question_text=entry.payload["question_text"],
+                answer_text=entry.payload["answer_text"],
+                question_embedding=embedding.tolist(),
+                answer_embedding=None
+            )
+        return AIReasoningKnowledge(
+            task_text=entry.payload["task_text"],
+            step_text=entry.payload["step_text"],
+            task_embedding=embedding.tolist(),
+            step_embedding=None
+        )
+
+    def _count_attempt(self, entry: AIKnowledgeQueue, error: str):
+        """计入单个条目的失败次数，超过最大尝试次数时标记为失败"""
+        entry.attempts += 1
+        entry.error = error
+        if entry.attempts >= self.max_attempts:
+            entry.status = STATUS_FAILED
+
+    def _record_failure(self, db, entry_ids, error: str):
+        """记录失败次数，超过最大尝试次数的条目标记为失败"""
+        if not entry_ids:
+            return
+        try:
+            entries = db.query(AIKnowledgeQueue).filter(AIKnowledgeQueue.id.in_(entry_ids)).all()
+            for entry in entries:
+                self._count_attempt(entry, error)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"[知识写入队列] 记录失败状态失败: {str(e)}")
+
+    def drain(self) -> int:
+        """
+        同步处理队列直到为空
+
+        Returns:
+            处理的条目总数
+        """
+        total = 0
+        while True:
+            processed = self.process_batch()
+            if not processed:
+                return total
+            total += processed
+
+    def _run(self):
+        """后台线程主循环"""
+        while not self._stopped.is_set():
+            try:
+                processed = self.drain()
+                if processed:
+                    print(f"[知识写入队列] 已处理 {processed} 条知识写入请求")
+            except Exception as e:
+                print(f"[知识写入队列] 处理失败: {str(e)}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+
+# 全局工作线程实例
+_knowledge_queue_worker: KnowledgeQueueWorker = None
+
+
+def get_knowledge_queue_worker() -> KnowledgeQueueWorker:
+    """获取全局知识写入队列线程实例（单例模式）"""
+    global _knowledge_queue_worker
+    if _knowledge_queue_worker is None:
+        _knowledge_queue_worker = KnowledgeQueueWorker()
+    return _knowledge_queue_worker
@@ -5,7 +5,8 @@ from math import e
 import os
 import sys
 import asyncio
-from typing import TypedDict, Annotated, Literal, List, Dict, Any
+import time
+from typing import TypedDict, Annotated, Literal, List, Dict, Any, Tuple
 from typing_extensions import Optional
 from action.enhance_task import EnhanceTaskAction
 from langgraph.graph import StateGraph, END
@@ -19,15 +20,35 @@ from business_knowledge.crud import BusinessKnowledgeCRUD
 import config
 from action.decompose_task import DecomposeTaskAction
 from action.ui_tars import UITars
+from action.action_cache import get_action_cache, ACTION_CACHE_ENABLED
 from task_storage.database import get_db as get_task_db
 from task_storage.crud import TaskStorageCRUD
 import json
 from action.judgment_task import JudgmentTask
 from reasoning_knowledge.crud import ReasoningKnowledgeCRUD
-from util.screenshot_util import ScreenshotUtil
+from util.screenshot_util import acquire_capture_pool, release_capture_pool, capture_async
+from util.capture_service import get_capture_service, CAPTURE_SERVICE_ENABLED
+from util.settle_detector import get_settle_detector, SCREEN_SETTLE_ENABLED
+from util.screenshot_archive import get_screenshot_archive, SCREENSHOT_ARCHIVE_ENABLED
+from util.image_handle import ImageHandle
+from util.http_client import get_http_client
+from util.screen_state_index import (
+    get_screen_state_index,
+    format_proven_paths,
+    SCREEN_STATE_INDEX_ENABLED,
+    SCREEN_STATE_SKIP_REACHED,
+)
 from action.multimodal_action.analyze_step import AnalyzeStep
 from action.multimodal_action.optimize_step import OptimizeStep
+from action.multimodal_action.analysis_gate import get_analysis_gate, ANALYSIS_GATE_ENABLED, DECISION_FAIL
+from action.multimodal_action.verification_cache import (
+    get_verification_cache,
+    VERIFICATION_CACHE_ENABLED,
+    DECISION_PASS as VERIFICATION_PASS,
+)
 from action.accumulate_knowledge import AccumulateKnowledgeAction
+from knowledge_queue.database import get_db as get_queue_db
+from knowledge_queue.crud import KnowledgeQueueCRUD
 
 # 配置（从全局配置字典获取）
 OPENAI_API_KEY = config.config_dict.get("OPENAI_API_KEY", "")
@@ -38,15 +59,32 @@ UI_TARS_BASE_URL = config.config_dict.get("UI_TARS_BASE_URL", "")
 UI_TARS_API_KEY = config.config_dict.get("UI_TARS_API_KEY", "")
 UI_TARS_MODEL = config.config_dict.get("UI_TARS_MODEL", "")
 
-# 初始化 LLM
-llm = ChatOpenAI(
-    model=MODEL_NAME,
-    api_key=OPENAI_API_KEY,
-    base_url=OPENAI_BASE_URL if OPENAI_BASE_URL else None,
-    temperature=0.3,
-)
-
-tars = UITars(base_url=UI_TARS_BASE_URL, api_key=UI_TARS_API_KEY, model=UI_TARS_MODEL)
+# LLM 与 UI-TARS 在首次使用时创建，避免导入本模块时就初始化客户端
+_llm: Optional[ChatOpenAI] = None
+_tars: Optional[UITars] = None
+
+
+def get_llm() -> ChatOpenAI:
+    """获取全局 LLM 实例（首次调用时创建）"""
+    global _llm
+    if _llm is None:
+        _llm = ChatOpenAI(
+            model=MODEL_NAME,
+            api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL if OPENAI_BASE_URL else None,
+            temperature=0.3,
+            # 与原生 UI-TARS 执行器共用连接池
+            http_async_client=get_http_client(),
+        )
+    return _llm
+
+
+def get_tars() -> UITars:
+    """获取全局 UI-TARS 实例（首次调用时创建）"""
+    global _tars
+    if _tars is None:
+        _tars = UITars(base_url=UI_TARS_BASE_URL, api_key=UI_TARS_API_KEY, model=UI_TARS_MODEL)
+    return _tars
 
 # === 状态定义 ===
 class AgentState(TypedDict):
@@ -68,11 +106,67 @@ class AgentState(TypedDict):
     # 执行结果
     step_results: List[Dict[str, Any]]  # 步骤执行结果
     final_result: Optional[Dict[str, Any]]  # 最终结果
+    last_screen_image: Optional[ImageHandle]  # 上一步执行后的截图，作为下一步执行前的截图复用
     
     # 消息历史
     messages: Annotated[List, add_messages]  # 消息历史
 
 
+# === 截图 ===
+
+async def capture_screen() -> bytes:
+    """在截图线程池中截取全屏（不阻塞事件循环），并打印各阶段耗时"""
+    image_bytes, timings = await capture_async()
+    print(f"[截图] 耗时: {timings}")
+    return image_bytes
+
+
+async def capture_before_action() -> bytes:
+    """获取执行动作前的截图：后台截图服务运行时直接取缓冲区中此刻之前的最新帧"""
+    service = get_capture_service()
+    if service.running:
+        frame = service.latest_before(time.time())
+        if frame is not None:
+            return await asyncio.to_thread(frame.to_jpeg_bytes)
+    return await capture_screen()
+
+
+async def capture_after_action(action_finished_at: float) -> Tuple[bytes, Optional[Dict[str, Any]]]:
+    """
+    获取执行动作后的截图：先等待画面稳定（动画、加载结束）再截图
+
+    Args:
+        action_finished_at: 动作结束时间（time.time()）
+
+    Returns:
+        (截图, 画面稳定检测结果)；未开启稳定检测时检测结果为 None
+    """
+    service = get_capture_service()
+    settle_result = None
+    if SCREEN_SETTLE_ENABLED:
+        settle_result = await get_settle_detector().wait_for_settle()
+        if service.running:
+            frame = service.latest()
+            if frame is not None and frame.timestamp >= action_finished_at:
+                return await asyncio.to_thread(frame.to_jpeg_bytes), settle_result
+    elif service.running:
+        frame = await service.wait_for_stable_after(action_finished_at)
+        if frame is not None:
+            return await asyncio.to_thread(frame.to_jpeg_bytes), settle_result
+    return await capture_screen(), settle_result
+
+
+async def archive_screen(image: Optional[ImageHandle]) -> Optional[str]:
+    """归档截图并返回帧 ID（未开启归档、没有截图或归档失败时返回 None）"""
+    if not SCREENSHOT_ARCHIVE_ENABLED or image is None or not image.data:
+        return None
+    try:
+        return await asyncio.to_thread(get_screenshot_archive().put, image.data, image.content_hash)
+    except Exception as e:
+        print(f"[截图归档] 归档失败: {str(e)}")
+        return None
+
+
 # === 节点函数 ===
 
 async def enhance_task_node(state: AgentState) -> AgentState:
@@ -91,7 +185,7 @@ async def enhance_task_node(state: AgentState) -> AgentState:
     )
     background_knowledge = "\n".join(["问题：" + result['question_text'] + " 回答：" + result['answer_text'] for result in results])
 
-    action = EnhanceTaskAction(llm)
+    action = EnhanceTaskAction(get_llm())
     enhanced_task = await action.run(background_knowledge=background_knowledge, original_task=state['original_task'])
     
     print(f"[补全任务节点] 补全后任务: {enhanced_task}")
@@ -122,7 +216,7 @@ async def check_executability_node(state: AgentState) -> AgentState:
     else:
         history_tasks = ""
     
-    action = JudgmentTask(llm)
+    action = JudgmentTask(get_llm())
     can_execute, execution_reason = await action.run(history_tasks=history_tasks, task=state['enhanced_task'])
     
     return {
@@ -160,8 +254,24 @@ async def decompose_task_node(state: AgentState) -> AgentState:
         threshold=0.5
     )
     background_knowledge = "\n".join(["问题：" + result['question_text'] + " 回答：" + result['answer_text'] for result in results])
-    action = DecomposeTaskAction(llm)
-    steps = await action.run(history_tasks=history_tasks, background_knowledge=background_knowledge, task=state['enhanced_task'])
+    # 从当前画面出发、已经成功执行过的步骤路径
+    # （截图只用于查询索引，不作为第一个步骤的执行前截图：拆解任务的 LLM 调用期间画面可能已经变化）
+    proven_paths = ""
+    if SCREEN_STATE_INDEX_ENABLED:
+        try:
+            screen_image = ImageHandle(await capture_before_action())
+            paths = await asyncio.to_thread(get_screen_state_index().proven_paths, screen_image.data)
+            proven_paths = format_proven_paths(paths)
+            print(f"[拆解任务节点] 画面状态索引给出 {len(paths)} 条已验证路径")
+        except Exception as e:
+            print(f"[拆解任务节点] 查询画面状态索引失败: {str(e)}")
+    action = DecomposeTaskAction(get_llm())
+    steps = await action.run(
+        history_tasks=history_tasks,
+        background_knowledge=background_knowledge,
+        task=state['enhanced_task'],
+        proven_paths=proven_paths
+    )
     print(f"[拆解任务节点] 拆解出 {len(steps)} 个步骤: {steps}")
     
     return {
@@ -195,17 +305,46 @@ async def execute_subtask_node(state: AgentState) -> AgentState:
     history_steps = "\n".join([f"{idx+1}. {step['step_description']}" for idx, step in enumerate(step_results)])
     need_execute_step = current_step['step']
 
-    analyze_action = AnalyzeStep(llm)
-    optimize_action = OptimizeStep(llm)
+    analyze_action = AnalyzeStep(get_llm())
+    optimize_action = OptimizeStep(get_llm())
 
     try:
         n = 0
         first_flag = False
         second_flag = False
         is_first_attempt_success = False  # 标记是否第一次就成功
+        # 上一步（或上一次尝试）执行后的截图就是本次执行前的画面，无需重新截图
+        # 截图以图片句柄传递，同一帧发给多个多模态 Action 时只编码一次
+        reusable_image = state.get("last_screen_image")
+        current_image = None
+        settle_result = None  # 最近一次执行后的画面稳定检测结果
+        gate_decisions = []  # 每次尝试的分析前置判断记录
+        analysis_images = []  # 每次调用 AnalyzeStep 发送的图片统计
+        frames = []  # 每次尝试执行前后截图的帧 ID（见 /api/frames/{frame_id}）
+        tars_traces = []  # 每次尝试 UI-TARS 的动作轨迹
+        verification_checks = []  # 每次尝试的验证缓存判断记录
+        replay_rejected = False  # 本步骤的缓存动作回放后验证失败，之后的尝试不再回放
+        reached_state = None  # 执行前画面已是该步骤的目标状态时的判断记录
         while n < 3:
             try:
-                previous_image_bytes = ScreenshotUtil.capture_full_screen_bytes()
+                if reusable_image is not None:
+                    previous_image = reusable_image
+                    reusable_image = None
+                else:
+                    previous_image = ImageHandle(await capture_before_action())
+                frames.append({"attempt": len(frames) + 1, "before": await archive_screen(previous_image), "after": None})
+                
+                # 当前画面已经是该步骤成功执行后到达的状态时直接跳过，不调用 UI-TARS 与 LLM
+                if SCREEN_STATE_INDEX_ENABLED and SCREEN_STATE_SKIP_REACHED and len(frames) == 1:
+                    reached_state = await asyncio.to_thread(
+                        get_screen_state_index().reached_target, need_execute_step, previous_image.data
+                    )
+                    if reached_state is not None:
+                        print(f"[执行子任务节点] {reached_state['reason']}")
+                        # 只凭感知哈希判断、没有执行也没有验证：记为跳过，不算第一次就成功
+                        first_flag = second_flag = True
+                        current_image = previous_image
+                        break
                 
                 instruction = """
                 你需要执行'现在需要执行的步骤'中的步骤。
@@ -217,18 +356,75 @@ async def execute_subtask_node(state: AgentState) -> AgentState:
                 可根据实际情况调整'现在需要执行的步骤'，但要保证调整后的步骤所做的事与'现在需要执行的步骤'一致。
                 """
 
-                result = await tars.run(instruction=instruction.format(need_execute_step=need_execute_step))
+                current_image = None
+                # 相同步骤在相同画面上验证通过过时，直接回放记录的动作，不调用 UI-TARS
+                cached_entry = None
+                if ACTION_CACHE_ENABLED and not replay_rejected:
+                    cached_entry = await get_action_cache().lookup(need_execute_step, previous_image)
+                if cached_entry is not None:
+                    print(f"[执行子任务节点] 命中动作缓存（汉明距离 {cached_entry['distance']}），回放 {len(cached_entry['actions'])} 个动作")
+                    result = await get_action_cache().replay(cached_entry, instruction=need_execute_step)
+                else:
+                    result = await get_tars().run(
+                        instruction=instruction.format(need_execute_step=need_execute_step),
+                        screenshot=previous_image
+                    )
+                action_finished_at = time.time()
+                tars_traces.append(result.get("trace"))
                 first_flag = result.get('success', False)
                 print(f"[执行子任务节点] 执行结果: {first_flag}")
                 if first_flag:
-                    current_image_bytes = ScreenshotUtil.capture_full_screen_bytes()
-                    second_flag, reason = await analyze_action.run(
-                        task=state.get("enhanced_task"),
-                        history_steps=history_steps,
-                        current_step=need_execute_step,
-                        previous_image=previous_image_bytes,
-                        current_image=current_image_bytes
-                    )
+                    current_image_bytes, settle_result = await capture_after_action(action_finished_at)
+                    current_image = ImageHandle(current_image_bytes)
+                    reusable_image = current_image
+                    frames[-1]["after"] = await archive_screen(current_image)
+                    # 先在本地对比前后截图，明显无需 LLM 判断的情况直接得出结论
+                    gate_decision = None
+                    if ANALYSIS_GATE_ENABLED:
+                        gate_decision = await asyncio.to_thread(
+                            get_analysis_gate().evaluate, need_execute_step, previous_image.data, current_image.data
+                        )
+                        gate_decisions.append(gate_decision)
+                    # 执行后的画面与该步骤已知正确的画面一致时，直接判定通过（按采样率仍交给 LLM 验证）
+                    verification = None
+                    if VERIFICATION_CACHE_ENABLED and (gate_decision is None or gate_decision["decision"] != DECISION_FAIL):
+                        verification = await asyncio.to_thread(
+                            get_verification_cache().check, need_execute_step, previous_image.data, current_image.data
+                        )
+                        verification_checks.append(verification)
+                    if gate_decision is not None and gate_decision["decision"] == DECISION_FAIL:
+                        second_flag, reason = False, gate_decision["reason"]
+                    elif verification is not None and verification["decision"] == VERIFICATION_PASS:
+                        second_flag, reason = True, verification["reason"]
+                    else:
+                        second_flag, reason = await analyze_action.run(
+                            task=state.get("enhanced_task"),
+                            history_steps=history_steps,
+                            current_step=need_execute_step,
+                            previous_image=previous_image,
+                            current_image=current_image
+                        )
+                        analysis_images.append(analyze_action.last_image_stats)
+                        if verification is not None:
+                            await asyncio.to_thread(
+                                get_verification_cache().learn, need_execute_step, verification, second_flag
+                            )
+                    # 记录状态转移（执行前画面, 步骤, 执行后画面）
+                    if SCREEN_STATE_INDEX_ENABLED:
+                        await asyncio.to_thread(
+                            get_screen_state_index().record_transition,
+                            need_execute_step, previous_image.data, current_image.data, second_flag
+                        )
+                    if cached_entry is not None and not second_flag:
+                        # 回放的动作没有达到预期，删除缓存条目，从当前画面重新调用 UI-TARS（不计入优化次数）
+                        await get_action_cache().invalidate_entry(cached_entry)
+                        replay_rejected = True
+                        continue
+                    if second_flag and ACTION_CACHE_ENABLED:
+                        if cached_entry is not None:
+                            await get_action_cache().mark_used(cached_entry)
+                        else:
+                            await get_action_cache().record(need_execute_step, previous_image, result)
                     if second_flag:
                         # 如果第一次就成功（n == 0），标记为完美步骤
                         if n == 0:
@@ -248,6 +444,13 @@ async def execute_subtask_node(state: AgentState) -> AgentState:
                                 "success": False,
                                 "error": "优化步骤超过3次，自动结束",
                                 "analysis": reason if 'reason' in locals() else "分析失败",
+                                "settle": settle_result,
+                                "analysis_gate": gate_decisions,
+                                "verification_cache": verification_checks,
+                                "analysis_images": analysis_images,
+                                "image_calls": analyze_action.image_calls + optimize_action.image_calls,
+                                "frames": frames,
+                                "ui_tars_traces": tars_traces,
                             }
                             step_results.append(step_result)
                             next_index = current_step_index + 1
@@ -256,6 +459,7 @@ async def execute_subtask_node(state: AgentState) -> AgentState:
                                 "steps": steps,  # 更新优化后的步骤
                                 "current_step_index": next_index,
                                 "step_results": step_results,
+                                "last_screen_image": current_image,
                                 "messages": [AIMessage(content=f"子任务 {current_step_index + 1} 优化失败，已标记为失败")]
                             }
                         
@@ -269,11 +473,16 @@ async def execute_subtask_node(state: AgentState) -> AgentState:
                         
                         # 调用优化步骤
                         try:
+                            proven_paths = ""
+                            if SCREEN_STATE_INDEX_ENABLED:
+                                paths = await asyncio.to_thread(get_screen_state_index().proven_paths, current_image.data)
+                                proven_paths = format_proven_paths(paths)
                             optimized_steps = await optimize_action.run(
                                 task=state.get("enhanced_task"),
                                 history_steps=history_steps,
                                 remaining_steps=remaining_steps_text,
-                                current_image=current_image_bytes
+                                current_image=current_image,
+                                proven_paths=proven_paths
                             )
                             
                             if optimized_steps and len(optimized_steps) > 0:
@@ -322,6 +531,10 @@ async def execute_subtask_node(state: AgentState) -> AgentState:
                         
                         continue
 
+                elif cached_entry is not None:
+                    # 回放出错，退回 UI-TARS
+                    replay_rejected = True
+                    continue
                 else:
                     n += 1
                     continue
@@ -365,10 +578,19 @@ async def execute_subtask_node(state: AgentState) -> AgentState:
                 "step_id": current_step.get("id"),
                 "step_description": current_step.get("step"),
                 "success": True,
-                "analysis": "执行成功",
+                "analysis": "画面已是目标状态，跳过执行" if reached_state is not None else "执行成功",
+                "skipped": reached_state is not None,  # 是否因画面已是目标状态而跳过执行（不计入完美执行）
                 "first_flag": first_flag,
                 "second_flag": second_flag,
                 "is_first_attempt_success": is_first_attempt_success,  # 是否第一次就成功
+                "settle": settle_result,  # 执行后等待画面稳定的耗时
+                "analysis_gate": gate_decisions,  # 分析前置判断记录
+                "verification_cache": verification_checks,  # 验证缓存判断记录
+                "analysis_images": analysis_images,  # AnalyzeStep 发送的图片统计
+                "image_calls": analyze_action.image_calls + optimize_action.image_calls,  # 每次调用的图片规格与大小
+                "frames": frames,  # 每次尝试执行前后截图的帧 ID
+                "ui_tars_traces": tars_traces,  # 每次尝试 UI-TARS 的动作、坐标、模型耗时与循环次数
+                "screen_state": reached_state,  # 执行前画面已是目标状态而跳过执行时的判断记录
             }
         else:
             # 如果失败，记录失败结果
@@ -381,6 +603,13 @@ async def execute_subtask_node(state: AgentState) -> AgentState:
                 "first_flag": first_flag,
                 "second_flag": second_flag,
                 "is_first_attempt_success": False,
+                "settle": settle_result,
+                "analysis_gate": gate_decisions,
+                "verification_cache": verification_checks,
+                "analysis_images": analysis_images,
+                "image_calls": analyze_action.image_calls + optimize_action.image_calls,
+                "frames": frames,
+                "ui_tars_traces": tars_traces,
             }
         
         step_results.append(step_result)
@@ -394,6 +623,7 @@ async def execute_subtask_node(state: AgentState) -> AgentState:
             "steps": steps,  # 更新优化后的步骤
             "current_step_index": next_index,
             "step_results": step_results,
+            "last_screen_image": current_image,
             "messages": [AIMessage(content=f"子任务 {current_step_index + 1} 执行完成")]
         }
     
@@ -403,19 +633,19 @@ async def execute_subtask_node(state: AgentState) -> AgentState:
         print(f"[执行子任务节点] 错误详情: {traceback.format_exc()}")
         
         # 初始化变量
-        previous_image_bytes = None
-        current_image_bytes = None
+        previous_image = None
+        current_image = None
         analysis_result = None
         
         # 如果执行失败，仍然尝试截图和分析
         try:
-            previous_image_bytes = ScreenshotUtil.capture_full_screen_bytes()
+            previous_image = ImageHandle(await capture_screen())
         except:
             pass
         
-        if previous_image_bytes:
+        if previous_image:
             try:
-                current_image_bytes = ScreenshotUtil.capture_full_screen_bytes()
+                current_image = ImageHandle(await capture_screen())
                 
                 # 尝试分析
                 task = state.get("enhanced_task", "")
@@ -426,8 +656,8 @@ async def execute_subtask_node(state: AgentState) -> AgentState:
                     analysis_result = await analyze_action.run(
                         history_steps=history_steps,
                         current_step=need_execute_step,
-                        previous_image=previous_image_bytes,
-                        current_image=current_image_bytes
+                        previous_image=previous_image,
+                        current_image=current_image
                     )
                 except:
                     analysis_result = None
@@ -440,6 +670,11 @@ async def execute_subtask_node(state: AgentState) -> AgentState:
             "success": False,
             "error": str(e),
             "analysis": analysis_result,
+            "frames": [{
+                "attempt": 1,
+                "before": await archive_screen(previous_image),
+                "after": await archive_screen(current_image),
+            }],
         }
         step_results.append(step_result)
         # 移动到下一个子任务（即使失败也继续）
@@ -450,6 +685,7 @@ async def execute_subtask_node(state: AgentState) -> AgentState:
         "steps": steps,  # 更新优化后的步骤
         "current_step_index": next_index,
         "step_results": step_results,
+        "last_screen_image": None,
         "messages": [AIMessage(content=f"子任务 {current_step_index + 1} 执行完成")]
     }
 
@@ -470,35 +706,41 @@ async def finalize_node(state: AgentState) -> AgentState:
     all_success = all(r.get("success", False) for r in step_results)
 
     if all_success:
-        accumulate_knowledge_action = AccumulateKnowledgeAction(llm)
+        accumulate_knowledge_action = AccumulateKnowledgeAction(get_llm())
         task_text = state.get("enhanced_task")
         step_text = "\n".join([
             f"{idx+1}. {step.get('step_description', '')}"
             for idx, step in enumerate(step_results)
         ])
         knowledge_list = await accumulate_knowledge_action.run(task=task_text, steps=step_text)
-        print(f"[结束节点] 总结的知识: {knowledge}")
-        for knowledge in knowledge_list:
-            try:
-                db = next(get_reasoning_db())
-                crud = ReasoningKnowledgeCRUD(db)
-                knowledge = crud.create(
-                    task_text=task_text,
-                    step_text=step_text
+        print(f"[结束节点] 总结的知识: {knowledge_list}")
+        # 写入知识队列后立即返回，embedding 计算与入库由后台线程完成
+        db = next(get_queue_db())
+        try:
+            crud = KnowledgeQueueCRUD(db)
+            for knowledge in knowledge_list:
+                if not knowledge.get("question") or not knowledge.get("answer"):
+                    continue
+                entry = crud.enqueue_business(
+                    question_text=knowledge["question"],
+                    answer_text=knowledge["answer"]
                 )
-            except Exception as e:
-                print(f"[结束节点] 存入知识库失败: {str(e)}")
-                import traceback
-                traceback.print_exc()
-            finally:
-                db.close()
+                print(f"[结束节点] 业务知识已加入写入队列，队列 ID: {entry.id}")
+        except Exception as e:
+            print(f"[结束节点] 存入知识库失败: {str(e)}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            db.close()
 
     # 检查所有步骤是否都是第一次就完美执行（first_flag 和 second_flag 都为 True，且 is_first_attempt_success 为 True）
+    # 因画面已是目标状态而跳过的步骤没有经过执行与验证，不能作为完美步骤写入推理知识库
     all_perfect = all(
         r.get("success", False) and 
         r.get("first_flag", False) and 
         r.get("second_flag", False) and 
-        r.get("is_first_attempt_success", False)
+        r.get("is_first_attempt_success", False) and
+        not r.get("skipped", False)
         for r in step_results
     )
 
@@ -508,8 +750,8 @@ async def finalize_node(state: AgentState) -> AgentState:
     # 如果所有步骤都完美，将任务和步骤存入知识库
     if all_perfect and len(step_results) > 0:
         try:
-            db = next(get_reasoning_db())
-            crud = ReasoningKnowledgeCRUD(db)
+            db = next(get_queue_db())
+            crud = KnowledgeQueueCRUD(db)
             
             # 准备任务文本和步骤文本
             task_text = state.get("enhanced_task")
@@ -518,12 +760,12 @@ async def finalize_node(state: AgentState) -> AgentState:
                 for idx, step in enumerate(step_results)
             ])
             
-            # 存入知识库
-            knowledge = crud.create(
+            # 写入知识队列，由后台线程计算 embedding 并存入推理知识库
+            entry = crud.enqueue_reasoning(
                 task_text=task_text,
                 step_text=step_text
             )
-            print(f"[结束节点] 完美步骤已存入知识库，ID: {knowledge.id}")
+            print(f"[结束节点] 完美步骤已加入写入队列，队列 ID: {entry.id}")
             db.close()
         except Exception as e:
             print(f"[结束节点] 存入知识库失败: {str(e)}")
@@ -648,6 +890,7 @@ async def run_task(task: str, task_id: Optional[int] = None) -> Dict[str, Any]:
         "current_step_index": 0,
         "step_results": [],
         "final_result": None,
+        "last_screen_image": None,
         "messages": [],
     }
     
@@ -657,7 +900,20 @@ async def run_task(task: str, task_id: Optional[int] = None) -> Dict[str, Any]:
     print(f"{'='*60}\n")
     
     
-    final_state = await app.ainvoke(initial_state)
+    # 任务期间复用截图线程池及池中各线程的截图句柄（执行图节点通过 capture_async 在池中截图）
+    acquire_capture_pool()
+    if CAPTURE_SERVICE_ENABLED:
+        get_capture_service().acquire()
+    try:
+        final_state = await app.ainvoke(initial_state)
+    finally:
+        if CAPTURE_SERVICE_ENABLED:
+            get_capture_service().release()
+        # 最后一个任务结束时关闭线程池，会等待进行中的截图完成
+        await asyncio.to_thread(release_capture_pool)
+        # 写入画面状态索引中尚未保存的转移（执行期间按时间间隔合并写入）
+        if SCREEN_STATE_INDEX_ENABLED:
+            await asyncio.to_thread(get_screen_state_index().flush)
     
     print(f"\n{'='*60}")
     print(f"任务执行完成")
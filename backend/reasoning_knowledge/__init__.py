@@ -5,6 +5,7 @@ from reasoning_knowledge.database import init_db, get_db, Base, engine, SessionL
 from reasoning_knowledge.models import AIReasoningKnowledge
 from reasoning_knowledge.embedding_service import EmbeddingService, get_embedding_service
 from reasoning_knowledge.crud import ReasoningKnowledgeCRUD
+from reasoning_knowledge.deferred_embedding import StepEmbeddingWorker, get_step_embedding_worker
 
 __all__ = [
     "init_db",
@@ -16,5 +17,7 @@ __all__ = [
     "EmbeddingService",
     "get_embedding_service",
     "ReasoningKnowledgeCRUD",
+    "StepEmbeddingWorker",
+    "get_step_embedding_worker",
 ]
 
@@ -6,7 +6,21 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 import numpy as np
 from reasoning_knowledge.models import AIReasoningKnowledge
-from reasoning_knowledge.embedding_service import get_embedding_service
+from reasoning_knowledge.embedding_service import (
+    get_embedding_service,
+    get_small_embedding_service,
+    TWO_STAGE_RETRIEVAL,
+)
+from reasoning_knowledge.deferred_embedding import get_step_embedding_worker, DEFERRED_EMBEDDING_BATCH_SIZE
+import config
+from util.score_calibration import ScoreCalibration
+
+# 两阶段检索：小模型召回的候选数，以及判定小模型结果"不明确"的分差
+TWO_STAGE_CANDIDATES = int(config.config_dict.get("TWO_STAGE_CANDIDATES", "20"))
+TWO_STAGE_MARGIN = float(config.config_dict.get("TWO_STAGE_MARGIN", "0.05"))
+
+# 全局小模型分数校准实例（小模型分数换算到大模型尺度后才能与阈值比较、作为相似度返回）
+_small_score_calibration = ScoreCalibration()
 
 
 class ReasoningKnowledgeCRUD:
@@ -25,7 +39,8 @@ class ReasoningKnowledgeCRUD:
     def create(
         self,
         task_text: str,
-        step_text: str
+        step_text: str,
+        defer_step_embedding: bool = True
     ) -> AIReasoningKnowledge:
         """
         创建新的知识条目
@@ -33,23 +48,28 @@ class ReasoningKnowledgeCRUD:
         Args:
             task_text: 任务文本
             step_text: 步骤文本
+            defer_step_embedding: 是否将步骤向量交给后台线程延迟计算
             
         Returns:
             创建的知识条目对象
         """
         # 生成 embedding
         task_embedding = self.embedding_service.encode_task(task_text)
-        step_embedding = self.embedding_service.encode_step(step_text)
         
         # 确保是单个向量（不是批量）
         if task_embedding.ndim > 1:
             task_embedding = task_embedding[0]
-        if step_embedding.ndim > 1:
-            step_embedding = step_embedding[0]
         
         # 转换为列表格式（pgvector 需要）
         task_embedding_list = task_embedding.tolist()
-        step_embedding_list = step_embedding.tolist()
+        
+        # 步骤向量仅用于 search_by_step，默认置空由后台线程补全
+        step_embedding_list = None
+        if not defer_step_embedding:
+            step_embedding = self.embedding_service.encode_step(step_text)
+            if step_embedding.ndim > 1:
+                step_embedding = step_embedding[0]
+            step_embedding_list = step_embedding.tolist()
         
         # 创建新记录
         knowledge = AIReasoningKnowledge(
@@ -63,6 +83,9 @@ class ReasoningKnowledgeCRUD:
         self.db.commit()
         self.db.refresh(knowledge)
         
+        if step_embedding_list is None or TWO_STAGE_RETRIEVAL:
+            get_step_embedding_worker().notify()
+        
         return knowledge
     
     def get_by_id(self, knowledge_id: int) -> Optional[AIReasoningKnowledge]:
@@ -125,18 +148,20 @@ class ReasoningKnowledgeCRUD:
             if task_embedding.ndim > 1:
                 task_embedding = task_embedding[0]
             knowledge.task_embedding = task_embedding.tolist()
+            # 小模型向量置空，由后台线程重新生成
+            knowledge.task_embedding_small = None
         
         if step_text is not None:
             knowledge.step_text = step_text
-            # 重新生成 embedding
-            step_embedding = self.embedding_service.encode_step(step_text)
-            if step_embedding.ndim > 1:
-                step_embedding = step_embedding[0]
-            knowledge.step_embedding = step_embedding.tolist()
+            # 步骤向量置空，由后台线程重新生成
+            knowledge.step_embedding = None
         
         self.db.commit()
         self.db.refresh(knowledge)
         
+        if step_text is not None or (task_text is not None and TWO_STAGE_RETRIEVAL):
+            get_step_embedding_worker().notify()
+        
         return knowledge
     
     def delete(self, knowledge_id: int) -> bool:
@@ -175,6 +200,15 @@ class ReasoningKnowledgeCRUD:
         Returns:
             搜索结果列表，每个结果包含知识条目信息和相似度分数
         """
+        if TWO_STAGE_RETRIEVAL:
+            try:
+                search_results = self._two_stage_search_by_task(query_text, top_k, threshold)
+                if search_results is not None:
+                    return search_results
+            except Exception as e:
+                self.db.rollback()
+                print(f"两阶段检索失败，使用单阶段检索: {str(e)}")
+        
         # 生成查询向量
         query_embedding = self.embedding_service.encode_task(query_text)
         if query_embedding.ndim > 1:
@@ -230,11 +264,107 @@ class ReasoningKnowledgeCRUD:
                 search_results.append(result_dict)
             return search_results
     
+    def _two_stage_search_by_task(
+        self,
+        query_text: str,
+        top_k: int,
+        threshold: float
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        两阶段检索：小模型向量召回候选，仅在小模型结果不明确时才用大模型编码查询并重打分
+        
+        小模型分数先换算到大模型尺度（ScoreCalibration，由每次重打分的结果在线拟合），
+        返回的相似度与阈值始终在大模型尺度上。不明确是指：尚未完成校准，
+        或第 top_k 名与第 top_k+1 名的分差小于 TWO_STAGE_MARGIN（排序边界不可靠），
+        或前 top_k 个候选中有换算后的分数落在阈值 ± (TWO_STAGE_MARGIN + 换算残差) 内（是否保留不可靠）。
+        
+        Args:
+            query_text: 查询任务文本
+            top_k: 返回最相似的前 k 个结果
+            threshold: 相似度阈值（0-1），低于此值的结果将被过滤
+            
+        Returns:
+            搜索结果列表（rescored 表示是否经过大模型重打分），
+            存在未补全小模型向量的条目时返回 None，由调用方回退到单阶段检索
+        """
+        pending = self.db.execute(
+            text("SELECT EXISTS (SELECT 1 FROM ai_reasoning_knowledge WHERE task_embedding_small IS NULL)")
+        ).scalar()
+        if pending:
+            get_step_embedding_worker().notify()
+            return None
+        
+        # 第一阶段：小模型召回候选
+        small_embedding = get_small_embedding_service().encode_task(query_text)
+        if small_embedding.ndim > 1:
+            small_embedding = small_embedding[0]
+        small_vector_str = '[' + ','.join(map(str, small_embedding.tolist())) + ']'
+        candidates = self.db.execute(
+            text("""
+                SELECT id, 1 - (task_embedding_small <=> CAST(:query_vector AS vector)) as similarity
+                FROM ai_reasoning_knowledge
+                ORDER BY task_embedding_small <=> CAST(:query_vector AS vector)
+                LIMIT :limit
+            """),
+            {
+                "query_vector": small_vector_str,
+                "limit": max(TWO_STAGE_CANDIDATES, top_k + 1)
+            }
+        ).fetchall()
+        if not candidates:
+            return []
+        
+        scores = [float(row.similarity) for row in candidates]
+        calibrated = [_small_score_calibration.calibrate(score) for score in scores]
+        ambiguous = calibrated[0] is None or (
+            len(scores) > top_k and scores[top_k - 1] - scores[top_k] < TWO_STAGE_MARGIN
+        ) or any(
+            abs(score - threshold) < TWO_STAGE_MARGIN + _small_score_calibration.residual
+            for score in calibrated[:top_k]
+        )
+        
+        if ambiguous:
+            # 第二阶段：大模型编码查询，用已存储的大模型向量对全部候选重打分（同时用于校准小模型分数）
+            query_embedding = self.embedding_service.encode_task(query_text)
+            if query_embedding.ndim > 1:
+                query_embedding = query_embedding[0]
+            query_vector_str = '[' + ','.join(map(str, query_embedding.tolist())) + ']'
+            rescored = self.db.execute(
+                text("""
+                    SELECT id, 1 - (task_embedding <=> CAST(:query_vector AS vector)) as similarity
+                    FROM ai_reasoning_knowledge
+                    WHERE id = ANY(:ids)
+                    ORDER BY task_embedding <=> CAST(:query_vector AS vector)
+                """),
+                {
+                    "query_vector": query_vector_str,
+                    "ids": [row.id for row in candidates]
+                }
+            ).fetchall()
+            large_scores = {row.id: float(row.similarity) for row in rescored}
+            observed = [(score, large_scores[row.id]) for row, score in zip(candidates, scores) if row.id in large_scores]
+            _small_score_calibration.observe([pair[0] for pair in observed], [pair[1] for pair in observed])
+            ranked = [(row.id, float(row.similarity)) for row in rescored[:top_k]]
+        else:
+            ranked = [(row.id, score) for row, score in zip(candidates[:top_k], calibrated)]
+        
+        search_results = []
+        for knowledge_id, similarity in ranked:
+            if similarity >= threshold:
+                knowledge = self.get_by_id(knowledge_id)
+                if knowledge:
+                    result_dict = knowledge.to_dict()
+                    result_dict['similarity'] = similarity
+                    result_dict['rescored'] = ambiguous
+                    search_results.append(result_dict)
+        return search_results
+    
     def search_by_step(
         self,
         query_text: str,
         top_k: int = 5,
-        threshold: float = 0.0
+        threshold: float = 0.0,
+        include_pending: bool = True
     ) -> List[Dict[str, Any]]:
         """
         根据步骤文本进行向量相似度搜索
@@ -243,10 +373,18 @@ class ReasoningKnowledgeCRUD:
             query_text: 查询文本
             top_k: 返回最相似的前 k 个结果
             threshold: 相似度阈值（0-1），低于此值的结果将被过滤
+            include_pending: 是否包含步骤向量尚未计算的条目（先同步补全最多一批再搜索，
+                其余条目由后台线程补全），为 False 时直接跳过这些条目
             
         Returns:
             搜索结果列表，每个结果包含知识条目信息和相似度分数
         """
+        if include_pending:
+            try:
+                get_step_embedding_worker().fill_pending(self.db, limit=DEFERRED_EMBEDDING_BATCH_SIZE)
+            except Exception as e:
+                print(f"补全待计算步骤向量失败，跳过这些条目: {str(e)}")
+        
         # 生成查询向量
         query_embedding = self.embedding_service.encode_step(query_text)
         if query_embedding.ndim > 1:
@@ -265,6 +403,7 @@ class ReasoningKnowledgeCRUD:
                         id, task_text, step_text, created_at, updated_at,
                         1 - (step_embedding <=> CAST(:query_vector AS vector)) as similarity
                     FROM ai_reasoning_knowledge
+                    WHERE step_embedding IS NOT NULL
                     ORDER BY step_embedding <=> CAST(:query_vector AS vector)
                     LIMIT :top_k
                 """),
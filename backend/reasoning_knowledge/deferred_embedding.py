@@ -0,0 +1,181 @@
+"""
+步骤向量延迟计算服务
+
+create/update 只同步计算任务向量，step_embedding 先置空（待计算），
+由后台线程批量补全，写入延迟约减半。
+开启两阶段检索时同时补全任务小模型向量。
+"""
+import threading
+from typing import Optional
+from sqlalchemy.orm import Session
+
+import config
+from reasoning_knowledge.database import SessionLocal
+from reasoning_knowledge.models import AIReasoningKnowledge
+from reasoning_knowledge.embedding_service import (
+    get_embedding_service,
+    get_small_embedding_service,
+    TWO_STAGE_RETRIEVAL,
+)
+
+# 每批补全的条目数与空闲轮询间隔（秒）
+DEFERRED_EMBEDDING_BATCH_SIZE = int(config.config_dict.get("DEFERRED_EMBEDDING_BATCH_SIZE", "32"))
+DEFERRED_EMBEDDING_INTERVAL = float(config.config_dict.get("DEFERRED_EMBEDDING_INTERVAL", "30"))
+
+
+class StepEmbeddingWorker:
+    """后台批量补全 step_embedding 的工作线程"""
+
+    def __init__(
+        self,
+        batch_size: int = DEFERRED_EMBEDDING_BATCH_SIZE,
+        interval: float = DEFERRED_EMBEDDING_INTERVAL
+    ):
+        """
+        初始化工作线程
+
+        Args:
+            batch_size: 每批编码的条目数
+            interval: 没有新通知时的轮询间隔（秒），用于补全进程重启前遗留的待计算条目
+        """
+        self.batch_size = batch_size
+        self.interval = interval
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """启动后台线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run,
+                name="step-embedding-worker",
+                daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """停止后台线程"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def notify(self):
+        """通知有新的待计算条目，必要时自动启动线程"""
+        self.start()
+        self._wakeup.set()
+
+    def fill_pending(self, db: Optional[Session] = None, limit: Optional[int] = None) -> int:
+        """
+        同步补全待计算的步骤向量
+
+        Args:
+            db: 数据库会话，为 None 时自动创建
+            limit: 最多补全的条目数，None 表示全部补全
+
+        Returns:
+            本次补全的条目数
+        """
+        own_session = db is None
+        if own_session:
+            db = SessionLocal()
+        # 有待计算的条目时才加载模型（启动时的 notify 不应触发加载大模型）
+        embedding_service = None
+        filled = 0
+        try:
+            while limit is None or filled < limit:
+                batch_size = self.batch_size if limit is None else min(self.batch_size, limit - filled)
+                # 行锁 + SKIP LOCKED：多进程同时补全时互不重复，且与并发 update 互斥
+                rows = db.query(AIReasoningKnowledge).filter(
+                    AIReasoningKnowledge.step_embedding.is_(None)
+                ).order_by(AIReasoningKnowledge.id).limit(batch_size).with_for_update(skip_locked=True).all()
+                if not rows:
+                    break
+
+                if embedding_service is None:
+                    embedding_service = get_embedding_service()
+                embeddings = embedding_service.encode_step([row.step_text for row in rows])
+                for row, embedding in zip(rows, embeddings):
+                    row.step_embedding = embedding.tolist()
+                db.commit()
+                filled += len(rows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            if own_session:
+                db.close()
+        return filled
+
+    def fill_pending_small(self, db: Optional[Session] = None) -> int:
+        """
+        同步补全两阶段检索所需的任务小模型向量
+
+        Args:
+            db: 数据库会话，为 None 时自动创建
+
+        Returns:
+            本次补全的条目数
+        """
+        own_session = db is None
+        if own_session:
+            db = SessionLocal()
+        small_embedding_service = None
+        filled = 0
+        try:
+            while True:
+                rows = db.query(AIReasoningKnowledge).filter(
+                    AIReasoningKnowledge.task_embedding_small.is_(None)
+                ).order_by(AIReasoningKnowledge.id).limit(self.batch_size).with_for_update(skip_locked=True).all()
+                if not rows:
+                    break
+
+                if small_embedding_service is None:
+                    small_embedding_service = get_small_embedding_service()
+                embeddings = small_embedding_service.encode_task([row.task_text for row in rows])
+                for row, embedding in zip(rows, embeddings):
+                    row.task_embedding_small = embedding.tolist()
+                db.commit()
+                filled += len(rows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            if own_session:
+                db.close()
+        return filled
+
+    def _run(self):
+        """后台线程主循环"""
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                filled = self.fill_pending()
+                if filled:
+                    print(f"[步骤向量补全] 已补全 {filled} 条步骤向量")
+                if TWO_STAGE_RETRIEVAL:
+                    filled = self.fill_pending_small()
+                    if filled:
+                        print(f"[步骤向量补全] 已补全 {filled} 条任务小模型向量")
+            except Exception as e:
+                print(f"[步骤向量补全] 补全失败: {str(e)}")
+
+
+# 全局工作线程实例
+_step_embedding_worker: StepEmbeddingWorker = None
+
+
+def get_step_embedding_worker() -> StepEmbeddingWorker:
+    """获取全局步骤向量补全线程实例（单例模式）"""
+    global _step_embedding_worker
+    if _step_embedding_worker is None:
+        _step_embedding_worker = StepEmbeddingWorker()
+    return _step_embedding_worker
@@ -1,49 +1,247 @@
 """
 Embedding 服务 - 使用 BGE-Large 模型（通过 transformers）
+
+torch / transformers 导入耗时较长，推迟到首次创建服务时再导入。
+配置了本地快照目录时，以 mmap 方式加载 safetensors 权重：权重页由操作系统在
+多个进程（多个 uvicorn worker、后台补全进程）之间共享，且完全离线。
+开启空闲卸载后，模型空闲超过指定秒数即释放，下次编码时再按需加载。
 """
+import contextlib
+import gc
+import threading
+import time
 import numpy as np
-import torch
-from typing import List, Union
-from transformers import AutoModel, AutoTokenizer
+from pathlib import Path
+from typing import List, Optional, Union
+import config
+
+# 两阶段检索：小模型召回候选，已存储的大模型向量重打分
+TWO_STAGE_RETRIEVAL = config.config_dict.get("TWO_STAGE_RETRIEVAL", "false").lower() in ("1", "true", "yes")
+SMALL_EMBEDDING_MODEL = config.config_dict.get("SMALL_EMBEDDING_MODEL", "BAAI/bge-small-zh-v1.5")
+
+# 固定版本的本地模型快照目录（为空时从 HuggingFace 缓存加载）
+EMBEDDING_MODEL_PATH = config.config_dict.get("EMBEDDING_MODEL_PATH", "")
+SMALL_EMBEDDING_MODEL_PATH = config.config_dict.get("SMALL_EMBEDDING_MODEL_PATH", "")
+
+# 模型空闲多少秒后卸载（0 表示常驻内存）
+EMBEDDING_IDLE_UNLOAD_SECONDS = float(config.config_dict.get("EMBEDDING_IDLE_UNLOAD_SECONDS", "0"))
 
 
 class EmbeddingService:
     """BGE-Large 模型 Embedding 服务（使用 transformers）"""
     
-    def __init__(self, model_name: str = "BAAI/bge-large-zh-v1.5"):
+    def __init__(
+        self,
+        model_name: str = "BAAI/bge-large-zh-v1.5",
+        model_path: Optional[str] = None,
+        idle_unload_seconds: float = 0
+    ):
         """
         初始化 Embedding 服务
         
         Args:
             model_name: BGE 模型名称，默认为 bge-large-zh-v1.5
+            model_path: 本地模型快照目录，提供时离线加载并 mmap 映射 safetensors 权重
+            idle_unload_seconds: 模型空闲多少秒后卸载，0 表示常驻内存
         """
         self.model_name = model_name
+        self.model_path = model_path or None
+        self.idle_unload_seconds = idle_unload_seconds
+        self.mmap_loaded = False
         self.model = None
         self.tokenizer = None
+        import torch
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        
+        # 模型加载/卸载状态与指标
+        self._lock = threading.RLock()
+        self._active_calls = 0
+        self._last_used = time.monotonic()
+        self.load_count = 0
+        self.unload_count = 0
+        self.encode_count = 0
+        self.last_load_seconds = 0.0
+        self.total_load_seconds = 0.0
+        
         self._load_model()
+        if self.idle_unload_seconds > 0:
+            threading.Thread(
+                target=self._idle_monitor,
+                name=f"embedding-idle-monitor-{model_name}",
+                daemon=True
+            ).start()
     
     def _load_model(self):
         """加载 BGE 模型"""
+        from transformers import AutoModel, AutoTokenizer
+        started = time.perf_counter()
         try:
-            print(f"正在加载 BGE 模型: {self.model_name}")
+            print(f"正在加载 BGE 模型: {self.model_path or self.model_name}")
             print(f"使用设备: {self.device}")
             
-            # 加载 tokenizer
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-            
-            # 加载模型
-            self.model = AutoModel.from_pretrained(self.model_name)
+            if self.model_path:
+                if not Path(self.model_path).is_dir():
+                    raise FileNotFoundError(f"模型快照目录不存在: {self.model_path}")
+                # 本地快照：只读本地文件，不访问网络
+                self.tokenizer = AutoTokenizer.from_pretrained(self.model_path, local_files_only=True)
+                self.model = self._load_mmap_model(self.model_path)
+                if self.model is None:
+                    self.model = AutoModel.from_pretrained(self.model_path, local_files_only=True)
+            else:
+                # 加载 tokenizer
+                self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                
+                # 加载模型
+                self.model = AutoModel.from_pretrained(self.model_name)
             self.model.eval()  # 设置为评估模式
             
             # 移动到指定设备
             self.model = self.model.to(self.device)
             
-            print(f"BGE 模型加载成功: {self.model_name}")
+            self.last_load_seconds = time.perf_counter() - started
+            self.total_load_seconds += self.last_load_seconds
+            self.load_count += 1
+            self._last_used = time.monotonic()
+            print(f"BGE 模型加载成功: {self.model_name}，耗时 {self.last_load_seconds:.2f}s")
         except Exception as e:
             print(f"加载 BGE 模型失败: {str(e)}")
             raise
     
+    def _load_mmap_model(self, model_path: str):
+        """
+        以 mmap 方式加载快照目录中的 safetensors 权重
+        
+        模型结构按 config.json 创建（跳过随机初始化），权重张量直接引用 mmap 映射的
+        文件页（load_state_dict(assign=True)，不复制），只读的权重页在进程间共享。
+        
+        Args:
+            model_path: 本地模型快照目录
+            
+        Returns:
+            模型实例；目录中没有 safetensors 文件或 torch 版本不支持时返回 None
+        """
+        weight_files = sorted(Path(model_path).glob("*.safetensors"))
+        if not weight_files:
+            print(f"快照目录中没有 safetensors 权重，使用常规方式加载: {model_path}")
+            return None
+        
+        from safetensors.torch import load_file
+        from transformers import AutoConfig, AutoModel
+        try:
+            from transformers.modeling_utils import no_init_weights
+        except ImportError:
+            no_init_weights = contextlib.nullcontext
+        
+        model_config = AutoConfig.from_pretrained(model_path, local_files_only=True)
+        with no_init_weights():
+            model = AutoModel.from_config(model_config)
+        
+        state_dict = {}
+        for weight_file in weight_files:
+            state_dict.update(load_file(str(weight_file), device="cpu"))
+        # 部分快照的权重键带有基础模型前缀（如 "bert."）
+        prefix = model.base_model_prefix + "."
+        state_dict = {
+            (key[len(prefix):] if key.startswith(prefix) else key): value
+            for key, value in state_dict.items()
+        }
+        
+        try:
+            missing, unexpected = model.load_state_dict(state_dict, strict=False, assign=True)
+        except TypeError:
+            # torch < 2.1 不支持 assign，回退到常规加载
+            print("当前 torch 版本不支持 mmap 权重直接引用，使用常规方式加载")
+            return None
+        # 非持久化 buffer（如 position_ids）不在权重文件中，由模型自身创建；
+        # pooler 输出不参与平均池化，缺失时忽略
+        parameter_names = dict(model.named_parameters())
+        missing = [key for key in missing if key in parameter_names and not key.startswith("pooler.")]
+        if missing or unexpected:
+            raise RuntimeError(f"快照权重与模型结构不匹配，缺失: {missing[:5]}，多余: {unexpected[:5]}")
+        
+        self.mmap_loaded = True
+        return model
+    
+    @contextlib.contextmanager
+    def _use_model(self):
+        """
+        获取模型用于一次编码：模型已被卸载时重新加载，使用期间不会被空闲卸载
+        
+        Yields:
+            模型实例
+        """
+        with self._lock:
+            if self.model is None:
+                print(f"BGE 模型已被空闲卸载，重新加载: {self.model_name}")
+                self._load_model()
+            self._active_calls += 1
+            self.encode_count += 1
+            model = self.model
+        try:
+            yield model
+        finally:
+            with self._lock:
+                self._active_calls -= 1
+                self._last_used = time.monotonic()
+    
+    def unload(self) -> bool:
+        """
+        卸载模型权重以释放内存（tokenizer 较小，保留以加快重新加载）
+        
+        Returns:
+            是否卸载成功（模型未加载或正在使用时返回 False）
+        """
+        with self._lock:
+            if self.model is None or self._active_calls > 0:
+                return False
+            self.model = None
+            self.mmap_loaded = False
+            self.unload_count += 1
+        gc.collect()
+        if self.device.type == "cuda":
+            import torch
+            torch.cuda.empty_cache()
+        print(f"BGE 模型已卸载: {self.model_name}")
+        return True
+    
+    def _idle_monitor(self):
+        """后台线程：模型空闲超过 idle_unload_seconds 后卸载"""
+        interval = max(1.0, min(self.idle_unload_seconds / 2, 30.0))
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                idle_seconds = time.monotonic() - self._last_used
+                should_unload = (
+                    self.model is not None
+                    and self._active_calls == 0
+                    and idle_seconds >= self.idle_unload_seconds
+                )
+            if should_unload:
+                self.unload()
+    
+    def get_metrics(self) -> dict:
+        """
+        获取模型加载/卸载指标
+        
+        Returns:
+            指标字典
+        """
+        with self._lock:
+            return {
+                "model_name": self.model_name,
+                "model_path": self.model_path,
+                "loaded": self.model is not None,
+                "mmap_loaded": self.mmap_loaded,
+                "idle_unload_seconds": self.idle_unload_seconds,
+                "idle_seconds": round(time.monotonic() - self._last_used, 3),
+                "active_calls": self._active_calls,
+                "encode_count": self.encode_count,
+                "load_count": self.load_count,
+                "unload_count": self.unload_count,
+                "last_load_seconds": round(self.last_load_seconds, 3),
+                "total_load_seconds": round(self.total_load_seconds, 3),
+            }
+    
     def _mean_pooling(self, model_output, attention_mask):
         """
         平均池化，获取句子嵌入
@@ -55,6 +253,8 @@ class EmbeddingService:
         Returns:
             池化后的嵌入向量
         """
+        import torch
+        
         # 获取 token embeddings
         token_embeddings = model_output[0]  # First element of model_output contains all token embeddings
         
@@ -81,9 +281,6 @@ class EmbeddingService:
         Returns:
             向量数组，形状为 (n, 1024) 或 (1024,)
         """
-        if self.model is None or self.tokenizer is None:
-            raise RuntimeError("模型未加载")
-        
         # 如果是单个字符串，转换为列表
         is_single = isinstance(text, str)
         if is_single:
@@ -102,8 +299,9 @@ class EmbeddingService:
         encoded_input = {k: v.to(self.device) for k, v in encoded_input.items()}
         
         # 生成嵌入
-        with torch.no_grad():
-            model_output = self.model(**encoded_input)
+        import torch
+        with self._use_model() as model, torch.no_grad():
+            model_output = model(**encoded_input)
             embeddings = self._mean_pooling(model_output, encoded_input['attention_mask'])
             
             # 归一化
@@ -130,9 +328,6 @@ class EmbeddingService:
         Returns:
             向量数组，形状为 (n, 1024) 或 (1024,)
         """
-        if self.model is None or self.tokenizer is None:
-            raise RuntimeError("模型未加载")
-        
         # 如果是单个字符串，转换为列表
         is_single = isinstance(text, str)
         if is_single:
@@ -151,8 +346,9 @@ class EmbeddingService:
         encoded_input = {k: v.to(self.device) for k, v in encoded_input.items()}
         
         # 生成嵌入
-        with torch.no_grad():
-            model_output = self.model(**encoded_input)
+        import torch
+        with self._use_model() as model, torch.no_grad():
+            model_output = model(**encoded_input)
             embeddings = self._mean_pooling(model_output, encoded_input['attention_mask'])
             
             # 归一化
@@ -184,12 +380,42 @@ class EmbeddingService:
 
 # 全局 Embedding 服务实例
 _embedding_service: EmbeddingService = None
+# 全局小模型 Embedding 服务实例
+_small_embedding_service: EmbeddingService = None
+# 创建服务实例的锁（预热线程、向量补全线程与队列线程会在启动时同时获取实例，避免重复加载模型）
+_embedding_service_lock = threading.Lock()
+_small_embedding_service_lock = threading.Lock()
 
 
 def get_embedding_service() -> EmbeddingService:
     """获取全局 Embedding 服务实例（单例模式）"""
     global _embedding_service
     if _embedding_service is None:
-        _embedding_service = EmbeddingService()
+        with _embedding_service_lock:
+            if _embedding_service is None:
+                _embedding_service = EmbeddingService(
+                    model_path=EMBEDDING_MODEL_PATH,
+                    idle_unload_seconds=EMBEDDING_IDLE_UNLOAD_SECONDS
+                )
     return _embedding_service
 
+
+def get_small_embedding_service() -> EmbeddingService:
+    """获取全局小模型 Embedding 服务实例（单例模式，两阶段检索的候选召回用）"""
+    global _small_embedding_service
+    if _small_embedding_service is None:
+        with _small_embedding_service_lock:
+            if _small_embedding_service is None:
+                _small_embedding_service = EmbeddingService(
+                    model_name=SMALL_EMBEDDING_MODEL,
+                    model_path=SMALL_EMBEDDING_MODEL_PATH,
+                    idle_unload_seconds=EMBEDDING_IDLE_UNLOAD_SECONDS
+                )
+    return _small_embedding_service
+
+
+
+def get_embedding_metrics() -> List[dict]:
+    """获取已创建的 Embedding 服务的加载/卸载指标（不会触发模型加载）"""
+    services = [_embedding_service, _small_embedding_service]
+    return [service.get_metrics() for service in services if service is not None]
@@ -8,8 +8,12 @@ try:
 except ImportError:
     # 如果 pgvector 未安装，使用字符串类型作为后备
     from sqlalchemy import Text as Vector
+import config
 from reasoning_knowledge.database import Base
 
+# 两阶段检索使用的小模型向量维度（bge-small-zh-v1.5 为 512）
+SMALL_EMBEDDING_DIM = int(config.config_dict.get("SMALL_EMBEDDING_DIM", "512"))
+
 
 class AIReasoningKnowledge(Base):
     """AI 推理知识库表模型"""
@@ -38,8 +42,13 @@ class AIReasoningKnowledge(Base):
     )
     step_embedding = Column(
         Vector(1024),
-        nullable=False,
-        comment="步骤向量嵌入"
+        nullable=True,
+        comment="步骤向量嵌入（为空表示待后台计算）"
+    )
+    task_embedding_small = Column(
+        Vector(SMALL_EMBEDDING_DIM),
+        nullable=True,
+        comment="任务小模型向量嵌入（两阶段检索候选召回用，为空表示待后台计算）"
     )
 
     def __repr__(self):
@@ -53,5 +62,6 @@ class AIReasoningKnowledge(Base):
             "step_text": self.step_text,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "step_embedding_pending": self.step_embedding is None,
         }
 
@@ -0,0 +1,155 @@
+"""
+启动管理
+
+记录模块导入耗时，在后台预热 embedding 模型与执行图依赖，并提供就绪状态，
+用于跟踪启动耗时的回归。
+"""
+import asyncio
+import importlib
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+
+# 是否在应用启动时后台预热模型
+WARM_UP_ON_STARTUP = config.config_dict.get("WARM_UP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+
+def _warm_up_business_embedding():
+    """加载业务知识库 embedding 模型并执行一次编码"""
+    from business_knowledge.embedding_service import get_embedding_service
+    get_embedding_service().encode_question("预热")
+
+
+def _warm_up_reasoning_embedding():
+    """加载推理知识库 embedding 模型并执行一次编码"""
+    from reasoning_knowledge.embedding_service import get_embedding_service
+    get_embedding_service().encode_task("预热")
+
+
+def _warm_up_small_embedding():
+    """开启两阶段检索时加载候选召回小模型"""
+    from business_knowledge.embedding_service import get_small_embedding_service, TWO_STAGE_RETRIEVAL
+    if TWO_STAGE_RETRIEVAL:
+        get_small_embedding_service().encode_question("预热")
+        from reasoning_knowledge.embedding_service import get_small_embedding_service as get_reasoning_small
+        get_reasoning_small().encode_task("预热")
+
+
+def _warm_up_workflow():
+    """导入执行图模块（langgraph、langchain 等）"""
+    importlib.import_module("main")
+
+
+# 预热步骤（名称, 函数），按顺序执行
+WARM_UP_STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ("business_embedding", _warm_up_business_embedding),
+    ("reasoning_embedding", _warm_up_reasoning_embedding),
+    ("small_embedding", _warm_up_small_embedding),
+    ("workflow", _warm_up_workflow),
+]
+
+
+class StartupMonitor:
+    """启动状态监控：导入耗时、预热耗时与就绪状态"""
+
+    def __init__(self):
+        self.process_started_at = time.time()
+        self.import_seconds: Dict[str, float] = {}
+        self.warm_up_seconds: Dict[str, float] = {}
+        self.warm_up_errors: Dict[str, str] = {}
+        self.warm_up_started_at: Optional[float] = None
+        self.warm_up_finished_at: Optional[float] = None
+        self.ui_tars_launcher: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def record_import(self, name: str, seconds: float):
+        """
+        记录模块导入耗时
+
+        Args:
+            name: 模块名称
+            seconds: 导入耗时（秒）
+        """
+        self.import_seconds[name] = round(seconds, 3)
+        print(f"[启动] 模块 {name} 导入耗时: {seconds:.3f}s")
+
+    def resolve_ui_tars_launcher(self):
+        """解析 UI-TARS CLI 启动方式并记录（只查找可执行文件，不启动子进程）"""
+        try:
+            from action.ui_tars_launcher import resolve_cli_launcher
+            from action.ui_tars_worker import UI_TARS_WORKER_ENABLED
+            self.ui_tars_launcher = {**resolve_cli_launcher().to_dict(), "worker": UI_TARS_WORKER_ENABLED}
+        except Exception as e:
+            self.ui_tars_launcher = {"error": str(e)}
+            print(f"[启动] 解析 UI-TARS 启动方式失败: {str(e)}")
+
+    def warm_up(self):
+        """同步执行所有预热步骤（单个步骤失败不影响其它步骤）"""
+        self.warm_up_started_at = time.time()
+        for name, step in WARM_UP_STEPS:
+            started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                self.warm_up_errors[name] = str(e)
+                print(f"[启动] 预热 {name} 失败: {str(e)}")
+            self.warm_up_seconds[name] = round(time.perf_counter() - started, 3)
+            print(f"[启动] 预热 {name} 耗时: {self.warm_up_seconds[name]:.3f}s")
+        self.warm_up_finished_at = time.time()
+        total = self.warm_up_finished_at - self.warm_up_started_at
+        print(f"[启动] 预热完成，总耗时: {total:.3f}s")
+
+    def start_warm_up(self) -> asyncio.Task:
+        """在后台线程中执行预热，不阻塞应用启动（需在事件循环中调用）"""
+        if self._task is None:
+            self._task = asyncio.create_task(asyncio.to_thread(self.warm_up))
+        return self._task
+
+    @property
+    def ready(self) -> bool:
+        """预热完成且没有失败步骤时视为就绪；未开启启动预热时始终就绪（首次使用时加载）"""
+        if not WARM_UP_ON_STARTUP:
+            return True
+        return self.warm_up_finished_at is not None and not self.warm_up_errors
+
+    def status(self) -> dict:
+        """
+        获取启动状态
+
+        Returns:
+            包含就绪状态、导入耗时、预热耗时与 UI-TARS 启动方式的字典
+        """
+        if not WARM_UP_ON_STARTUP:
+            state = "lazy"
+        elif self.warm_up_finished_at is not None:
+            state = "ready" if not self.warm_up_errors else "degraded"
+        elif self.warm_up_started_at is not None:
+            state = "warming_up"
+        else:
+            state = "not_started"
+        warm_up_total = None
+        if self.warm_up_started_at is not None and self.warm_up_finished_at is not None:
+            warm_up_total = round(self.warm_up_finished_at - self.warm_up_started_at, 3)
+        return {
+            "ready": self.ready,
+            "state": state,
+            "import_seconds": self.import_seconds,
+            "warm_up_seconds": self.warm_up_seconds,
+            "warm_up_total_seconds": warm_up_total,
+            "warm_up_errors": self.warm_up_errors,
+            "ui_tars_launcher": self.ui_tars_launcher,
+            "uptime_seconds": round(time.time() - self.process_started_at, 3),
+        }
+
+
+# 全局启动状态实例
+_startup_monitor: StartupMonitor = None
+
+
+def get_startup_monitor() -> StartupMonitor:
+    """获取全局启动状态实例（单例模式）"""
+    global _startup_monitor
+    if _startup_monitor is None:
+        _startup_monitor = StartupMonitor()
+    return _startup_monitor
@@ -0,0 +1,67 @@
+"""
+UI-TARS 工作进程的替身
+
+实现与 worker.mjs 相同的 JSON Lines 协议，但不调用模型、不操作桌面，用于离线验证协议与重启逻辑:
+    UI_TARS_WORKER_ENABLED=true
+    UI_TARS_WORKER_COMMAND="python ui_tars_worker/fake_worker.py"
+
+指令内容控制行为:
+    包含 FAIL  -> 返回执行失败
+    包含 CRASH -> 进程直接退出（模拟崩溃）
+    包含 HANG  -> 不返回结果（模拟卡死，触发超时）
+环境变量 FAKE_UI_TARS_DELAY 为每条指令的模拟执行耗时（秒）。
+"""
+import json
+import os
+import sys
+import time
+
+DELAY = float(os.environ.get("FAKE_UI_TARS_DELAY", "0"))
+
+
+def send(message: dict):
+    sys.stdout.write(json.dumps(message, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def main():
+    send({"type": "ready", "pid": os.getpid(), "version": "fake"})
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            send({"type": "error", "error": f"无法解析请求: {e}"})
+            continue
+        request_id = request.get("id")
+        request_type = request.get("type")
+        if request_type == "ping":
+            send({"id": request_id, "type": "pong"})
+        elif request_type == "shutdown":
+            send({"id": request_id, "type": "bye"})
+            return
+        elif request_type == "run":
+            instruction = request.get("instruction", "")
+            if "CRASH" in instruction:
+                sys.exit(1)
+            if "HANG" in instruction:
+                continue
+            time.sleep(DELAY)
+            action = f"click {json.dumps({'start_box': '(100,200)'})} cost={int(DELAY * 1000)}ms"
+            send({"id": request_id, "type": "event", "data": {"status": "running", "thought": instruction, "action": action}})
+            success = "FAIL" not in instruction
+            send({
+                "id": request_id,
+                "type": "result",
+                "success": success,
+                "status": "end" if success else "error",
+                "error": None if success else "模拟执行失败",
+                "logs": [action],
+            })
+        else:
+            send({"id": request_id, "type": "error", "error": f"未知的请求类型: {request_type}"})
+
+
+if __name__ == "__main__":
+    main()
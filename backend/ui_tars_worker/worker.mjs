@@ -0,0 +1,127 @@
+/**
+ * UI-TARS 常驻工作进程
+ *
+ * 启动一次、加载一次 @ui-tars/sdk 与操作器，之后通过 stdin/stdout 上的 JSON Lines 协议接收指令。
+ * 每行一个 JSON 对象，stdout 只用于协议消息，所有日志输出到 stderr。
+ *
+ * 工作进程 -> Python:
+ *   {"type": "ready", "pid": 123, "version": "..."}                启动完成
+ *   {"id": 1, "type": "pong"}                                        健康检查响应
+ *   {"id": 2, "type": "event", "data": {"status": "...", ...}}      执行过程中的进度
+ *   {"id": 2, "type": "result", "success": true, "status": "end", "error": null, "logs": [...]}
+ *   {"id": 3, "type": "bye"}                                         即将退出
+ *   {"id": 4, "type": "error", "error": "..."}                       无法处理的请求
+ *
+ * Python -> 工作进程:
+ *   {"id": 1, "type": "ping"}
+ *   {"id": 2, "type": "run", "instruction": "打开微信", "target": "nut-js"}
+ *   {"id": 3, "type": "shutdown"}
+ *
+ * 模型配置从环境变量读取: UI_TARS_BASE_URL / UI_TARS_API_KEY / UI_TARS_MODEL / UI_TARS_USE_RESPONSES_API
+ */
+import readline from 'node:readline';
+import { createRequire } from 'node:module';
+
+// SDK 会向 stdout 打日志，统一改到 stderr，避免破坏协议
+console.log = console.info = console.debug = (...args) => console.error(...args);
+
+const send = (message) => process.stdout.write(JSON.stringify(message) + '\n');
+
+const { GUIAgent, StatusEnum } = await import('@ui-tars/sdk');
+
+const modelConfig = {
+  baseURL: process.env.UI_TARS_BASE_URL,
+  apiKey: process.env.UI_TARS_API_KEY,
+  model: process.env.UI_TARS_MODEL,
+  useResponsesApi: ['1', 'true', 'yes'].includes((process.env.UI_TARS_USE_RESPONSES_API || '').toLowerCase()),
+};
+
+// 操作器按目标类型在首次使用时创建，之后复用
+const operators = {};
+
+async function getOperator(target) {
+  if (!operators[target]) {
+    if (target === 'adb') {
+      const { AdbOperator, getAndroidDeviceId } = await import('@ui-tars/operator-adb');
+      const deviceId = await getAndroidDeviceId();
+      if (!deviceId) {
+        throw new Error('未找到 Android 设备');
+      }
+      operators[target] = new AdbOperator(deviceId);
+    } else {
+      const { NutJSOperator } = await import('@ui-tars/operator-nut-js');
+      operators[target] = new NutJSOperator();
+    }
+  }
+  return operators[target];
+}
+
+async function handleRun(request) {
+  const logs = [];
+  let status = null;
+  let error = null;
+  const agent = new GUIAgent({
+    model: modelConfig,
+    operator: await getOperator(request.target || 'nut-js'),
+    onData: ({ data }) => {
+      status = data.status ?? status;
+      for (const conversation of data.conversations ?? []) {
+        for (const prediction of conversation.predictionParsed ?? []) {
+          const cost = conversation.timing?.cost;
+          const line = `${prediction.action_type} ${JSON.stringify(prediction.action_inputs ?? {})}`
+            + (cost != null ? ` cost=${cost}ms` : '');
+          logs.push(line);
+          send({ id: request.id, type: 'event', data: { status, thought: prediction.thought, action: line } });
+        }
+      }
+    },
+    onError: ({ error: agentError }) => {
+      error = agentError?.message ?? String(agentError);
+    },
+  });
+  await agent.run(request.instruction);
+  const success = !error && status === StatusEnum.END;
+  send({ id: request.id, type: 'result', success, status, error, logs });
+}
+
+// 指令串行执行（同一时间只操作一个桌面）
+let queue = Promise.resolve();
+
+const rl = readline.createInterface({ input: process.stdin, crlfDelay: Infinity });
+rl.on('line', (line) => {
+  if (!line.trim()) {
+    return;
+  }
+  let request;
+  try {
+    request = JSON.parse(line);
+  } catch (e) {
+    send({ type: 'error', error: `无法解析请求: ${e.message}` });
+    return;
+  }
+  if (request.type === 'ping') {
+    send({ id: request.id, type: 'pong' });
+    return;
+  }
+  if (request.type === 'shutdown') {
+    send({ id: request.id, type: 'bye' });
+    process.exit(0);
+  }
+  if (request.type !== 'run') {
+    send({ id: request.id, type: 'error', error: `未知的请求类型: ${request.type}` });
+    return;
+  }
+  queue = queue
+    .then(() => handleRun(request))
+    .catch((e) => send({ id: request.id, type: 'result', success: false, status: 'error', error: e?.message ?? String(e), logs: [] }));
+});
+rl.on('close', () => process.exit(0));
+
+const require = createRequire(import.meta.url);
+let version = null;
+try {
+  version = require('@ui-tars/sdk/package.json').version;
+} catch {
+  // 部分版本未导出 package.json
+}
+send({ type: 'ready', pid: process.pid, version });
@@ -0,0 +1,305 @@
+"""
+后台截图服务
+
+以固定帧率在后台线程截图，写入预分配的环形缓冲区（已缩放到发送给模型的分辨率，带时间戳）。
+执行节点可以立即取到“时间 T 之前的最新帧”和“时间 T 之后第一帧稳定画面”，
+不必在事件循环中同步截图。
+"""
+import asyncio
+import math
+import threading
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+import config
+from util.screenshot_util import (
+    ScreenshotUtil,
+    DEFAULT_MAX_PIXELS,
+    GRABBER_AVAILABLE,
+    PIL_AVAILABLE,
+    get_screen_grabber,
+)
+from util.frame_diff import gray_thumbnail, changed_ratio
+
+if PIL_AVAILABLE:
+    from PIL import Image
+
+# 是否启用后台截图服务（任务执行期间运行）
+CAPTURE_SERVICE_ENABLED = config.config_dict.get("CAPTURE_SERVICE_ENABLED", "false").lower() in ("1", "true", "yes")
+# 截图帧率与环形缓冲区容量（帧）
+CAPTURE_SERVICE_FPS = float(config.config_dict.get("CAPTURE_SERVICE_FPS", "4"))
+CAPTURE_SERVICE_CAPACITY = int(config.config_dict.get("CAPTURE_SERVICE_CAPACITY", "16"))
+# 稳定判定：与上一帧相比变化的像素比例不超过该值
+CAPTURE_STABLE_THRESHOLD = float(config.config_dict.get("CAPTURE_STABLE_THRESHOLD", "0.001"))
+# 等待稳定帧的超时时间（秒），超时后使用 T 之后的最新帧
+CAPTURE_STABLE_TIMEOUT = float(config.config_dict.get("CAPTURE_STABLE_TIMEOUT", "3"))
+
+
+def scaled_size(width: int, height: int, max_pixels: int = DEFAULT_MAX_PIXELS) -> Tuple[int, int]:
+    """
+    计算缩放后的尺寸（与 ScreenshotUtil._encode_image 的缩放规则一致）
+
+    Returns:
+        (width, height)
+    """
+    if width * height <= max_pixels:
+        return width, height
+    resize_factor = math.sqrt(max_pixels / (width * height))
+    return int(width * resize_factor), int(height * resize_factor)
+
+
+class Frame:
+    """环形缓冲区中取出的一帧（像素数据为副本，不会被后续截图覆盖）"""
+
+    def __init__(self, seq: int, timestamp: float, pixels: np.ndarray, changed: float):
+        """
+        Args:
+            seq: 帧序号（单调递增）
+            timestamp: 截图时间（time.time()）
+            pixels: RGB 像素数组 (H, W, 3)
+            changed: 与上一帧相比变化的像素比例
+        """
+        self.seq = seq
+        self.timestamp = timestamp
+        self.pixels = pixels
+        self.changed = changed
+        self._jpeg_bytes: Optional[bytes] = None
+
+    def to_image(self) -> "Image.Image":
+        """转换为 PIL 图片"""
+        return Image.fromarray(self.pixels, "RGB")
+
+    def to_jpeg_bytes(self) -> bytes:
+        """编码为 JPEG（结果缓存，帧已缩放到目标分辨率，不会再次缩放）"""
+        if self._jpeg_bytes is None:
+            self._jpeg_bytes = ScreenshotUtil._encode_image(self.to_image())
+        return self._jpeg_bytes
+
+
+class CaptureService:
+    """后台截图服务：固定帧率截图写入环形缓冲区"""
+
+    def __init__(
+        self,
+        fps: float = CAPTURE_SERVICE_FPS,
+        capacity: int = CAPTURE_SERVICE_CAPACITY,
+        max_pixels: int = DEFAULT_MAX_PIXELS,
+        stable_threshold: float = CAPTURE_STABLE_THRESHOLD
+    ):
+        """
+        初始化截图服务
+
+        Args:
+            fps: 截图帧率
+            capacity: 环形缓冲区容量（帧）
+            max_pixels: 缓冲帧的最大像素数（与发送给模型的图片一致）
+            stable_threshold: 稳定判定阈值（变化像素比例）
+        """
+        self.fps = fps
+        self.capacity = capacity
+        self.max_pixels = max_pixels
+        self.stable_threshold = stable_threshold
+        self._frames: Optional[np.ndarray] = None
+        self._timestamps = np.zeros(capacity, dtype=np.float64)
+        self._changed = np.ones(capacity, dtype=np.float64)
+        self._seq = 0  # 下一帧的序号；第 seq 帧存放在 seq % capacity
+        self._last_thumbnail: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._users = 0
+        self.last_error: Optional[str] = None
+        self.last_capture_ms: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        """后台线程是否在运行且已有截图"""
+        return self._thread is not None and self._thread.is_alive() and self._seq > 0
+
+    def start(self):
+        """启动后台截图线程（重复调用无副作用）"""
+        if not (GRABBER_AVAILABLE and PIL_AVAILABLE):
+            self.last_error = "后台截图服务需要 mss（或 Xvfb 帧缓冲）与 Pillow"
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="capture-service", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """停止后台截图线程并清空缓冲区"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._lock:
+            self._seq = 0
+
+    def acquire(self):
+        """任务开始时调用：增加引用计数并确保服务运行"""
+        self._users += 1
+        self.start()
+
+    def release(self):
+        """任务结束时调用：减少引用计数，没有任务使用时停止服务"""
+        self._users = max(0, self._users - 1)
+        if self._users == 0:
+            self.stop()
+
+    def _store(self, pixels: np.ndarray, timestamp: float):
+        """把一帧写入环形缓冲区（尺寸变化时重新分配缓冲区）"""
+        with self._lock:
+            if self._frames is None or self._frames.shape[1:] != pixels.shape:
+                self._frames = np.empty((self.capacity,) + pixels.shape, dtype=np.uint8)
+                self._seq = 0
+            slot = self._seq % self.capacity
+            thumbnail = gray_thumbnail(pixels)
+            if self._seq > 0 and self._last_thumbnail is not None:
+                self._changed[slot] = changed_ratio(self._last_thumbnail, thumbnail)
+            else:
+                self._changed[slot] = 1.0
+            self._last_thumbnail = thumbnail
+            self._frames[slot] = pixels
+            self._timestamps[slot] = timestamp
+            self._seq += 1
+
+    def _run(self):
+        """后台线程主循环"""
+        grabber = get_screen_grabber()
+        interval = 1.0 / self.fps if self.fps > 0 else 0.25
+        try:
+            while not self._stopped.is_set():
+                started = time.perf_counter()
+                try:
+                    timestamp = time.time()
+                    image = grabber.grab_image()
+                    size = scaled_size(image.width, image.height, self.max_pixels)
+                    if size != image.size:
+                        image = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+                    self._store(np.asarray(image), timestamp)
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"[截图服务] 截图失败: {str(e)}")
+                self.last_capture_ms = (time.perf_counter() - started) * 1000
+                self._stopped.wait(max(0.0, interval - (time.perf_counter() - started)))
+        finally:
+            grabber.close()
+
+    def _frame_at(self, seq: int) -> Frame:
+        """读取指定序号的帧（调用方需持有锁）"""
+        slot = seq % self.capacity
+        return Frame(seq, float(self._timestamps[slot]), self._frames[slot].copy(), float(self._changed[slot]))
+
+    def _available_range(self) -> range:
+        """缓冲区中仍可读取的帧序号范围（调用方需持有锁）"""
+        return range(max(0, self._seq - self.capacity), self._seq)
+
+    def latest_before(self, timestamp: float) -> Optional[Frame]:
+        """
+        获取时间 T 之前（含）的最新帧
+
+        Args:
+            timestamp: 时间 T（time.time()）
+
+        Returns:
+            帧；缓冲区中没有符合条件的帧时返回 None
+        """
+        with self._lock:
+            for seq in reversed(self._available_range()):
+                if self._timestamps[seq % self.capacity] <= timestamp:
+                    return self._frame_at(seq)
+        return None
+
+    def latest(self) -> Optional[Frame]:
+        """获取最新帧"""
+        with self._lock:
+            if self._seq == 0:
+                return None
+            return self._frame_at(self._seq - 1)
+
+    def first_stable_after(self, timestamp: float) -> Optional[Frame]:
+        """
+        获取时间 T 之后第一帧稳定画面（该帧与上一帧都在 T 之后截取，且两帧之间几乎没有变化）
+
+        Args:
+            timestamp: 时间 T（time.time()）
+
+        Returns:
+            帧；尚未出现稳定画面时返回 None
+        """
+        with self._lock:
+            available = self._available_range()
+            for seq in available:
+                slot = seq % self.capacity
+                if seq == available.start or self._timestamps[(seq - 1) % self.capacity] < timestamp:
+                    continue
+                if self._changed[slot] <= self.stable_threshold:
+                    return self._frame_at(seq)
+        return None
+
+    async def wait_for_stable_after(
+        self,
+        timestamp: float,
+        timeout: float = CAPTURE_STABLE_TIMEOUT
+    ) -> Optional[Frame]:
+        """
+        等待时间 T 之后的第一帧稳定画面
+
+        Args:
+            timestamp: 时间 T（time.time()）
+            timeout: 超时时间（秒），超时后返回 T 之后的最新帧
+
+        Returns:
+            帧；服务未运行时返回 None
+        """
+        deadline = time.monotonic() + timeout
+        poll_interval = 1.0 / self.fps if self.fps > 0 else 0.25
+        while self.running:
+            frame = self.first_stable_after(timestamp)
+            if frame is not None:
+                return frame
+            if time.monotonic() >= deadline:
+                latest = self.latest()
+                if latest is not None and latest.timestamp >= timestamp:
+                    print(f"[截图服务] 等待稳定画面超时（{timeout}s），使用最新帧")
+                    return latest
+                return None
+            await asyncio.sleep(poll_interval)
+        return None
+
+    def status(self) -> dict:
+        """
+        获取服务状态
+
+        Returns:
+            包含运行状态、帧数与最近一次截图耗时的字典
+        """
+        with self._lock:
+            frame_shape = None if self._frames is None else list(self._frames.shape[1:])
+            captured = self._seq
+        return {
+            "enabled": CAPTURE_SERVICE_ENABLED,
+            "running": self.running,
+            "fps": self.fps,
+            "capacity": self.capacity,
+            "frame_shape": frame_shape,
+            "captured_frames": captured,
+            "last_capture_ms": None if self.last_capture_ms is None else round(self.last_capture_ms, 1),
+            "last_error": self.last_error,
+        }
+
+
+# 全局截图服务实例
+_capture_service: CaptureService = None
+
+
+def get_capture_service() -> CaptureService:
+    """获取全局后台截图服务实例（单例模式）"""
+    global _capture_service
+    if _capture_service is None:
+        _capture_service = CaptureService()
+    return _capture_service
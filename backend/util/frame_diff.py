@@ -0,0 +1,181 @@
+"""
+帧差异计算
+
+在低分辨率灰度图上用 NumPy 向量化计算帧间差异，供后台截图服务、画面稳定检测与分析前置判断使用。
+"""
+import io
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# 低分辨率灰度图的目标宽度（像素）与判定像素变化的灰度差阈值
+THUMBNAIL_WIDTH = 240
+PIXEL_THRESHOLD = 8
+
+
+def gray_thumbnail(pixels: np.ndarray, width: int = THUMBNAIL_WIDTH) -> np.ndarray:
+    """
+    按步长采样生成低分辨率灰度图（不做插值，开销很小）
+
+    Args:
+        pixels: 像素数组 (H, W, C)，C 为 3（RGB）或 4（BGRA，只取前三个通道）；也可以是灰度数组 (H, W)
+        width: 目标宽度
+
+    Returns:
+        灰度数组 (h, w)，float32
+    """
+    stride = max(1, pixels.shape[1] // width)
+    if pixels.ndim == 2:
+        return pixels[::stride, ::stride].astype(np.float32)
+    return pixels[::stride, ::stride, :3].mean(axis=2, dtype=np.float32)
+
+
+def decode_gray_thumbnail(image_bytes: bytes, width: int = THUMBNAIL_WIDTH) -> np.ndarray:
+    """
+    把 JPEG/PNG 字节解码为低分辨率灰度图
+
+    JPEG 使用 draft 模式在解码时直接按 1/2、1/4、1/8 缩小，不需要解码完整分辨率。
+
+    Args:
+        image_bytes: 图片字节数据
+        width: 目标宽度
+
+    Returns:
+        灰度数组 (h, w)，float32
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    image.draft("L", (max(1, width), max(1, image.height * width // max(1, image.width))))
+    return gray_thumbnail(np.asarray(image.convert("L")), width)
+
+
+def changed_ratio(previous: np.ndarray, current: np.ndarray, pixel_threshold: int = PIXEL_THRESHOLD) -> float:
+    """
+    计算两张灰度图之间变化的像素比例
+
+    Args:
+        previous: 上一帧灰度图
+        current: 当前帧灰度图
+        pixel_threshold: 灰度差超过该值的像素视为变化
+
+    Returns:
+        变化像素占比（0~1）；尺寸不同时视为全部变化
+    """
+    if previous.shape != current.shape:
+        return 1.0
+    return float(np.count_nonzero(np.abs(current - previous) > pixel_threshold)) / current.size
+
+
+def changed_stats(previous: np.ndarray, current: np.ndarray, pixel_threshold: int = PIXEL_THRESHOLD) -> Dict[str, Any]:
+    """
+    计算两张灰度图之间的变化统计
+
+    Args:
+        previous: 上一帧灰度图
+        current: 当前帧灰度图
+        pixel_threshold: 灰度差超过该值的像素视为变化
+
+    Returns:
+        {"changed_ratio": 变化像素占比, "changed_pixels": 变化像素数, "mean_abs_diff": 平均灰度差,
+         "bbox": 变化区域外接框 [left, top, right, bottom]（相对坐标 0~1，无变化时为 None）}
+    """
+    if previous.shape != current.shape:
+        return {"changed_ratio": 1.0, "changed_pixels": int(current.size), "mean_abs_diff": None, "bbox": [0.0, 0.0, 1.0, 1.0]}
+    diff = np.abs(current - previous)
+    mask = diff > pixel_threshold
+    changed_pixels = int(np.count_nonzero(mask))
+    bbox: Optional[list] = None
+    if changed_pixels:
+        rows = np.flatnonzero(mask.any(axis=1))
+        cols = np.flatnonzero(mask.any(axis=0))
+        height, width = mask.shape
+        bbox = [
+            round(float(cols[0]) / width, 4),
+            round(float(rows[0]) / height, 4),
+            round(float(cols[-1] + 1) / width, 4),
+            round(float(rows[-1] + 1) / height, 4),
+        ]
+    return {
+        "changed_ratio": changed_pixels / mask.size,
+        "changed_pixels": changed_pixels,
+        "mean_abs_diff": float(diff.mean()),
+        "bbox": bbox,
+    }
+
+
+def changed_regions(
+    previous: np.ndarray,
+    current: np.ndarray,
+    cell_size: int = 8,
+    pixel_threshold: int = PIXEL_THRESHOLD,
+    max_regions: int = 4
+) -> List[List[float]]:
+    """
+    计算两张灰度图之间的变化区域外接框
+
+    先按 cell_size 把变化像素聚合成网格，向外扩一格让相邻的变化连在一起，再求连通区域。
+
+    Args:
+        previous: 上一帧灰度图
+        current: 当前帧灰度图
+        cell_size: 网格大小（灰度图像素）
+        pixel_threshold: 灰度差超过该值的像素视为变化
+        max_regions: 最多返回的区域数，超过时合并为一个整体外接框
+
+    Returns:
+        外接框列表 [left, top, right, bottom]（相对坐标 0~1），按面积从大到小排序
+    """
+    if previous.shape != current.shape:
+        return [[0.0, 0.0, 1.0, 1.0]]
+    mask = np.abs(current - previous) > pixel_threshold
+    if not mask.any():
+        return []
+    height, width = mask.shape
+    grid_h, grid_w = -(-height // cell_size), -(-width // cell_size)
+    padded = np.zeros((grid_h * cell_size, grid_w * cell_size), dtype=bool)
+    padded[:height, :width] = mask
+    cells = padded.reshape(grid_h, cell_size, grid_w, cell_size).any(axis=(1, 3))
+    grown = cells.copy()
+    grown[1:] |= cells[:-1]
+    grown[:-1] |= cells[1:]
+    grown[:, 1:] |= cells[:, :-1]
+    grown[:, :-1] |= cells[:, 1:]
+
+    visited = np.zeros_like(grown)
+    boxes = []
+    for start_y, start_x in zip(*np.nonzero(grown)):
+        if visited[start_y, start_x]:
+            continue
+        visited[start_y, start_x] = True
+        stack = [(start_y, start_x)]
+        top, left, bottom, right = start_y, start_x, start_y, start_x
+        while stack:
+            y, x = stack.pop()
+            top, bottom = min(top, y), max(bottom, y)
+            left, right = min(left, x), max(right, x)
+            for ny, nx in ((y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)):
+                if 0 <= ny < grid_h and 0 <= nx < grid_w and grown[ny, nx] and not visited[ny, nx]:
+                    visited[ny, nx] = True
+                    stack.append((ny, nx))
+        boxes.append((top, left, bottom + 1, right + 1))
+
+    if len(boxes) > max_regions:
+        boxes = [(
+            min(box[0] for box in boxes), min(box[1] for box in boxes),
+            max(box[2] for box in boxes), max(box[3] for box in boxes),
+        )]
+    boxes.sort(key=lambda box: (box[2] - box[0]) * (box[3] - box[1]), reverse=True)
+    return [
+        [
+            round(min(1.0, float(left * cell_size) / width), 4),
+            round(min(1.0, float(top * cell_size) / height), 4),
+            round(min(1.0, float(right * cell_size) / width), 4),
+            round(min(1.0, float(bottom * cell_size) / height), 4),
+        ]
+        for top, left, bottom, right in boxes
+    ]
@@ -0,0 +1,58 @@
+"""
+共享 HTTP 连接池
+
+LLM（ChatOpenAI）与原生 UI-TARS 执行器的模型调用共用同一个 httpx.AsyncClient：
+连接保持 keep-alive 复用，安装 h2 时启用 HTTP/2（同一连接上多路复用并发请求）。
+客户端绑定创建时的事件循环，执行图与 API 运行在同一个事件循环中。
+"""
+from typing import Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
+import config
+
+# 连接池最大连接数与最大空闲（keep-alive）连接数
+HTTP_MAX_CONNECTIONS = int(config.config_dict.get("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(config.config_dict.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+# 空闲连接保留时间（秒）
+HTTP_KEEPALIVE_EXPIRY = float(config.config_dict.get("HTTP_KEEPALIVE_EXPIRY", "60"))
+# 默认请求超时时间（秒）
+HTTP_TIMEOUT = float(config.config_dict.get("HTTP_TIMEOUT", "120"))
+# 是否启用 HTTP/2（需要安装 h2，未安装时使用 HTTP/1.1）
+HTTP2_ENABLED = config.config_dict.get("HTTP2_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+# 全局 HTTP 客户端实例
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取全局 HTTP 客户端实例（单例模式，首次调用时创建连接池）"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        http2 = HTTP2_ENABLED and H2_AVAILABLE
+        _http_client = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        print(f"[HTTP] 已创建共享连接池（HTTP/2: {http2}，最大连接数: {HTTP_MAX_CONNECTIONS}）")
+    return _http_client
+
+
+async def close_http_client():
+    """关闭全局 HTTP 客户端（进程退出前调用）"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
@@ -0,0 +1,131 @@
+"""
+图片句柄
+
+同一帧截图会先后发给 AnalyzeStep、OptimizeStep，下一步执行前又会作为“执行前截图”再次发送。
+ImageHandle 携带图片字节、MIME 类型、内容哈希，并在首次需要时计算 data URI 后缓存，
+按图片规格缩放/编码后的结果也按规格缓存，因此每帧在每种规格下最多编码一次。
+MIME 类型只根据文件头（或 base64 前缀）判断，不解码图片数据。
+"""
+import base64
+from typing import Dict, Optional, Tuple, Union
+
+from util.image_profile import ImageProfile, apply_image_profile, detect_mime_type
+from util.screenshot_archive import frame_id_of
+
+# base64 字符串开头与 MIME 类型的对应关系（分别为 JPEG / PNG / WebP(RIFF) 文件头的 base64 编码）
+_BASE64_PREFIXES = (("/9j/", "image/jpeg"), ("iVBORw0KGgo", "image/png"), ("UklGR", "image/webp"))
+
+
+def _mime_type_of_base64(data: str) -> str:
+    """根据 base64 字符串开头判断 MIME 类型（不解码），无法识别时返回 image/png"""
+    for prefix, mime_type in _BASE64_PREFIXES:
+        if data.startswith(prefix):
+            return mime_type
+    return "image/png"
+
+
+class ImageHandle:
+    """图片句柄：字节数据、MIME 类型、内容哈希与缓存的 data URI"""
+
+    def __init__(
+        self,
+        data: Optional[bytes] = None,
+        mime_type: Optional[str] = None,
+        data_uri: Optional[str] = None
+    ):
+        """
+        Args:
+            data: 图片字节数据
+            mime_type: MIME 类型（为 None 时根据文件头判断）
+            data_uri: 已有的 data URI（只提供 data URI 时，字节数据在首次使用时才解码）
+        """
+        if data is None and data_uri is None:
+            raise ValueError("图片句柄需要字节数据或 data URI")
+        self._data = data
+        self._data_uri = data_uri
+        if mime_type is None:
+            if data is not None:
+                mime_type = detect_mime_type(data)
+            else:
+                mime_type = data_uri[len("data:"):data_uri.index(";")]
+        self.mime_type = mime_type
+        self._content_hash: Optional[str] = None
+        # 规格名称 -> (符合该规格的句柄, 处理统计)
+        self._profiled: Dict[str, Tuple["ImageHandle", dict]] = {}
+
+    @classmethod
+    def of(cls, source: Union["ImageHandle", bytes, str], mime_type: Optional[str] = None) -> "ImageHandle":
+        """
+        把图片源转换为图片句柄
+
+        Args:
+            source: 图片句柄、字节数据、data URI 或不带前缀的 base64 字符串
+            mime_type: MIME 类型（为 None 时自动判断）
+
+        Returns:
+            图片句柄（source 已经是句柄时原样返回）
+        """
+        if isinstance(source, ImageHandle):
+            return source
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return cls(bytes(source), mime_type)
+        if isinstance(source, str):
+            if source.startswith("data:image/"):
+                return cls(mime_type=mime_type, data_uri=source)
+            mime_type = mime_type or _mime_type_of_base64(source)
+            return cls(mime_type=mime_type, data_uri=f"data:{mime_type};base64,{source}")
+        raise ValueError(f"不支持的图片源类型: {type(source)}")
+
+    @property
+    def data(self) -> bytes:
+        """图片字节数据"""
+        if self._data is None:
+            self._data = base64.b64decode(self._data_uri[self._data_uri.index(",") + 1:])
+        return self._data
+
+    @property
+    def content_hash(self) -> str:
+        """内容哈希（与截图归档的帧 ID 相同）"""
+        if self._content_hash is None:
+            self._content_hash = frame_id_of(self.data)
+        return self._content_hash
+
+    @property
+    def data_uri(self) -> str:
+        """base64 data URI（首次访问时编码并缓存）"""
+        if self._data_uri is None:
+            self._data_uri = f"data:{self.mime_type};base64,{base64.b64encode(self._data).decode('ascii')}"
+        return self._data_uri
+
+    def fit(self, profile: ImageProfile) -> Tuple["ImageHandle", dict]:
+        """
+        获取符合图片规格的句柄（结果按规格缓存）
+
+        Args:
+            profile: 图片规格
+
+        Returns:
+            (句柄, 处理统计)；已符合规格时返回自身，缓存命中时统计中 cached 为 True
+        """
+        cached = self._profiled.get(profile.name)
+        if cached is not None:
+            handle, stats = cached
+            return handle, {**stats, "cached": True, "elapsed_ms": 0.0}
+        data, stats = apply_image_profile(self.data, profile)
+        handle = self if data is self._data else ImageHandle(data, profile.mime_type)
+        self._profiled[profile.name] = (handle, stats)
+        return handle, stats
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ImageHandle):
+            return self is other or self.content_hash == other.content_hash
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.content_hash)
+
+    def __repr__(self) -> str:
+        return f"<ImageHandle({self.mime_type}, {len(self)} bytes)>"
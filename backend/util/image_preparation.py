@@ -0,0 +1,163 @@
+"""
+步骤分析图片准备
+
+大多数步骤只改变一个对话框或菜单，没必要每次都上传两张约 2.1MP 的全屏截图。
+这里计算执行前后截图的变化区域，只发送低分辨率的全屏缩略图和变化区域的高分辨率裁剪图，
+总像素数控制在配置的预算以内；变化区域过大或无法计算时退回发送完整截图。
+"""
+import io
+import time
+from typing import List, Optional, Tuple, Union
+
+import config
+from util.screenshot_util import ScreenshotUtil, PIL_AVAILABLE
+from util.frame_diff import decode_gray_thumbnail, changed_regions
+from util.image_handle import ImageHandle
+
+if PIL_AVAILABLE:
+    from PIL import Image
+
+# 是否只发送缩略图 + 变化区域裁剪图
+ANALYSIS_CROP_ENABLED = config.config_dict.get("ANALYSIS_CROP_ENABLED", "true").lower() in ("1", "true", "yes")
+# 所有图片的总像素预算
+ANALYSIS_PIXEL_BUDGET = int(config.config_dict.get("ANALYSIS_PIXEL_BUDGET", "1000000"))
+# 每张全屏缩略图的像素数
+ANALYSIS_THUMBNAIL_PIXELS = int(config.config_dict.get("ANALYSIS_THUMBNAIL_PIXELS", "200000"))
+# 最多裁剪的变化区域数（超过时合并为一个区域）
+ANALYSIS_CROP_MAX_REGIONS = int(config.config_dict.get("ANALYSIS_CROP_MAX_REGIONS", "4"))
+# 变化区域面积占比超过该值时发送完整截图
+ANALYSIS_CROP_MAX_AREA = float(config.config_dict.get("ANALYSIS_CROP_MAX_AREA", "0.5"))
+# 裁剪区域向外扩展的像素数（保留上下文）
+ANALYSIS_CROP_PADDING = int(config.config_dict.get("ANALYSIS_CROP_PADDING", "24"))
+# 裁剪图的 JPEG 质量（裁剪图较小，可以用更高的质量保留文字细节）
+ANALYSIS_CROP_QUALITY = int(config.config_dict.get("ANALYSIS_CROP_QUALITY", "70"))
+
+MODE_FULL = "full"
+MODE_CROPS = "crops"
+
+FULL_IMAGE_NOTES = "图片依次为：1. 执行前的截图；2. 执行后的截图。"
+
+StepImage = Union[bytes, ImageHandle]
+
+
+def _full_result(
+    previous_image: Optional[StepImage],
+    current_image: Optional[StepImage],
+    started: float,
+    reason: str,
+    size: Optional[Tuple[int, int]] = None
+) -> Tuple[List[StepImage], str, dict]:
+    """发送完整截图（原样返回传入的图片，图片句柄缓存的编码结果可以继续复用）"""
+    images = [image for image in (previous_image, current_image) if image]
+    upload_bytes = sum(len(image) for image in images)
+    stats = {
+        "mode": MODE_FULL,
+        "reason": reason,
+        "images": len(images),
+        "upload_bytes": upload_bytes,
+        "original_bytes": upload_bytes,
+        "pixels": None if size is None else size[0] * size[1] * len(images),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    return images, FULL_IMAGE_NOTES if len(images) == 2 else "", stats
+
+
+def _box_position(box: Tuple[int, int, int, int], width: int, height: int) -> str:
+    """
+    裁剪区域在全屏缩略图中的位置（按宽高的百分比）
+
+    裁剪框是在已缩放的截图上计算的，发送前缩略图还会再次缩放，像素坐标与屏幕坐标、缩略图坐标都不一致，
+    因此用相对位置描述。
+    """
+    left, top, right, bottom = box
+    return (
+        f"位于全屏缩略图中左 {left * 100 / width:.0f}%、上 {top * 100 / height:.0f}% 处，"
+        f"宽 {(right - left) * 100 / width:.0f}%、高 {(bottom - top) * 100 / height:.0f}%"
+    )
+
+
+def prepare_step_images(
+    previous_image: Optional[StepImage],
+    current_image: Optional[StepImage],
+    pixel_budget: int = ANALYSIS_PIXEL_BUDGET,
+    thumbnail_pixels: int = ANALYSIS_THUMBNAIL_PIXELS
+) -> Tuple[List[StepImage], str, dict]:
+    """
+    准备步骤分析要发送的图片
+
+    Args:
+        previous_image: 执行前的截图（字节数据或图片句柄）
+        current_image: 执行后的截图（字节数据或图片句柄）
+        pixel_budget: 所有图片的总像素预算
+        thumbnail_pixels: 每张全屏缩略图的像素数
+
+    Returns:
+        (图片列表, 图片说明文本, 统计信息)；统计信息包含 mode（full / crops）、regions、
+        images、upload_bytes、original_bytes、pixels、original_pixels、elapsed_ms
+    """
+    started = time.perf_counter()
+    if not ANALYSIS_CROP_ENABLED or not PIL_AVAILABLE:
+        return _full_result(previous_image, current_image, started, "disabled")
+    if not previous_image or not current_image:
+        return _full_result(previous_image, current_image, started, "missing_image")
+
+    try:
+        previous_bytes = ImageHandle.of(previous_image).data
+        current_bytes = ImageHandle.of(current_image).data
+        before = Image.open(io.BytesIO(previous_bytes)).convert("RGB")
+        after = Image.open(io.BytesIO(current_bytes)).convert("RGB")
+        if before.size != after.size:
+            return _full_result(previous_image, current_image, started, "size_mismatch")
+        width, height = after.size
+
+        regions = changed_regions(
+            decode_gray_thumbnail(previous_bytes),
+            decode_gray_thumbnail(current_bytes),
+            max_regions=ANALYSIS_CROP_MAX_REGIONS
+        )
+        if not regions:
+            return _full_result(previous_image, current_image, started, "no_change", after.size)
+        changed_area = sum((right - left) * (bottom - top) for left, top, right, bottom in regions)
+        if changed_area > ANALYSIS_CROP_MAX_AREA:
+            return _full_result(previous_image, current_image, started, "large_change", after.size)
+
+        images = [
+            ScreenshotUtil._encode_image(before, thumbnail_pixels),
+            ScreenshotUtil._encode_image(after, thumbnail_pixels),
+        ]
+        notes = ["1. 执行前的全屏缩略图", "2. 执行后的全屏缩略图"]
+        pixels = 2 * min(thumbnail_pixels, width * height)
+
+        # 剩余预算按区域面积分配给每个区域的执行前/执行后两张裁剪图
+        crop_budget = max(0, pixel_budget - pixels)
+        crop_boxes = []
+        for left, top, right, bottom in regions:
+            crop_boxes.append((
+                max(0, int(left * width) - ANALYSIS_CROP_PADDING),
+                max(0, int(top * height) - ANALYSIS_CROP_PADDING),
+                min(width, int(right * width) + ANALYSIS_CROP_PADDING),
+                min(height, int(bottom * height) + ANALYSIS_CROP_PADDING),
+            ))
+        crop_areas = [(box[2] - box[0]) * (box[3] - box[1]) for box in crop_boxes]
+        total_crop_area = sum(crop_areas)
+        for index, (box, area) in enumerate(zip(crop_boxes, crop_areas), start=1):
+            max_pixels = max(1, int(crop_budget * area / total_crop_area / 2))
+            for label, image in (("执行前", before), ("执行后", after)):
+                images.append(ScreenshotUtil._encode_image(image.crop(box), max_pixels, ANALYSIS_CROP_QUALITY))
+                notes.append(f"{len(notes) + 1}. 变化区域 {index} {label}的局部放大图（{_box_position(box, width, height)}）")
+            pixels += 2 * min(area, max_pixels)
+
+        stats = {
+            "mode": MODE_CROPS,
+            "regions": regions,
+            "images": len(images),
+            "upload_bytes": sum(len(image) for image in images),
+            "original_bytes": len(previous_bytes) + len(current_bytes),
+            "pixels": pixels,
+            "original_pixels": 2 * width * height,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        return images, "图片依次为：\n" + "\n".join(notes), stats
+    except Exception as e:
+        print(f"[图片准备] 计算变化区域失败，发送完整截图: {str(e)}")
+        return _full_result(previous_image, current_image, started, "error")
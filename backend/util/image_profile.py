@@ -0,0 +1,238 @@
+"""
+图片规格（Image Profile）
+
+按模型实际使用的分辨率定义图片规格：最大像素数、编码格式（JPEG / WebP）和目标字节数。
+发送给多模态模型的图片超出规格时重新缩放，并用二分查找找到不超过目标字节数的最高质量；
+已经符合规格的图片原样发送，不重新编码。
+"""
+import io
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import config
+from util.screenshot_util import (
+    ScreenshotUtil,
+    PIL_AVAILABLE,
+    MAX_PIXELS_V1_0,
+    MAX_PIXELS_V1_5,
+    MAX_PIXELS_DOUBAO,
+)
+
+if PIL_AVAILABLE:
+    from PIL import Image
+
+# 默认图片规格
+IMAGE_PROFILE = config.config_dict.get("IMAGE_PROFILE", "V1_0").upper()
+# 按模型选择图片规格，格式: 模型名前缀:规格名,...（如 doubao:DOUBAO,ui-tars-1.5:V1_5）
+IMAGE_PROFILE_MODELS = config.config_dict.get("IMAGE_PROFILE_MODELS", "")
+# 质量二分查找的最大编码次数
+IMAGE_PROFILE_SEARCH_STEPS = int(config.config_dict.get("IMAGE_PROFILE_SEARCH_STEPS", "4"))
+
+FORMAT_JPEG = "JPEG"
+FORMAT_WEBP = "WEBP"
+
+_MIME_TYPES = {FORMAT_JPEG: "image/jpeg", FORMAT_WEBP: "image/webp", "PNG": "image/png"}
+
+
+class ImageProfile:
+    """图片规格"""
+
+    def __init__(
+        self,
+        name: str,
+        max_pixels: int,
+        image_format: str = FORMAT_JPEG,
+        target_bytes: int = 150 * 1024,
+        min_quality: int = 25,
+        max_quality: int = 85
+    ):
+        """
+        Args:
+            name: 规格名称
+            max_pixels: 最大像素数
+            image_format: 编码格式（JPEG / WEBP）
+            target_bytes: 单张图片的目标字节数
+            min_quality: 质量查找的下限
+            max_quality: 质量查找的上限
+        """
+        self.name = name
+        self.max_pixels = max_pixels
+        self.image_format = image_format.upper()
+        self.target_bytes = target_bytes
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+
+    @property
+    def mime_type(self) -> str:
+        """编码后的 MIME 类型"""
+        return _MIME_TYPES[self.image_format]
+
+    def to_dict(self) -> dict:
+        """转换为字典"""
+        return {
+            "name": self.name,
+            "max_pixels": self.max_pixels,
+            "format": self.image_format,
+            "target_bytes": self.target_bytes,
+        }
+
+
+def _profile_from_config(name: str, max_pixels: int, image_format: str, target_kb: int) -> ImageProfile:
+    """创建规格，格式与目标大小可通过 IMAGE_PROFILE_<NAME>_FORMAT / IMAGE_PROFILE_<NAME>_TARGET_KB 覆盖"""
+    return ImageProfile(
+        name=name,
+        max_pixels=max_pixels,
+        image_format=config.config_dict.get(f"IMAGE_PROFILE_{name}_FORMAT", image_format),
+        target_bytes=int(config.config_dict.get(f"IMAGE_PROFILE_{name}_TARGET_KB", str(target_kb))) * 1024,
+    )
+
+
+# 内置规格（像素上限与 UI-TARS-desktop 一致）
+IMAGE_PROFILES: Dict[str, ImageProfile] = {
+    "V1_0": _profile_from_config("V1_0", MAX_PIXELS_V1_0, FORMAT_JPEG, 150),
+    "V1_5": _profile_from_config("V1_5", MAX_PIXELS_V1_5, FORMAT_WEBP, 400),
+    "DOUBAO": _profile_from_config("DOUBAO", MAX_PIXELS_DOUBAO, FORMAT_JPEG, 250),
+}
+
+# 每个规格最近一次找到的质量，作为下次查找的起点（编码在多个线程中执行）
+_last_quality: Dict[str, int] = {}
+_last_quality_lock = threading.Lock()
+
+
+def _model_profiles() -> Dict[str, str]:
+    """解析按模型选择的规格配置"""
+    mapping = {}
+    for item in IMAGE_PROFILE_MODELS.split(","):
+        if ":" in item:
+            model_prefix, profile_name = item.split(":", 1)
+            mapping[model_prefix.strip().lower()] = profile_name.strip().upper()
+    return mapping
+
+
+def resolve_image_profile(action_name: str = "", model_name: str = "") -> ImageProfile:
+    """
+    选择图片规格：IMAGE_PROFILE_<ACTION> > IMAGE_PROFILE_MODELS 中匹配的模型 > IMAGE_PROFILE
+
+    Args:
+        action_name: Action 名称（如 analyze_step）
+        model_name: 模型名称
+
+    Returns:
+        图片规格；配置的规格名不存在时使用 V1_0
+    """
+    profile_name = config.config_dict.get(f"IMAGE_PROFILE_{action_name.upper()}", "").upper() if action_name else ""
+    if not profile_name and model_name:
+        model_name = model_name.lower()
+        for model_prefix, name in _model_profiles().items():
+            if model_name.startswith(model_prefix):
+                profile_name = name
+                break
+    profile_name = profile_name or IMAGE_PROFILE
+    if profile_name not in IMAGE_PROFILES:
+        print(f"[图片规格] 未知的图片规格 {profile_name}，使用 V1_0")
+        profile_name = "V1_0"
+    return IMAGE_PROFILES[profile_name]
+
+
+def _encode(image: "Image.Image", image_format: str, quality: int) -> bytes:
+    """按指定格式和质量编码"""
+    if image_format == FORMAT_JPEG:
+        return ScreenshotUtil._encode_jpeg(image, quality)
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=quality, method=1)
+    return buffer.getvalue()
+
+
+def encode_with_profile(image: "Image.Image", profile: ImageProfile) -> Tuple[bytes, int]:
+    """
+    按规格缩放并编码，二分查找不超过目标字节数的最高质量
+
+    Args:
+        image: PIL 图片
+        profile: 图片规格
+
+    Returns:
+        (编码后的字节数据, 使用的质量)；最低质量仍超过目标时返回最低质量的结果
+    """
+    image = ScreenshotUtil._fit_image(image, profile.max_pixels)
+    low, high = profile.min_quality, profile.max_quality
+    with _last_quality_lock:
+        start_quality = _last_quality.get(profile.name, (low + high) // 2)
+    quality = min(high, max(low, start_quality))
+    best: Optional[Tuple[bytes, int]] = None
+    smallest: Optional[Tuple[bytes, int]] = None
+    for _ in range(max(1, IMAGE_PROFILE_SEARCH_STEPS)):
+        data = _encode(image, profile.image_format, quality)
+        if len(data) <= profile.target_bytes:
+            best = (data, quality)
+            low = quality + 1
+        else:
+            if smallest is None or quality < smallest[1]:
+                smallest = (data, quality)
+            high = quality - 1
+        if low > high:
+            break
+        quality = (low + high) // 2
+    if best is None:
+        if smallest[1] > profile.min_quality:
+            smallest = (_encode(image, profile.image_format, profile.min_quality), profile.min_quality)
+        best = smallest
+    with _last_quality_lock:
+        _last_quality[profile.name] = best[1]
+    return best
+
+
+def apply_image_profile(image_bytes: bytes, profile: ImageProfile) -> Tuple[bytes, dict]:
+    """
+    让图片符合规格：已符合规格（格式一致、像素与字节数不超限）时原样返回，否则重新编码
+
+    只读取图片头判断尺寸与格式，不解码像素。
+
+    Args:
+        image_bytes: 图片字节数据
+        profile: 图片规格
+
+    Returns:
+        (图片字节数据, 统计信息 {"input_bytes", "output_bytes", "width", "height", "quality", "reencoded", "elapsed_ms"})
+    """
+    started = time.perf_counter()
+    stats = {"input_bytes": len(image_bytes), "output_bytes": len(image_bytes), "quality": None, "reencoded": False}
+    if not PIL_AVAILABLE:
+        return image_bytes, stats
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        stats["width"], stats["height"] = image.size
+        if (image.format == profile.image_format
+                and image.width * image.height <= profile.max_pixels
+                and len(image_bytes) <= profile.target_bytes):
+            return image_bytes, stats
+        data, quality = encode_with_profile(image, profile)
+        fitted = Image.open(io.BytesIO(data))
+        stats.update({
+            "output_bytes": len(data),
+            "width": fitted.width,
+            "height": fitted.height,
+            "quality": quality,
+            "reencoded": True,
+        })
+        return data, stats
+    except Exception as e:
+        print(f"[图片规格] 按规格 {profile.name} 编码失败，使用原图: {str(e)}")
+        return image_bytes, stats
+    finally:
+        stats["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def detect_mime_type(image_bytes: bytes) -> str:
+    """
+    根据文件头判断图片 MIME 类型（不解码）
+
+    Returns:
+        MIME 类型，无法识别时返回 image/png
+    """
+    if image_bytes[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/png"
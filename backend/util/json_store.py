@@ -0,0 +1,36 @@
+"""
+本地 JSON 文件存储
+
+动作回放缓存、验证缓存等本机缓存以 JSON 文件保存：读取失败时返回默认值，写入时先写临时文件再原子替换，
+进程在写入中途退出也不会留下损坏的文件。
+"""
+import json
+import os
+import tempfile
+from typing import Any
+
+
+def load_json(path: str, default: Any = None) -> Any:
+    """读取 JSON 文件（文件不存在或内容损坏时返回 default）"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def atomic_write_json(path: str, data: Any):
+    """先写同目录下的临时文件，再原子替换目标文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except Exception:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
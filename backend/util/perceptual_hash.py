@@ -0,0 +1,66 @@
+"""
+感知哈希
+
+用 NumPy 计算截图的 64 位感知哈希，画面相同或只有细微差异（光标、时钟、JPEG 噪声）时哈希的汉明距离很小：
+- dHash: 9x8 灰度图中相邻像素的明暗关系，计算最快
+- pHash: 32x32 灰度图做二维 DCT，取左上角 8x8 低频系数与中位数比较，对缩放与压缩更稳定
+哈希以 16 位十六进制字符串保存。
+"""
+import io
+from functools import lru_cache
+
+import numpy as np
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+HASH_SIZE = 8
+# pHash 做 DCT 的灰度图边长（HASH_SIZE 的倍数）
+PHASH_IMAGE_SIZE = HASH_SIZE * 4
+
+
+def _gray(image_bytes: bytes, width: int, height: int) -> np.ndarray:
+    """把图片字节解码并缩放为 width x height 的灰度数组（JPEG 使用 draft 模式直接按比例缩小解码）"""
+    if not PIL_AVAILABLE:
+        raise RuntimeError("计算感知哈希需要 Pillow，请执行 pip install Pillow")
+    image = Image.open(io.BytesIO(image_bytes))
+    image.draft("L", (width * 8, height * 8))
+    return np.asarray(image.convert("L").resize((width, height), Image.BOX), dtype=np.float32)
+
+
+def _to_hex(bits: np.ndarray) -> str:
+    """布尔数组 -> 十六进制字符串"""
+    return np.packbits(bits.flatten()).tobytes().hex()
+
+
+@lru_cache(maxsize=4)
+def _dct_matrix(size: int) -> np.ndarray:
+    """DCT-II 正交变换矩阵"""
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+def dhash(image_bytes: bytes) -> str:
+    """计算差异哈希（dHash）"""
+    pixels = _gray(image_bytes, HASH_SIZE + 1, HASH_SIZE)
+    return _to_hex(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(image_bytes: bytes) -> str:
+    """计算 DCT 感知哈希（pHash）"""
+    pixels = _gray(image_bytes, PHASH_IMAGE_SIZE, PHASH_IMAGE_SIZE)
+    matrix = _dct_matrix(PHASH_IMAGE_SIZE)
+    low = (matrix @ pixels @ matrix.T)[:HASH_SIZE, :HASH_SIZE]
+    # 直流分量只代表整体亮度，不参与中位数计算
+    median = np.median(low.flatten()[1:])
+    return _to_hex(low > median)
+
+
+def hamming_distance(a: str, b: str) -> int:
+    """两个十六进制哈希之间的汉明距离"""
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
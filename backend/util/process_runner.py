@@ -0,0 +1,209 @@
+"""
+异步子进程执行
+
+用 asyncio 子进程代替线程中的 subprocess.run：
+- stdout / stderr 按行实时回调为结构化进度事件，不必等进程退出
+- 支持截止时间，超时或任务被取消时结束整个进程组（包括 npx / node 派生的子进程）
+- 只保留每个流最近的输出，超过上限的部分丢弃，内存占用有界
+"""
+import asyncio
+import collections
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+# 每个流保留的最大输出字节数（超过时丢弃最早的行）
+DEFAULT_OUTPUT_LIMIT = 1024 * 1024
+# 单行最大字节数（超过时分段）
+MAX_LINE_BYTES = 64 * 1024
+# 结束进程组时先 SIGTERM，等待该时间（秒）后仍未退出则 SIGKILL
+KILL_GRACE_SECONDS = 2.0
+_READ_CHUNK = 64 * 1024
+
+STREAM_STDOUT = "stdout"
+STREAM_STDERR = "stderr"
+
+# 进度事件: {"stream": stdout / stderr, "line": 行内容, "elapsed": 距启动的秒数}
+ProgressCallback = Callable[[Dict], None]
+
+
+class _BoundedLines:
+    """只保留最近 limit 字节（UTF-8 编码，含换行）的行缓冲区，单行超过上限时只保留该行末尾的部分"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        # (行, 字节数 + 1 个换行)
+        self.lines: Deque[Tuple[str, int]] = collections.deque()
+        self.size = 0
+        self.dropped_bytes = 0
+
+    def append(self, line: str):
+        size = len(line.encode("utf-8")) + 1
+        self.lines.append((line, size))
+        self.size += size
+        while self.size > self.limit and len(self.lines) > 1:
+            _, dropped = self.lines.popleft()
+            self.size -= dropped
+            self.dropped_bytes += dropped
+        if self.size > self.limit:
+            # 只剩一行仍超过上限：截取末尾 limit - 1 字节（可能截断多字节字符，丢弃不完整的部分）
+            data = line.encode("utf-8")
+            tail = data[len(data) - max(self.limit - 1, 0):].decode("utf-8", errors="ignore")
+            kept = len(tail.encode("utf-8")) + 1
+            self.lines[0] = (tail, kept)
+            self.dropped_bytes += self.size - kept
+            self.size = kept
+
+    def text(self) -> str:
+        return "\n".join(line for line, _ in self.lines)
+
+
+def _kill_process_group(process: asyncio.subprocess.Process, sig: int):
+    """向进程所在的进程组发送信号（Windows 上结束整个进程树）"""
+    if process.returncode is not None:
+        return
+    try:
+        if sys.platform == "win32":
+            subprocess.run(
+                ["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                capture_output=True,
+                timeout=10
+            )
+        else:
+            os.killpg(process.pid, sig)
+    except (ProcessLookupError, PermissionError, OSError, subprocess.SubprocessError):
+        pass
+
+
+async def _terminate(process: asyncio.subprocess.Process):
+    """结束整个进程组：先 SIGTERM，宽限期后 SIGKILL"""
+    _kill_process_group(process, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(process.wait(), KILL_GRACE_SECONDS)
+    except asyncio.TimeoutError:
+        _kill_process_group(process, signal.SIGKILL if sys.platform != "win32" else signal.SIGTERM)
+        await process.wait()
+
+
+async def _pump(
+    stream: asyncio.StreamReader,
+    name: str,
+    buffer: _BoundedLines,
+    started: float,
+    on_event: Optional[ProgressCallback]
+):
+    """按块读取输出并拆分为行，逐行写入缓冲区并回调"""
+    pending = b""
+
+    def emit(raw: bytes):
+        line = raw.decode("utf-8", errors="replace").rstrip("\r")
+        buffer.append(line)
+        if on_event is not None:
+            try:
+                on_event({"stream": name, "line": line, "elapsed": round(time.monotonic() - started, 3)})
+            except Exception as e:
+                print(f"[子进程] 进度回调失败: {str(e)}")
+
+    while True:
+        chunk = await stream.read(_READ_CHUNK)
+        if not chunk:
+            break
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for raw in lines:
+            emit(raw)
+        while len(pending) > MAX_LINE_BYTES:
+            # 超长的行分段输出，避免无换行的输出无限累积
+            emit(pending[:MAX_LINE_BYTES])
+            pending = pending[MAX_LINE_BYTES:]
+    if pending:
+        emit(pending)
+
+
+async def run_process(
+    command: List[str],
+    timeout: Optional[float] = None,
+    cwd: Optional[str] = None,
+    env: Optional[Dict[str, str]] = None,
+    on_event: Optional[ProgressCallback] = None,
+    output_limit: int = DEFAULT_OUTPUT_LIMIT
+) -> Dict:
+    """
+    执行子进程并实时读取输出
+
+    Args:
+        command: 命令
+        timeout: 超时时间（秒），None 表示不限制；超时后结束整个进程组
+        cwd: 工作目录
+        env: 环境变量（None 时继承当前进程）
+        on_event: 进度回调，每行输出调用一次
+        output_limit: 每个流保留的最大输出字节数
+
+    Returns:
+        {"returncode", "stdout", "stderr", "timed_out", "elapsed", "pid",
+         "stdout_dropped_bytes", "stderr_dropped_bytes"}；超时时 returncode 为进程被结束后的返回码
+
+    Raises:
+        FileNotFoundError: 命令不存在
+        asyncio.CancelledError: 调用方取消（进程组已被结束）
+    """
+    started = time.monotonic()
+    # 新建进程组，便于超时或取消时连同子进程一起结束
+    if sys.platform == "win32":
+        group_kwargs = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        group_kwargs = {"start_new_session": True}
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=cwd,
+        env=env,
+        **group_kwargs
+    )
+    stdout = _BoundedLines(output_limit)
+    stderr = _BoundedLines(output_limit)
+    readers = asyncio.gather(
+        _pump(process.stdout, STREAM_STDOUT, stdout, started, on_event),
+        _pump(process.stderr, STREAM_STDERR, stderr, started, on_event),
+    )
+
+    async def finish():
+        await readers
+        await process.wait()
+
+    finished = asyncio.ensure_future(finish())
+    timed_out = False
+    try:
+        try:
+            await asyncio.wait_for(asyncio.shield(finished), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            print(f"[子进程] 超时（{timeout}s），结束进程组 {process.pid}")
+            await _terminate(process)
+            # 进程组结束后管道关闭，读取随之结束；脱离进程组的子进程仍持有管道时不再等待
+            try:
+                await asyncio.wait_for(asyncio.shield(finished), KILL_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                finished.cancel()
+                readers.cancel()
+    except asyncio.CancelledError:
+        print(f"[子进程] 任务被取消，结束进程组 {process.pid}")
+        await asyncio.shield(_terminate(process))
+        finished.cancel()
+        readers.cancel()
+        raise
+    return {
+        "returncode": process.returncode,
+        "stdout": stdout.text(),
+        "stderr": stderr.text(),
+        "timed_out": timed_out,
+        "elapsed": round(time.monotonic() - started, 3),
+        "pid": process.pid,
+        "stdout_dropped_bytes": stdout.dropped_bytes,
+        "stderr_dropped_bytes": stderr.dropped_bytes,
+    }
@@ -0,0 +1,98 @@
+"""
+两阶段检索的分数校准
+
+小模型（bge-small）与大模型（bge-large）的余弦相似度不在同一尺度上，而相似度阈值按大模型标定。
+这里用大模型重打分时得到的（小模型分数, 大模型分数）对，在线拟合线性映射（最小二乘），
+把小模型分数换算到大模型尺度，并估计换算的残差标准差：
+- 样本不足时不做换算，调用方应始终用大模型重打分
+- 判断分数是否落在阈值附近时，应把残差计入分差
+"""
+import math
+import threading
+from typing import Iterable, Optional
+
+import config
+
+# 开始使用校准前至少需要的（小模型分数, 大模型分数）样本数
+TWO_STAGE_CALIBRATION_SAMPLES = int(config.config_dict.get("TWO_STAGE_CALIBRATION_SAMPLES", "50"))
+
+
+class ScoreCalibration:
+    """小模型分数 -> 大模型分数的线性校准"""
+
+    def __init__(self, min_samples: int = TWO_STAGE_CALIBRATION_SAMPLES):
+        """
+        Args:
+            min_samples: 开始使用校准前至少需要的样本数
+        """
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._count = 0
+        self._sum_x = 0.0
+        self._sum_y = 0.0
+        self._sum_xx = 0.0
+        self._sum_xy = 0.0
+        self._sum_yy = 0.0
+
+    def observe(self, small_scores: Iterable[float], large_scores: Iterable[float]):
+        """记录同一批候选的小模型分数与大模型分数"""
+        with self._lock:
+            for x, y in zip(small_scores, large_scores):
+                self._count += 1
+                self._sum_x += x
+                self._sum_y += y
+                self._sum_xx += x * x
+                self._sum_xy += x * y
+                self._sum_yy += y * y
+
+    def _fit(self) -> Optional[tuple]:
+        """拟合结果 (斜率, 截距, 残差标准差)，样本不足或无法拟合时返回 None（持有锁时调用）"""
+        n = self._count
+        if n < self.min_samples:
+            return None
+        var_x = self._sum_xx / n - (self._sum_x / n) ** 2
+        if var_x <= 1e-12:
+            return None
+        cov = self._sum_xy / n - (self._sum_x / n) * (self._sum_y / n)
+        var_y = self._sum_yy / n - (self._sum_y / n) ** 2
+        slope = cov / var_x
+        if slope <= 0:
+            # 两个模型的排序不一致，换算没有意义
+            return None
+        intercept = self._sum_y / n - slope * self._sum_x / n
+        residual = math.sqrt(max(var_y - slope * cov, 0.0))
+        return slope, intercept, residual
+
+    def calibrate(self, small_score: float) -> Optional[float]:
+        """
+        把小模型分数换算到大模型尺度
+
+        Returns:
+            换算后的分数，尚未校准时返回 None
+        """
+        with self._lock:
+            fit = self._fit()
+        if fit is None:
+            return None
+        slope, intercept, _ = fit
+        return slope * small_score + intercept
+
+    @property
+    def residual(self) -> float:
+        """换算的残差标准差（尚未校准时为 0）"""
+        with self._lock:
+            fit = self._fit()
+        return 0.0 if fit is None else fit[2]
+
+    def metrics(self) -> dict:
+        """样本数与拟合结果"""
+        with self._lock:
+            fit = self._fit()
+            count = self._count
+        return {
+            "samples": count,
+            "ready": fit is not None,
+            "slope": None if fit is None else round(fit[0], 4),
+            "intercept": None if fit is None else round(fit[1], 4),
+            "residual": None if fit is None else round(fit[2], 4),
+        }
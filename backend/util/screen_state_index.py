@@ -0,0 +1,385 @@
+"""
+画面状态图索引
+
+在成千上万次执行中，智能体反复看到同样的应用画面，但除了推理知识库中的文本之外什么也没有记住。
+这里按感知哈希（64 位 pHash）把执行前后的截图聚类为画面状态，并记录状态转移（状态, 步骤, 下一状态）及成功/失败次数：
+- 按当前截图快速定位状态：哈希分为 4 段，汉明距离小于段数时至少有一段完全相同（鸽巢原理），
+  只需比较在某一段上相同的候选状态，不必遍历所有状态
+- 拆解任务与优化步骤时，给出从当前画面出发、已经成功执行过的步骤路径
+- 执行步骤前，如果当前画面已经是该步骤成功执行后到达的状态，直接跳过，省去 UI-TARS 与 LLM 调用
+索引保存在本机的 JSON 文件中：状态数超过上限时淘汰最久未出现的状态及其转移，
+写入按时间间隔合并（任务结束与进程退出时调用 flush 写入剩余的变更）。
+"""
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+import config
+from util.json_store import load_json, atomic_write_json
+from util.perceptual_hash import phash, hamming_distance
+from util.step_text import normalize_step
+
+# 是否启用画面状态索引
+SCREEN_STATE_INDEX_ENABLED = config.config_dict.get("SCREEN_STATE_INDEX_ENABLED", "false").lower() in ("1", "true", "yes")
+# 索引文件路径
+SCREEN_STATE_INDEX_PATH = config.config_dict.get("SCREEN_STATE_INDEX_PATH", "screen_states.json")
+# 归入同一状态的最大汉明距离（小于 4 时使用分段索引查找，否则遍历所有状态）
+SCREEN_STATE_MAX_DISTANCE = int(config.config_dict.get("SCREEN_STATE_MAX_DISTANCE", "3"))
+# 状态转移至少成功该次数后，才用于推荐路径与跳过已到达的步骤
+SCREEN_STATE_MIN_SUCCESSES = int(config.config_dict.get("SCREEN_STATE_MIN_SUCCESSES", "2"))
+# 执行步骤前当前画面已经是该步骤的目标状态时，是否直接跳过该步骤（外观相似的页面如列表的不同页会被误判，默认关闭）
+SCREEN_STATE_SKIP_REACHED = config.config_dict.get("SCREEN_STATE_SKIP_REACHED", "false").lower() in ("1", "true", "yes")
+# 最多保留的状态数（超过时淘汰最久未出现的 10% 状态及其转移）
+SCREEN_STATE_MAX_STATES = int(config.config_dict.get("SCREEN_STATE_MAX_STATES", "5000"))
+# 两次写入索引文件的最短间隔（秒）
+SCREEN_STATE_SAVE_INTERVAL = float(config.config_dict.get("SCREEN_STATE_SAVE_INTERVAL", "30"))
+
+# 64 位哈希（16 个十六进制字符）分为 4 段
+_BANDS = 4
+_BAND_CHARS = 16 // _BANDS
+
+
+def _bands(screen_hash: str) -> List[Tuple[int, str]]:
+    """哈希的各段（段号, 段值）"""
+    return [(band, screen_hash[band * _BAND_CHARS:(band + 1) * _BAND_CHARS]) for band in range(_BANDS)]
+
+
+class ScreenStateIndex:
+    """画面状态图索引"""
+
+    def __init__(
+        self,
+        path: str = SCREEN_STATE_INDEX_PATH,
+        max_distance: int = SCREEN_STATE_MAX_DISTANCE,
+        min_successes: int = SCREEN_STATE_MIN_SUCCESSES,
+        max_states: int = SCREEN_STATE_MAX_STATES,
+        save_interval: float = SCREEN_STATE_SAVE_INTERVAL
+    ):
+        """
+        Args:
+            path: 索引文件路径
+            max_distance: 归入同一状态的最大汉明距离
+            min_successes: 用于推荐路径与跳过步骤的最少成功次数
+            max_states: 最多保留的状态数
+            save_interval: 两次写入索引文件的最短间隔（秒）
+        """
+        self.path = path
+        self.max_distance = max_distance
+        self.min_successes = min_successes
+        self.max_states = max_states
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        # 写入文件的锁与版本号（快照在 _lock 内生成、在锁外写入，避免旧快照覆盖新快照）
+        self._save_lock = threading.Lock()
+        self._version = 0
+        self._saved_version = 0
+        self._saved_at = time.monotonic()
+        self._loaded = False
+        # 状态 ID -> {"id", "hash", "frames", "created_at", "last_seen_at"}
+        self._states: Dict[int, dict] = {}
+        # (段号, 段值) -> 状态 ID 集合
+        self._band_index: Dict[Tuple[int, str], Set[int]] = defaultdict(set)
+        # (起始状态, 规范化的步骤文本, 到达状态) -> {"from", "step_key", "step", "to", "successes", "failures", "last_at"}
+        self._transitions: Dict[Tuple[int, str, int], dict] = {}
+        self._outgoing: Dict[int, List[dict]] = defaultdict(list)
+        self._by_step: Dict[str, List[dict]] = defaultdict(list)
+        self.lookups = 0
+        self.lookup_hits = 0
+        self.lookup_ms = 0.0
+        self.skipped_steps = 0
+        self.evicted_states = 0
+
+    def _load(self):
+        """首次使用时加载索引文件（持有锁时调用）"""
+        if self._loaded:
+            return
+        self._loaded = True
+        data = load_json(self.path, {})
+        for state in data.get("states", []):
+            self._add_state(state)
+        for transition in data.get("transitions", []):
+            self._add_transition(transition)
+
+    def _snapshot(self) -> Tuple[int, dict]:
+        """当前索引的副本与版本号（持有锁时调用）"""
+        return self._version, {
+            "states": [dict(state) for state in self._states.values()],
+            "transitions": [dict(transition) for transition in self._transitions.values()],
+        }
+
+    def _write(self, version: int, data: dict):
+        """原子写入索引文件（不持有 _lock；比已写入版本旧的快照直接丢弃）"""
+        with self._save_lock:
+            if version <= self._saved_version:
+                return
+            atomic_write_json(self.path, data)
+            self._saved_version = version
+
+    def flush(self):
+        """写入尚未保存的变更（任务结束、进程退出时调用）"""
+        with self._lock:
+            if not self._loaded or self._version <= self._saved_version:
+                return
+            self._saved_at = time.monotonic()
+            version, data = self._snapshot()
+        self._write(version, data)
+
+    def _add_state(self, state: dict):
+        self._states[state["id"]] = state
+        for band in _bands(state["hash"]):
+            self._band_index[band].add(state["id"])
+
+    def _add_transition(self, transition: dict):
+        self._transitions[(transition["from"], transition["step_key"], transition["to"])] = transition
+        self._outgoing[transition["from"]].append(transition)
+        self._by_step[transition["step_key"]].append(transition)
+
+    def _candidates(self, screen_hash: str) -> Set[int]:
+        """可能在汉明距离阈值内的状态"""
+        if self.max_distance >= _BANDS:
+            return set(self._states)
+        candidates: Set[int] = set()
+        for band in _bands(screen_hash):
+            candidates |= self._band_index.get(band, set())
+        return candidates
+
+    def _locate(self, screen_hash: str) -> Tuple[Optional[int], Optional[int]]:
+        """按哈希查找最接近的状态，返回 (状态 ID, 汉明距离)；超过阈值时状态 ID 为 None（持有锁时调用）"""
+        started = time.perf_counter()
+        self._load()
+        best, best_distance = None, None
+        for state_id in self._candidates(screen_hash):
+            distance = hamming_distance(self._states[state_id]["hash"], screen_hash)
+            if best_distance is None or distance < best_distance:
+                best, best_distance = state_id, distance
+        self.lookups += 1
+        self.lookup_ms += (time.perf_counter() - started) * 1000
+        if best is None or best_distance > self.max_distance:
+            return None, best_distance
+        self.lookup_hits += 1
+        return best, best_distance
+
+    def _evict(self, keep: Set[int]):
+        """状态数超过上限时淘汰最久未出现的 10% 状态及相关的转移（持有锁时调用）"""
+        if self.max_states <= 0 or len(self._states) <= self.max_states:
+            return
+        candidates = sorted(
+            (state for state in self._states.values() if state["id"] not in keep),
+            key=lambda state: state["last_seen_at"]
+        )
+        evicted = {state["id"] for state in candidates[:max(1, len(self._states) - self.max_states + self.max_states // 10)]}
+        for state_id in evicted:
+            state = self._states.pop(state_id)
+            for band in _bands(state["hash"]):
+                ids = self._band_index.get(band)
+                if ids is not None:
+                    ids.discard(state_id)
+                    if not ids:
+                        del self._band_index[band]
+        transitions = [
+            transition for transition in self._transitions.values()
+            if transition["from"] not in evicted and transition["to"] not in evicted
+        ]
+        self._transitions = {}
+        self._outgoing = defaultdict(list)
+        self._by_step = defaultdict(list)
+        for transition in transitions:
+            self._add_transition(transition)
+        self.evicted_states += len(evicted)
+        print(f"[画面状态索引] 状态数超过 {self.max_states}，已淘汰 {len(evicted)} 个最久未出现的状态")
+
+    def _assign(self, screen_hash: str, keep: Set[int] = frozenset()) -> int:
+        """把画面归入最接近的状态，没有时新建状态（持有锁时调用）"""
+        state_id, _ = self._locate(screen_hash)
+        now = time.time()
+        if state_id is None:
+            state_id = max(self._states, default=0) + 1
+            self._add_state({"id": state_id, "hash": screen_hash, "frames": 0, "created_at": now, "last_seen_at": now})
+            self._evict(set(keep) | {state_id})
+        state = self._states[state_id]
+        state["frames"] += 1
+        state["last_seen_at"] = now
+        return state_id
+
+    def locate(self, image: bytes) -> Optional[int]:
+        """
+        按截图查找画面状态
+
+        Args:
+            image: 截图字节数据
+
+        Returns:
+            状态 ID，没有匹配的状态时返回 None
+        """
+        screen_hash = phash(image)
+        with self._lock:
+            return self._locate(screen_hash)[0]
+
+    def record_transition(self, step: str, before_image: bytes, after_image: bytes, success: bool) -> dict:
+        """
+        记录一次步骤执行的状态转移
+
+        Args:
+            step: 步骤文本
+            before_image: 执行前的截图
+            after_image: 执行后的截图
+            success: 步骤是否验证通过
+
+        Returns:
+            状态转移记录
+        """
+        before_hash, after_hash = phash(before_image), phash(after_image)
+        step_key = normalize_step(step)
+        with self._lock:
+            before_state = self._assign(before_hash)
+            after_state = self._assign(after_hash, keep={before_state})
+            key = (before_state, step_key, after_state)
+            transition = self._transitions.get(key)
+            if transition is None:
+                transition = {"from": before_state, "step_key": step_key, "step": step, "to": after_state, "successes": 0, "failures": 0}
+                self._add_transition(transition)
+            transition["successes" if success else "failures"] += 1
+            transition["step"] = step
+            transition["last_at"] = time.time()
+            self._version += 1
+            snapshot = None
+            if time.monotonic() - self._saved_at >= self.save_interval:
+                self._saved_at = time.monotonic()
+                snapshot = self._snapshot()
+            result = dict(transition)
+        if snapshot is not None:
+            self._write(*snapshot)
+        return result
+
+    def _proven(self, transition: dict) -> bool:
+        """成功次数足够、多于失败次数且确实改变了画面的转移"""
+        return (
+            transition["successes"] >= self.min_successes
+            and transition["successes"] > transition["failures"]
+            and transition["from"] != transition["to"]
+        )
+
+    def reached_target(self, step: str, image: bytes) -> Optional[dict]:
+        """
+        判断当前画面是否已经是该步骤成功执行后到达的状态
+
+        Args:
+            step: 步骤文本
+            image: 执行前的截图
+
+        Returns:
+            已到达时返回 {"state", "distance", "successes", "reason"}，否则返回 None
+        """
+        screen_hash = phash(image)
+        step_key = normalize_step(step)
+        with self._lock:
+            state_id, distance = self._locate(screen_hash)
+            if state_id is None:
+                return None
+            targets = [
+                transition for transition in self._by_step.get(step_key, [])
+                if transition["to"] == state_id and self._proven(transition)
+            ]
+            # 该步骤在当前状态上执行过并到达了其它状态（如“下一页”），说明仍需执行
+            leaves = any(
+                transition["step_key"] == step_key and self._proven(transition)
+                for transition in self._outgoing.get(state_id, [])
+            )
+            if not targets or leaves:
+                return None
+            self.skipped_steps += 1
+            successes = sum(transition["successes"] for transition in targets)
+            return {
+                "state": state_id,
+                "distance": distance,
+                "successes": successes,
+                "reason": f"当前画面已是该步骤成功执行后的状态 {state_id}（汉明距离 {distance}，成功 {successes} 次），跳过执行",
+            }
+
+    def proven_paths(self, image: bytes, max_paths: int = 3, max_length: int = 5) -> List[dict]:
+        """
+        从当前画面出发、已经成功执行过的步骤路径
+
+        以成功次数最多的若干条出边为起点，每一步沿成功次数最多的出边延伸（不重复经过同一状态）。
+
+        Args:
+            image: 当前截图
+            max_paths: 最多返回的路径数
+            max_length: 单条路径的最大步数
+
+        Returns:
+            [{"steps": [步骤文本, ...], "states": [状态 ID, ...], "successes": 路径上最少的成功次数}]
+        """
+        screen_hash = phash(image)
+        with self._lock:
+            state_id, _ = self._locate(screen_hash)
+            if state_id is None:
+                return []
+
+            def best_outgoing(state: int, visited: Set[int]) -> List[dict]:
+                candidates = [
+                    transition for transition in self._outgoing.get(state, [])
+                    if self._proven(transition) and transition["to"] not in visited
+                ]
+                return sorted(candidates, key=lambda transition: transition["successes"], reverse=True)
+
+            paths = []
+            for first in best_outgoing(state_id, {state_id})[:max_paths]:
+                visited = {state_id, first["to"]}
+                path = [first]
+                while len(path) < max_length:
+                    following = best_outgoing(path[-1]["to"], visited)
+                    if not following:
+                        break
+                    path.append(following[0])
+                    visited.add(following[0]["to"])
+                paths.append({
+                    "steps": [transition["step"] for transition in path],
+                    "states": [state_id] + [transition["to"] for transition in path],
+                    "successes": min(transition["successes"] for transition in path),
+                })
+            return paths
+
+    def status(self) -> dict:
+        """
+        获取索引状态
+
+        Returns:
+            状态数、转移数、查找次数与命中率、平均查找耗时、跳过的步骤数
+        """
+        with self._lock:
+            self._load()
+            return {
+                "enabled": SCREEN_STATE_INDEX_ENABLED,
+                "states": len(self._states),
+                "transitions": len(self._transitions),
+                "proven_transitions": sum(1 for transition in self._transitions.values() if self._proven(transition)),
+                "lookups": self.lookups,
+                "lookup_hit_rate": round(self.lookup_hits / self.lookups, 3) if self.lookups else None,
+                "avg_lookup_ms": round(self.lookup_ms / self.lookups, 3) if self.lookups else None,
+                "skipped_steps": self.skipped_steps,
+                "evicted_states": self.evicted_states,
+                "unsaved_changes": self._version - self._saved_version,
+            }
+
+
+def format_proven_paths(paths: List[dict]) -> str:
+    """把已验证的路径格式化为提示词中的文本"""
+    lines = []
+    for index, path in enumerate(paths, start=1):
+        steps = " -> ".join(path["steps"])
+        lines.append(f"{index}. {steps}（至少成功 {path['successes']} 次）")
+    return "\n".join(lines)
+
+
+# 全局画面状态索引实例
+_screen_state_index: ScreenStateIndex = None
+
+
+def get_screen_state_index() -> ScreenStateIndex:
+    """获取全局画面状态索引实例（单例模式）"""
+    global _screen_state_index
+    if _screen_state_index is None:
+        _screen_state_index = ScreenStateIndex()
+    return _screen_state_index
@@ -0,0 +1,302 @@
+"""
+截图归档
+
+执行节点的截图按内容哈希去重后追加写入按天、按进程划分的打包文件（<日期>.<进程号>.pack），
+每帧在索引文件（<日期>.<进程号>.idx）中记录一条定长记录：哈希、在打包文件中的偏移和长度。
+帧 ID 即内容哈希，写入 step_results，失败的任务可以事后按 ID 取回截图。
+
+- 同一画面（如上一步执行后 = 下一步执行前）只存一份，写入只是一次追加，不产生小文件
+- 先写数据再写索引，进程中途退出时只会留下没有索引的数据，不会出现指向不完整数据的索引
+- 每个进程（多个 uvicorn worker）只追加自己的文件，偏移不会被其它进程的写入打乱；
+  查找不到帧时增量读取各索引文件新增的记录，其它进程写入的帧也能取回
+- 读取通过 mmap 打包文件完成，按块返回，不把整个文件读入内存
+- 按天分文件，超过保留天数的文件在换天时删除
+"""
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional, Tuple
+
+import config
+
+# 是否归档执行节点的截图
+SCREENSHOT_ARCHIVE_ENABLED = config.config_dict.get("SCREENSHOT_ARCHIVE_ENABLED", "false").lower() in ("1", "true", "yes")
+# 归档目录
+SCREENSHOT_ARCHIVE_DIR = config.config_dict.get("SCREENSHOT_ARCHIVE_DIR", "screenshot_archive")
+# 归档保留天数（0 表示不清理）
+SCREENSHOT_ARCHIVE_MAX_DAYS = int(config.config_dict.get("SCREENSHOT_ARCHIVE_MAX_DAYS", "7"))
+
+PACK_SUFFIX = ".pack"
+INDEX_SUFFIX = ".idx"
+# 帧 ID 使用的哈希长度（字节），十六进制表示为 32 个字符
+_DIGEST_SIZE = 16
+# 索引记录: 哈希(16) + 偏移(8) + 长度(4)，大端序
+_INDEX_RECORD = struct.Struct(">16sQI")
+# 流式读取的块大小
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def frame_id_of(image_bytes: bytes) -> str:
+    """计算帧 ID（内容哈希的十六进制表示）"""
+    return hashlib.blake2b(image_bytes, digest_size=_DIGEST_SIZE).hexdigest()
+
+
+class ScreenshotArchive:
+    """内容寻址的截图归档（线程安全）"""
+
+    def __init__(self, root: str = SCREENSHOT_ARCHIVE_DIR, max_days: int = SCREENSHOT_ARCHIVE_MAX_DAYS):
+        """
+        Args:
+            root: 归档目录
+            max_days: 保留天数（0 表示不清理）
+        """
+        self.root = root
+        self.max_days = max_days
+        # 帧 ID -> (文件名前缀, 偏移, 长度)，首次使用时从全部索引文件加载
+        self._index: Optional[Dict[str, Tuple[str, int, int]]] = None
+        # 索引文件名前缀 -> 已读取的字节数（增量读取其它进程新写入的记录）
+        self._index_read: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # 当天本进程打开的打包文件与索引文件（追加写），文件名前缀为 <日期>.<进程号>
+        self._day: Optional[str] = None
+        self._stem: Optional[str] = None
+        self._pack_file = None
+        self._index_file = None
+        # 文件名前缀 -> 打包文件的只读 mmap（文件增长后按需重新映射）
+        self._mmaps: Dict[str, mmap.mmap] = {}
+        self.stored_frames = 0
+        self.deduplicated_frames = 0
+        self.stored_bytes = 0
+
+    def _path(self, stem: str, suffix: str) -> str:
+        return os.path.join(self.root, stem + suffix)
+
+    def _read_new_records(self) -> int:
+        """增量读取各索引文件新增的完整记录（调用方需持有锁），返回新增的帧数"""
+        added = 0
+        if not os.path.isdir(self.root):
+            return added
+        for name in sorted(os.listdir(self.root)):
+            if not name.endswith(INDEX_SUFFIX):
+                continue
+            stem = name[:-len(INDEX_SUFFIX)]
+            start = self._index_read.get(stem, 0)
+            pack_path = self._path(stem, PACK_SUFFIX)
+            pack_size = os.path.getsize(pack_path) if os.path.exists(pack_path) else 0
+            try:
+                with open(os.path.join(self.root, name), "rb") as f:
+                    f.seek(start)
+                    data = f.read()
+            except OSError:
+                continue
+            # 末尾不完整的记录（其它进程正在写入）留到下次读取；超出打包文件的记录（写入中途退出）忽略
+            usable = len(data) - len(data) % _INDEX_RECORD.size
+            for digest, offset, length in _INDEX_RECORD.iter_unpack(data[:usable]):
+                if offset + length <= pack_size and digest.hex() not in self._index:
+                    self._index[digest.hex()] = (stem, offset, length)
+                    added += 1
+            self._index_read[stem] = start + usable
+        return added
+
+    def _load_index(self) -> Dict[str, Tuple[str, int, int]]:
+        """加载全部索引文件（调用方需持有锁）"""
+        if self._index is None:
+            self._index = {}
+            self._read_new_records()
+            print(f"[截图归档] 已加载索引: {len(self._index)} 帧")
+        return self._index
+
+    def _lookup(self, frame_id: str) -> Optional[Tuple[str, int, int]]:
+        """查找帧；找不到时增量读取其它进程新写入的索引记录后再查一次（调用方需持有锁）"""
+        frame_id = frame_id.lower()
+        location = self._load_index().get(frame_id)
+        if location is None and self._read_new_records():
+            location = self._index.get(frame_id)
+        return location
+
+    def _prune(self, today: str):
+        """删除超过保留天数的打包文件与索引文件（调用方需持有锁）"""
+        if self.max_days <= 0 or not os.path.isdir(self.root):
+            return
+        cutoff = (datetime.strptime(today, "%Y%m%d") - timedelta(days=self.max_days)).strftime("%Y%m%d")
+        expired = set()
+        for name in os.listdir(self.root):
+            stem, suffix = os.path.splitext(name)
+            if suffix in (PACK_SUFFIX, INDEX_SUFFIX) and stem[:8].isdigit() and stem[:8] < cutoff:
+                try:
+                    os.remove(os.path.join(self.root, name))
+                    expired.add(stem)
+                except OSError as e:
+                    print(f"[截图归档] 删除过期文件失败: {name}: {str(e)}")
+        if not expired:
+            return
+        for stem in expired:
+            self._index_read.pop(stem, None)
+            mapped = self._mmaps.pop(stem, None)
+            if mapped is not None:
+                try:
+                    mapped.close()
+                except BufferError:
+                    pass
+        if self._index is not None:
+            self._index = {frame_id: location for frame_id, location in self._index.items() if location[0] not in expired}
+        print(f"[截图归档] 已删除 {self.max_days} 天前的归档文件: {len(expired)} 组")
+
+    def _open_day(self, day: str):
+        """切换到指定日期的本进程打包文件，并清理过期文件（调用方需持有锁）"""
+        if self._day == day:
+            return
+        self._close_files()
+        os.makedirs(self.root, exist_ok=True)
+        self._prune(day)
+        stem = f"{day}.{os.getpid()}"
+        self._pack_file = open(self._path(stem, PACK_SUFFIX), "ab")
+        self._index_file = open(self._path(stem, INDEX_SUFFIX), "ab")
+        self._day = day
+        self._stem = stem
+
+    def _close_files(self):
+        for f in (self._pack_file, self._index_file):
+            if f is not None:
+                f.close()
+        self._pack_file = None
+        self._index_file = None
+        self._day = None
+        self._stem = None
+
+    def put(self, image_bytes: bytes, frame_id: Optional[str] = None) -> str:
+        """
+        归档一帧截图（内容相同的帧只存一份）
+
+        Args:
+            image_bytes: 图片字节数据
+            frame_id: 已计算好的帧 ID（如图片句柄的内容哈希），为 None 时计算
+
+        Returns:
+            帧 ID
+        """
+        frame_id = frame_id or frame_id_of(image_bytes)
+        with self._lock:
+            index = self._load_index()
+            if frame_id in index:
+                self.deduplicated_frames += 1
+                return frame_id
+            self._open_day(datetime.now().strftime("%Y%m%d"))
+            # 只有本进程追加该文件，文件末尾即偏移
+            offset = self._pack_file.tell()
+            self._pack_file.write(image_bytes)
+            self._pack_file.flush()
+            self._index_file.write(_INDEX_RECORD.pack(bytes.fromhex(frame_id), offset, len(image_bytes)))
+            self._index_file.flush()
+            index[frame_id] = (self._stem, offset, len(image_bytes))
+            self.stored_frames += 1
+            self.stored_bytes += len(image_bytes)
+        return frame_id
+
+    def locate(self, frame_id: str) -> Optional[Tuple[str, int, int]]:
+        """
+        查找帧所在位置
+
+        Returns:
+            (文件名前缀, 偏移, 长度)；帧不存在时返回 None
+        """
+        with self._lock:
+            return self._lookup(frame_id)
+
+    def _mapped(self, stem: str, end: int) -> mmap.mmap:
+        """获取覆盖到 end 字节的打包文件 mmap（调用方需持有锁）"""
+        mapped = self._mmaps.get(stem)
+        if mapped is None or len(mapped) < end:
+            with open(self._path(stem, PACK_SUFFIX), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # 旧的映射可能仍被正在进行的读取引用，交给垃圾回收释放
+            self._mmaps[stem] = mapped
+        return mapped
+
+    def read(self, frame_id: str) -> Optional[bytes]:
+        """
+        读取一帧截图
+
+        Returns:
+            图片字节数据；帧不存在时返回 None
+        """
+        chunks = self.iter_chunks(frame_id)
+        return None if chunks is None else b"".join(chunks)
+
+    def iter_chunks(self, frame_id: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Optional[Iterator[bytes]]:
+        """
+        按块读取一帧截图（mmap 读取，用于流式响应）
+
+        Args:
+            frame_id: 帧 ID
+            chunk_size: 块大小
+
+        Returns:
+            字节块迭代器；帧不存在时返回 None
+        """
+        with self._lock:
+            location = self._lookup(frame_id)
+            if location is None:
+                return None
+            stem, offset, length = location
+            mapped = self._mapped(stem, offset + length)
+
+        def chunks() -> Iterator[bytes]:
+            for start in range(offset, offset + length, chunk_size):
+                yield mapped[start:min(start + chunk_size, offset + length)]
+
+        return chunks()
+
+    def header(self, frame_id: str, size: int = 16) -> Optional[bytes]:
+        """读取帧的前 size 个字节（用于判断图片格式）"""
+        with self._lock:
+            location = self._lookup(frame_id)
+            if location is None:
+                return None
+            stem, offset, length = location
+            return self._mapped(stem, offset + length)[offset:offset + min(size, length)]
+
+    def status(self) -> dict:
+        """
+        获取归档状态
+
+        Returns:
+            归档目录、保留天数、索引帧数与本进程写入/去重的帧数和字节数
+        """
+        with self._lock:
+            indexed = len(self._index) if self._index is not None else None
+        return {
+            "enabled": SCREENSHOT_ARCHIVE_ENABLED,
+            "root": os.path.abspath(self.root),
+            "max_days": self.max_days,
+            "indexed_frames": indexed,
+            "stored_frames": self.stored_frames,
+            "deduplicated_frames": self.deduplicated_frames,
+            "stored_bytes": self.stored_bytes,
+        }
+
+    def close(self):
+        """关闭打开的文件与 mmap"""
+        with self._lock:
+            self._close_files()
+            for mapped in self._mmaps.values():
+                try:
+                    mapped.close()
+                except BufferError:
+                    pass
+            self._mmaps.clear()
+
+
+# 全局截图归档实例
+_screenshot_archive: ScreenshotArchive = None
+
+
+def get_screenshot_archive() -> ScreenshotArchive:
+    """获取全局截图归档实例（单例模式）"""
+    global _screenshot_archive
+    if _screenshot_archive is None:
+        _screenshot_archive = ScreenshotArchive()
+    return _screenshot_archive
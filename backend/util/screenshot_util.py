@@ -1,11 +1,15 @@
 """
 截图工具类
-支持全屏截图和区域截图
+支持全屏截图和区域截图，以及在专用线程池中执行的异步截图（capture_async）
 """
 import os
 import io
 import math
-from typing import Optional, Tuple
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 from pathlib import Path
 
@@ -21,18 +25,362 @@ try:
 except ImportError:
     MSS_AVAILABLE = False
 
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJSAMP_420
+    TURBOJPEG_AVAILABLE = True
+except ImportError:
+    TURBOJPEG_AVAILABLE = False
+
+import config
+
 # 参考 UI-TARS-desktop 的压缩参数
 IMAGE_FACTOR = 28
-# MAX_PIXELS_V1_0 = 2700 * IMAGE_FACTOR * IMAGE_FACTOR = 2,116,800
-# MAX_PIXELS_V1_5 = 16384 * IMAGE_FACTOR * IMAGE_FACTOR = 12,845,056
-# MAX_PIXELS_DOUBAO = 5120 * IMAGE_FACTOR * IMAGE_FACTOR = 4,014,080
+MAX_PIXELS_V1_0 = 2700 * IMAGE_FACTOR * IMAGE_FACTOR  # 2,116,800
+MAX_PIXELS_V1_5 = 16384 * IMAGE_FACTOR * IMAGE_FACTOR  # 12,845,056
+MAX_PIXELS_DOUBAO = 5120 * IMAGE_FACTOR * IMAGE_FACTOR  # 4,014,080
 # 默认使用 V1_0 的压缩比例
-DEFAULT_MAX_PIXELS = 2700 * IMAGE_FACTOR * IMAGE_FACTOR  # 2,116,800
+DEFAULT_MAX_PIXELS = MAX_PIXELS_V1_0
+# smart_resize 的最小像素数
+MIN_PIXELS = 100 * IMAGE_FACTOR * IMAGE_FACTOR
+
+# JPEG 质量 40: 约 134 KB，质量 35: 约 103 KB
+DEFAULT_JPEG_QUALITY = 40
+
+# JPEG 编码后端: auto（有 libjpeg-turbo 时优先使用）/ turbojpeg / pil
+SCREENSHOT_JPEG_ENCODER = config.config_dict.get("SCREENSHOT_JPEG_ENCODER", "auto").lower()
+
+# Xvfb -fbdir 帧缓冲文件（或目录）；配置后直接 mmap 读取屏幕像素，未配置或不可用时使用 mss
+SCREENSHOT_XWD_PATH = config.config_dict.get("SCREENSHOT_XWD_PATH", "")
+# 是否可以使用截图句柄（ScreenGrabber）
+GRABBER_AVAILABLE = MSS_AVAILABLE or bool(SCREENSHOT_XWD_PATH)
+
+# 异步截图线程池大小与单次截图超时时间（秒）
+SCREENSHOT_POOL_SIZE = int(config.config_dict.get("SCREENSHOT_POOL_SIZE", "2"))
+SCREENSHOT_TIMEOUT = float(config.config_dict.get("SCREENSHOT_TIMEOUT", "10"))
+
+_turbojpeg = None
+
+
+def _get_turbojpeg(encoder: str = SCREENSHOT_JPEG_ENCODER):
+    """获取 libjpeg-turbo 编码器（首次调用时创建；未启用或动态库不可用时返回 None）"""
+    global _turbojpeg
+    if encoder not in ("auto", "turbojpeg") or not TURBOJPEG_AVAILABLE:
+        return None
+    if _turbojpeg is None:
+        try:
+            _turbojpeg = TurboJPEG()
+        except Exception as e:
+            print(f"[截图工具] libjpeg-turbo 不可用，使用 PIL 编码: {str(e)}")
+            _turbojpeg = False
+    return _turbojpeg or None
+
+
+class ScreenGrabber:
+    """
+    长生命周期的截图句柄（每个线程一个）
+    
+    复用同一个 mss 实例（X 显示连接、共享内存段），并缓存主显示器的几何信息，
+    避免每次截图都重新建立连接。mss 实例不能跨线程使用，请通过 get_screen_grabber() 获取当前线程的实例。
+    配置了 SCREENSHOT_XWD_PATH 时，grab_image / grab_pixels 直接读取 mmap 映射的 Xvfb 帧缓冲。
+    """
+    
+    def __init__(self, xwd_path: str = SCREENSHOT_XWD_PATH):
+        """
+        Args:
+            xwd_path: Xvfb 帧缓冲文件（或 -fbdir 目录），为空时只使用 mss
+        """
+        self.xwd_path = xwd_path
+        self._sct = None
+        self._xwd = None
+        self._xwd_failed = False
+        self._monitor: Optional[dict] = None
+        self._users = 0
+        self.open_count = 0
+        self.capture_count = 0
+    
+    @property
+    def is_open(self) -> bool:
+        """是否持有 mss 实例或帧缓冲映射"""
+        return self._sct is not None or self._xwd is not None
+    
+    @property
+    def backend(self) -> str:
+        """当前截图后端（xwd / mss）"""
+        return "xwd" if self._xwd is not None else "mss"
+    
+    def open(self) -> "ScreenGrabber":
+        """打开帧缓冲映射（已配置时）或 mss 实例，并缓存显示器几何信息（已打开时无副作用）"""
+        if self._xwd is None and self.xwd_path and not self._xwd_failed:
+            try:
+                from util.xwd_framebuffer import XwdFramebuffer
+                self._xwd = XwdFramebuffer(self.xwd_path)
+                width, height = self._xwd.size
+                self._monitor = {"left": 0, "top": 0, "width": width, "height": height}
+                self.open_count += 1
+                print(f"[截图工具] 使用 Xvfb 帧缓冲截图: {self._xwd.path}（{width}x{height}，{self._xwd.channel_order}）")
+            except Exception as e:
+                # 只尝试一次，refresh() 时重新尝试
+                self._xwd_failed = True
+                print(f"[截图工具] 无法读取 Xvfb 帧缓冲，使用 mss 截图: {str(e)}")
+        if self._xwd is None:
+            self._open_mss()
+        return self
+    
+    def _open_mss(self):
+        """打开 mss 实例（已打开时无副作用）"""
+        if self._sct is None:
+            self._sct = mss.mss()
+            if self._xwd is None:
+                self._monitor = dict(self._sct.monitors[1])  # 0 是所有显示器，1 是主显示器
+            self.open_count += 1
+    
+    def close(self):
+        """关闭 mss 实例与帧缓冲映射，下次截图时自动重新打开"""
+        if self._sct is not None:
+            try:
+                self._sct.close()
+            except Exception as e:
+                print(f"[截图工具] 关闭截图句柄失败: {str(e)}")
+            self._sct = None
+        if self._xwd is not None:
+            self._xwd.close()
+            self._xwd = None
+        self._monitor = None
+    
+    def refresh(self):
+        """重新读取显示器几何信息（分辨率或显示器变化、Xvfb 重启后调用）"""
+        self.close()
+        self._xwd_failed = False
+        self.open()
+    
+    def acquire(self) -> "ScreenGrabber":
+        """任务开始时调用：打开句柄并增加引用计数"""
+        self._users += 1
+        return self.open()
+    
+    def release(self):
+        """任务结束时调用：减少引用计数，没有任务使用时关闭句柄"""
+        self._users = max(0, self._users - 1)
+        if self._users == 0:
+            self.close()
+    
+    @property
+    def monitor(self) -> dict:
+        """主显示器几何信息 {"left", "top", "width", "height"}"""
+        self.open()
+        return self._monitor
+    
+    def screen_size(self) -> Tuple[int, int]:
+        """主显示器尺寸 (width, height)"""
+        monitor = self.monitor
+        return monitor["width"], monitor["height"]
+    
+    def grab(self, region: Optional[Tuple[int, int, int, int]] = None):
+        """
+        截图并返回 mss 的原始截图对象（BGRA 缓冲区）
+        
+        Args:
+            region: 截图区域 (x, y, width, height)，如果为 None 则截取主显示器
+        """
+        self.open()
+        self._open_mss()
+        if region:
+            x, y, width, height = region
+            monitor = {"top": y, "left": x, "width": width, "height": height}
+        else:
+            monitor = self._monitor
+        try:
+            screenshot = self._sct.grab(monitor)
+        except Exception as e:
+            # 连接失效（如显示服务重启）时重建句柄并重试一次
+            print(f"[截图工具] 截图失败，重建截图句柄后重试: {str(e)}")
+            self.refresh()
+            self._open_mss()
+            if not region:
+                monitor = self._monitor
+            screenshot = self._sct.grab(monitor)
+        self.capture_count += 1
+        return screenshot
+    
+    def grab_image(self, region: Optional[Tuple[int, int, int, int]] = None) -> "Image.Image":
+        """截图并直接从原始像素缓冲区（帧缓冲映射或 mss 的 BGRA 缓冲区）构建 RGB 图片"""
+        self.open()
+        if self._xwd is not None:
+            import numpy as np
+            pixels = np.ascontiguousarray(self._xwd.view(region))
+            self.capture_count += 1
+            return Image.frombuffer(
+                "RGB", (pixels.shape[1], pixels.shape[0]), pixels, "raw", self._xwd.channel_order, 0, 1
+            )
+        screenshot = self.grab(region)
+        return Image.frombuffer("RGB", screenshot.size, screenshot.bgra, "raw", "BGRX", 0, 1)
+    
+    def grab_pixels(self, region: Optional[Tuple[int, int, int, int]] = None):
+        """
+        截图并返回三通道像素数组，用于帧差异计算等不关心通道顺序的场景
+        
+        使用帧缓冲映射时返回 mmap 上的视图（不拷贝）。
+        
+        Returns:
+            np.ndarray: (H, W, 3) 的 uint8 数组，通道顺序为 BGR 或 RGB
+        """
+        import numpy as np
+        self.open()
+        if self._xwd is not None:
+            view = self._xwd.view(region)
+            self.capture_count += 1
+            return view[..., 1:] if self._xwd.channel_order.startswith("X") else view[..., :3]
+        screenshot = self.grab(region)
+        width, height = screenshot.size
+        return np.frombuffer(screenshot.bgra, dtype=np.uint8).reshape(height, width, 4)[..., :3]
+
+
+_grabber_local = threading.local()
+
+
+def get_screen_grabber() -> ScreenGrabber:
+    """获取当前线程的截图句柄（首次调用时创建）"""
+    grabber = getattr(_grabber_local, "grabber", None)
+    if grabber is None:
+        grabber = ScreenGrabber()
+        _grabber_local.grabber = grabber
+    return grabber
+
+
+def open_screen_grabber() -> Optional[ScreenGrabber]:
+    """
+    任务开始时的生命周期钩子：在当前线程打开截图句柄
+    
+    Returns:
+        截图句柄；mss 不可用时返回 None
+    """
+    if not GRABBER_AVAILABLE:
+        return None
+    try:
+        return get_screen_grabber().acquire()
+    except Exception as e:
+        # 没有图形环境时不影响任务执行，截图时再报错
+        print(f"[截图工具] 打开截图句柄失败: {str(e)}")
+        return None
+
+
+def close_screen_grabber():
+    """任务结束时的生命周期钩子：释放当前线程的截图句柄"""
+    grabber = getattr(_grabber_local, "grabber", None)
+    if grabber is not None:
+        grabber.release()
+
+
+def smart_resize(width: int, height: int, factor: int = IMAGE_FACTOR,
+                 min_pixels: int = MIN_PIXELS, max_pixels: int = MAX_PIXELS_V1_5) -> Tuple[int, int]:
+    """
+    计算模型视觉编码器实际使用的图片尺寸（与 UI-TARS SDK / Qwen2-VL 的 smart_resize 一致）
+
+    宽高各自取整到 factor 的倍数，总像素数不超过 max_pixels、不低于 min_pixels，宽高比基本保持不变。
+    UI-TARS 1.5 输出的像素坐标基于该尺寸。
+
+    Returns:
+        (宽, 高)
+    """
+    width_bar = max(factor, round(width / factor) * factor)
+    height_bar = max(factor, round(height / factor) * factor)
+    if width_bar * height_bar > max_pixels:
+        beta = math.sqrt(width * height / max_pixels)
+        width_bar = max(factor, math.floor(width / beta / factor) * factor)
+        height_bar = max(factor, math.floor(height / beta / factor) * factor)
+    elif width_bar * height_bar < min_pixels:
+        beta = math.sqrt(min_pixels / (width * height))
+        width_bar = math.ceil(width * beta / factor) * factor
+        height_bar = math.ceil(height * beta / factor) * factor
+    return width_bar, height_bar
 
 
 class ScreenshotUtil:
     """截图工具类"""
     
+    @staticmethod
+    def _encode_image(image: "Image.Image", max_pixels: int = DEFAULT_MAX_PIXELS,
+                      quality: int = DEFAULT_JPEG_QUALITY,
+                      encoder: str = SCREENSHOT_JPEG_ENCODER) -> bytes:
+        """
+        缩放并编码图片（只编码一次，不经过 PNG 中转）
+        
+        Args:
+            image: PIL 图片对象
+            max_pixels: 最大像素数，超过此值将进行缩放
+            quality: JPEG 质量
+            encoder: JPEG 编码后端（auto / turbojpeg / pil）
+            
+        Returns:
+            bytes: JPEG 格式字节数据
+        """
+        image = ScreenshotUtil._fit_image(image, max_pixels)
+        return ScreenshotUtil._encode_jpeg(image, quality, encoder)
+    
+    @staticmethod
+    def _fit_image(image: "Image.Image", max_pixels: int = DEFAULT_MAX_PIXELS) -> "Image.Image":
+        """
+        按最大像素数等比缩放，并转换为 RGB 模式
+        
+        Args:
+            image: PIL 图片对象
+            max_pixels: 最大像素数，超过此值将进行缩放
+            
+        Returns:
+            Image.Image: RGB 图片
+        """
+        width, height = image.size
+        current_pixels = width * height
+        
+        # 如果像素数超过限制，进行缩放
+        if current_pixels > max_pixels:
+            resize_factor = math.sqrt(max_pixels / current_pixels)
+            new_width = int(width * resize_factor)
+            new_height = int(height * resize_factor)
+            
+            # 使用高质量重采样算法；reducing_gap 先做整数倍快速缩小再 LANCZOS，4K 下明显更快
+            image = image.resize((new_width, new_height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        
+        # 如果图片是 RGBA 模式（带透明度），需要转换为 RGB 模式才能保存为 JPEG
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # 创建白色背景
+            rgb_image = Image.new('RGB', image.size, (255, 255, 255))
+            if image.mode == 'P':
+                image = image.convert('RGBA')
+            rgb_image.paste(image, mask=image.split()[-1] if image.mode in ('RGBA', 'LA') else None)
+            image = rgb_image
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        return image
+    
+    @staticmethod
+    def _encode_jpeg(image: "Image.Image", quality: int = DEFAULT_JPEG_QUALITY,
+                     encoder: str = SCREENSHOT_JPEG_ENCODER) -> bytes:
+        """
+        把 RGB 图片编码为 JPEG（不缩放）
+        
+        Args:
+            image: RGB 图片
+            quality: JPEG 质量
+            encoder: JPEG 编码后端（auto / turbojpeg / pil）
+            
+        Returns:
+            bytes: JPEG 格式字节数据
+        """
+        turbojpeg = _get_turbojpeg(encoder)
+        if turbojpeg is not None:
+            import numpy as np
+            return turbojpeg.encode(
+                np.asarray(image),
+                quality=quality,
+                pixel_format=TJPF_RGB,
+                jpeg_subsample=TJSAMP_420
+            )
+        
+        img_bytes = io.BytesIO()
+        image.save(img_bytes, format='JPEG', quality=quality, optimize=True)
+        return img_bytes.getvalue()
+    
     @staticmethod
     def _compress_image(image_bytes: bytes, max_pixels: int = DEFAULT_MAX_PIXELS) -> bytes:
         """
@@ -53,37 +401,7 @@ class ScreenshotUtil:
         try:
             # 从字节数据创建图片对象
             image = Image.open(io.BytesIO(image_bytes))
-            width, height = image.size
-            current_pixels = width * height
-            
-            # 如果像素数超过限制，进行缩放
-            if current_pixels > max_pixels:
-                resize_factor = math.sqrt(max_pixels / current_pixels)
-                new_width = int(width * resize_factor)
-                new_height = int(height * resize_factor)
-                
-                # 使用高质量重采样算法
-                image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            # 如果图片是 RGBA 模式（带透明度），需要转换为 RGB 模式才能保存为 JPEG
-            if image.mode in ('RGBA', 'LA', 'P'):
-                # 创建白色背景
-                rgb_image = Image.new('RGB', image.size, (255, 255, 255))
-                if image.mode == 'P':
-                    image = image.convert('RGBA')
-                rgb_image.paste(image, mask=image.split()[-1] if image.mode in ('RGBA', 'LA') else None)
-                image = rgb_image
-            elif image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # 转换为 JPEG 字节数据
-            # JPEG 质量范围 0-100，设置为 40 以控制文件大小在 150KB 左右
-            # 质量 40: 约 134 KB，质量 35: 约 103 KB
-            img_bytes = io.BytesIO()
-            image.save(img_bytes, format='JPEG', quality=40, optimize=True)
-            img_bytes.seek(0)
-            
-            return img_bytes.read()
+            return ScreenshotUtil._encode_image(image, max_pixels)
         except Exception as e:
             # 如果压缩失败，返回原始数据
             print(f"[截图工具] 图片压缩失败: {str(e)}，返回原始数据")
@@ -122,35 +440,22 @@ class ScreenshotUtil:
     def _capture_with_mss(output_path: Optional[str] = None,
                           region: Optional[Tuple[int, int, int, int]] = None) -> str:
         """使用 mss 库截图"""
-        with mss.mss() as sct:
-            if region:
-                x, y, width, height = region
-                monitor = {
-                    "top": y,
-                    "left": x,
-                    "width": width,
-                    "height": height
-                }
-            else:
-                # 获取主显示器
-                monitor = sct.monitors[1]  # 0 是所有显示器，1 是主显示器
-            
-            # 截图
-            screenshot = sct.grab(monitor)
-            
-            # 生成输出路径
-            if output_path is None:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                output_path = f"screenshot_{timestamp}.png"
-            
-            # 确保输出目录存在
-            output_dir = os.path.dirname(output_path) if os.path.dirname(output_path) else "."
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # 保存截图
-            mss.tools.to_png(screenshot.rgb, screenshot.size, output=output_path)
-            
-            return os.path.abspath(output_path)
+        # 截图（复用当前线程的截图句柄）
+        screenshot = get_screen_grabber().grab(region)
+        
+        # 生成输出路径
+        if output_path is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_path = f"screenshot_{timestamp}.png"
+        
+        # 确保输出目录存在
+        output_dir = os.path.dirname(output_path) if os.path.dirname(output_path) else "."
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # 保存截图
+        mss.tools.to_png(screenshot.rgb, screenshot.size, output=output_path)
+        
+        return os.path.abspath(output_path)
     
     @staticmethod
     def _capture_with_pil(output_path: Optional[str] = None,
@@ -216,6 +521,8 @@ class ScreenshotUtil:
         """
         截取屏幕并返回字节数据（不保存文件，自动压缩）
         
+        直接从截图库的原始像素缓冲区构建图片，缩放后只编码一次 JPEG，不经过 PNG 编解码。
+        
         Args:
             region: 截图区域 (x, y, width, height)，如果为 None 则截取全屏
             max_pixels: 最大像素数，超过此值将进行缩放（默认使用 V1_0 的压缩比例）
@@ -226,12 +533,10 @@ class ScreenshotUtil:
         Raises:
             RuntimeError: 如果没有可用的截图库
         """
-        # 先获取原始截图
-        if MSS_AVAILABLE:
-            raw_bytes = ScreenshotUtil._capture_bytes_with_mss_raw(region)
-        elif PIL_AVAILABLE:
-            raw_bytes = ScreenshotUtil._capture_bytes_with_pil_raw(region)
-        else:
+        if not PIL_AVAILABLE:
+            # 没有 PIL 时无法缩放和编码 JPEG，返回 mss 生成的 PNG
+            if MSS_AVAILABLE:
+                return ScreenshotUtil._capture_bytes_with_mss_raw(region)
             raise RuntimeError(
                 "未找到可用的截图库。请安装 mss 或 Pillow：\n"
                 "  pip install mss\n"
@@ -239,8 +544,53 @@ class ScreenshotUtil:
                 "  pip install Pillow"
             )
         
-        # 压缩图片
-        return ScreenshotUtil._compress_image(raw_bytes, max_pixels)
+        return ScreenshotUtil._capture_bytes_timed(region, max_pixels)[0]
+    
+    @staticmethod
+    def _capture_bytes_timed(region: Optional[Tuple[int, int, int, int]] = None,
+                             max_pixels: int = DEFAULT_MAX_PIXELS,
+                             cancelled: Optional[threading.Event] = None,
+                             submitted_at: Optional[float] = None) -> Tuple[bytes, Dict[str, float]]:
+        """
+        截图、缩放、编码，并记录每个阶段的耗时
+        
+        Args:
+            region: 截图区域 (x, y, width, height)，如果为 None 则截取全屏
+            max_pixels: 最大像素数
+            cancelled: 取消标记，阶段之间检查，已取消时不再继续
+            submitted_at: 提交到线程池的时间（time.perf_counter()），用于统计排队耗时
+        
+        Returns:
+            (JPEG 字节数据, 各阶段耗时 {"queue_ms", "grab_ms", "resize_ms", "encode_ms", "total_ms"})
+        
+        Raises:
+            CaptureCancelled: 截图已被取消
+        """
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+        if submitted_at is not None:
+            timings["queue_ms"] = round((started - submitted_at) * 1000, 1)
+        
+        def check_cancelled():
+            if cancelled is not None and cancelled.is_set():
+                raise CaptureCancelled("截图已取消")
+        
+        check_cancelled()
+        phase_started = time.perf_counter()
+        image = ScreenshotUtil.capture_screen_image(region)
+        timings["grab_ms"] = round((time.perf_counter() - phase_started) * 1000, 1)
+        
+        check_cancelled()
+        phase_started = time.perf_counter()
+        image = ScreenshotUtil._fit_image(image, max_pixels)
+        timings["resize_ms"] = round((time.perf_counter() - phase_started) * 1000, 1)
+        
+        check_cancelled()
+        phase_started = time.perf_counter()
+        data = ScreenshotUtil._encode_jpeg(image)
+        timings["encode_ms"] = round((time.perf_counter() - phase_started) * 1000, 1)
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return data, timings
     
     
     @staticmethod
@@ -254,11 +604,31 @@ class ScreenshotUtil:
         Returns:
             bytes: 压缩后的 JPEG 格式字节数据（质量40，约150KB）
         """
-        # 先获取原始截图
-        if MSS_AVAILABLE:
-            raw_bytes = ScreenshotUtil._capture_bytes_with_mss_raw(region=None)
+        return ScreenshotUtil.capture_screen_bytes(region=None, max_pixels=max_pixels)
+    
+    @staticmethod
+    def capture_screen_image(region: Optional[Tuple[int, int, int, int]] = None) -> "Image.Image":
+        """
+        截取屏幕并返回 PIL 图片对象（RGB，未缩放）
+        
+        Args:
+            region: 截图区域 (x, y, width, height)，如果为 None 则截取全屏
+        
+        Returns:
+            Image.Image: 截图
+        
+        Raises:
+            RuntimeError: 如果没有可用的截图库
+        """
+        if GRABBER_AVAILABLE and PIL_AVAILABLE:
+            return ScreenshotUtil._capture_image_with_mss(region)
         elif PIL_AVAILABLE:
-            raw_bytes = ScreenshotUtil._capture_bytes_with_pil_raw(region=None)
+            if region:
+                x, y, width, height = region
+                bbox = (x, y, x + width, y + height)
+            else:
+                bbox = None
+            return ImageGrab.grab(bbox=bbox).convert('RGB')
         else:
             raise RuntimeError(
                 "未找到可用的截图库。请安装 mss 或 Pillow：\n"
@@ -266,27 +636,17 @@ class ScreenshotUtil:
                 "  或\n"
                 "  pip install Pillow"
             )
-        
-        # 压缩图片
-        return ScreenshotUtil._compress_image(raw_bytes, max_pixels)
+    
+    @staticmethod
+    def _capture_image_with_mss(region: Optional[Tuple[int, int, int, int]] = None) -> "Image.Image":
+        """使用当前线程的截图句柄截图（mss 或 Xvfb 帧缓冲），直接从原始缓冲区构建 RGB 图片"""
+        return get_screen_grabber().grab_image(region)
     
     @staticmethod
     def _capture_bytes_with_mss_raw(region: Optional[Tuple[int, int, int, int]] = None) -> bytes:
         """使用 mss 库截图并返回原始字节数据（未压缩）"""
-        with mss.mss() as sct:
-            if region:
-                x, y, width, height = region
-                monitor = {
-                    "top": y,
-                    "left": x,
-                    "width": width,
-                    "height": height
-                }
-            else:
-                monitor = sct.monitors[1]
-            
-            screenshot = sct.grab(monitor)
-            return mss.tools.to_png(screenshot.rgb, screenshot.size)
+        screenshot = get_screen_grabber().grab(region)
+        return mss.tools.to_png(screenshot.rgb, screenshot.size)
     
     @staticmethod
     def _capture_bytes_with_pil_raw(region: Optional[Tuple[int, int, int, int]] = None) -> bytes:
@@ -311,10 +671,9 @@ class ScreenshotUtil:
         Returns:
             Tuple[int, int]: (width, height)
         """
-        if MSS_AVAILABLE:
-            with mss.mss() as sct:
-                monitor = sct.monitors[1]  # 主显示器
-                return monitor["width"], monitor["height"]
+        if GRABBER_AVAILABLE:
+            # 使用缓存的主显示器几何信息
+            return get_screen_grabber().screen_size()
         elif PIL_AVAILABLE:
             screenshot = ImageGrab.grab()
             return screenshot.size
@@ -326,3 +685,129 @@ class ScreenshotUtil:
                 "  pip install Pillow"
             )
 
+
+
+class CaptureCancelled(Exception):
+    """截图在完成前被取消（超时或调用方取消）"""
+
+
+_capture_pool: Optional[ThreadPoolExecutor] = None
+# 当前线程池各线程打开的截图句柄（线程池关闭时统一释放）
+_capture_pool_grabbers: List[ScreenGrabber] = []
+# 正在执行的任务数（没有任务使用时关闭线程池）
+_capture_pool_users = 0
+_capture_pool_lock = threading.Lock()
+
+
+def _open_pool_grabber(grabbers: List[ScreenGrabber]):
+    """截图线程池的线程初始化：打开该线程的截图句柄，并登记到所属线程池"""
+    grabber = open_screen_grabber()
+    if grabber is not None:
+        grabbers.append(grabber)
+
+
+def _get_capture_pool() -> ThreadPoolExecutor:
+    """获取截图专用线程池（首次调用时创建；每个线程在启动时打开自己的截图句柄）"""
+    global _capture_pool, _capture_pool_grabbers
+    with _capture_pool_lock:
+        if _capture_pool is None:
+            _capture_pool_grabbers = []
+            _capture_pool = ThreadPoolExecutor(
+                max_workers=SCREENSHOT_POOL_SIZE,
+                thread_name_prefix="screenshot",
+                initializer=_open_pool_grabber,
+                initargs=(_capture_pool_grabbers,)
+            )
+        return _capture_pool
+
+
+def acquire_capture_pool():
+    """任务开始时的生命周期钩子：创建截图线程池并增加引用计数（任务期间复用池中线程的截图句柄）"""
+    global _capture_pool_users
+    with _capture_pool_lock:
+        _capture_pool_users += 1
+    _get_capture_pool()
+
+
+def release_capture_pool():
+    """任务结束时的生命周期钩子：减少引用计数，没有任务使用时关闭线程池并释放截图句柄"""
+    global _capture_pool_users
+    with _capture_pool_lock:
+        _capture_pool_users = max(0, _capture_pool_users - 1)
+        # 计数归零时在同一把锁内摘下线程池，之后开始的任务会创建新的线程池，不会拿到即将关闭的旧线程池
+        detached = _detach_capture_pool() if _capture_pool_users == 0 else (None, [])
+    _close_capture_pool(*detached)
+
+
+async def capture_async(region: Optional[Tuple[int, int, int, int]] = None,
+                        max_pixels: int = DEFAULT_MAX_PIXELS,
+                        timeout: Optional[float] = SCREENSHOT_TIMEOUT) -> Tuple[bytes, Dict[str, float]]:
+    """
+    在专用线程池中截图，不阻塞事件循环
+    
+    超时或调用方取消时，尚未开始的截图直接从队列中移除，已开始的截图在下一个阶段前停止。
+    
+    Args:
+        region: 截图区域 (x, y, width, height)，如果为 None 则截取全屏
+        max_pixels: 最大像素数
+        timeout: 超时时间（秒），None 表示不限制
+    
+    Returns:
+        (JPEG 字节数据, 各阶段耗时 {"queue_ms", "grab_ms", "resize_ms", "encode_ms", "total_ms"})
+    
+    Raises:
+        TimeoutError: 截图超时
+        asyncio.CancelledError: 调用方取消
+    """
+    cancelled = threading.Event()
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(
+        _get_capture_pool(),
+        ScreenshotUtil._capture_bytes_timed,
+        region,
+        max_pixels,
+        cancelled,
+        time.perf_counter()
+    )
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        cancelled.set()
+        raise TimeoutError(f"截图超时（{timeout}s）")
+    except asyncio.CancelledError:
+        cancelled.set()
+        raise
+
+
+async def run_in_capture_pool(func, *args):
+    """在截图专用线程池中执行同步函数（使用池中线程自己的截图句柄，不阻塞事件循环）"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_capture_pool(), func, *args)
+
+
+def shutdown_capture_pool():
+    """
+    关闭截图专用线程池并释放各线程的截图句柄（最后一个任务结束时、进程退出前调用）
+
+    排队中的截图直接取消，等待进行中的截图完成后再关闭句柄（mss 实例不能在使用中的线程之外关闭）。
+    """
+    with _capture_pool_lock:
+        detached = _detach_capture_pool()
+    _close_capture_pool(*detached)
+
+
+def _detach_capture_pool() -> Tuple[Optional[ThreadPoolExecutor], List[ScreenGrabber]]:
+    """摘下当前线程池及其截图句柄（持有 _capture_pool_lock 时调用）"""
+    global _capture_pool, _capture_pool_grabbers
+    pool, grabbers = _capture_pool, _capture_pool_grabbers
+    _capture_pool, _capture_pool_grabbers = None, []
+    return pool, grabbers
+
+
+def _close_capture_pool(pool: Optional[ThreadPoolExecutor], grabbers: List[ScreenGrabber]):
+    """关闭已摘下的线程池并释放截图句柄（不持有锁，等待进行中的截图完成）"""
+    if pool is None:
+        return
+    pool.shutdown(wait=True, cancel_futures=True)
+    for grabber in grabbers:
+        grabber.release()
@@ -0,0 +1,141 @@
+"""
+画面稳定检测
+
+UI-TARS 执行结束后，动画或加载中的画面仍可能在变化，立即截图会让 AnalyzeStep 误判。
+这里轮询低分辨率灰度帧，用 NumPy 计算帧间差异，画面在稳定窗口内保持不变后再截图，超时则直接返回。
+"""
+import asyncio
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+import config
+from util.screenshot_util import GRABBER_AVAILABLE, get_screen_grabber, run_in_capture_pool
+from util.capture_service import get_capture_service
+from util.frame_diff import gray_thumbnail, changed_ratio
+
+# 是否在动作结束后等待画面稳定
+SCREEN_SETTLE_ENABLED = config.config_dict.get("SCREEN_SETTLE_ENABLED", "true").lower() in ("1", "true", "yes")
+# 画面保持不变多久（秒）视为稳定
+SCREEN_SETTLE_WINDOW = float(config.config_dict.get("SCREEN_SETTLE_WINDOW", "0.5"))
+# 最长等待时间（秒）
+SCREEN_SETTLE_TIMEOUT = float(config.config_dict.get("SCREEN_SETTLE_TIMEOUT", "5"))
+# 轮询间隔（秒）
+SCREEN_SETTLE_POLL_INTERVAL = float(config.config_dict.get("SCREEN_SETTLE_POLL_INTERVAL", "0.1"))
+# 与上一帧相比变化的像素比例不超过该值视为没有变化
+SCREEN_SETTLE_THRESHOLD = float(config.config_dict.get("SCREEN_SETTLE_THRESHOLD", "0.001"))
+
+
+class ScreenSettleDetector:
+    """画面稳定检测器"""
+
+    def __init__(
+        self,
+        stable_window: float = SCREEN_SETTLE_WINDOW,
+        timeout: float = SCREEN_SETTLE_TIMEOUT,
+        poll_interval: float = SCREEN_SETTLE_POLL_INTERVAL,
+        threshold: float = SCREEN_SETTLE_THRESHOLD
+    ):
+        """
+        初始化检测器
+
+        Args:
+            stable_window: 画面保持不变多久（秒）视为稳定
+            timeout: 最长等待时间（秒）
+            poll_interval: 轮询间隔（秒）
+            threshold: 变化像素比例阈值
+        """
+        self.stable_window = stable_window
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.threshold = threshold
+
+    def _poll(self, last_seq: Optional[int]) -> Tuple[Optional[np.ndarray], float, Optional[int]]:
+        """
+        获取一帧低分辨率灰度图
+
+        后台截图服务运行时直接读取缓冲区中的最新帧，否则用当前线程的截图句柄截图。
+        全分辨率截图与缩略图计算都是同步的，由 wait_for_settle 放到截图专用线程池中执行。
+
+        Returns:
+            (灰度图, 截图时间, 帧序号)；截图服务没有新帧时灰度图为 None
+        """
+        service = get_capture_service()
+        if service.running:
+            frame = service.latest()
+            if frame is not None:
+                if frame.seq == last_seq:
+                    return None, frame.timestamp, frame.seq
+                return gray_thumbnail(frame.pixels), frame.timestamp, frame.seq
+        timestamp = time.time()
+        return gray_thumbnail(get_screen_grabber().grab_pixels()), timestamp, None
+
+    async def wait_for_settle(self) -> dict:
+        """
+        等待画面稳定
+
+        Returns:
+            {"settled": 是否在超时前稳定, "settle_seconds": 等待耗时, "polls": 轮询次数,
+             "last_changed_ratio": 最后一次帧间变化比例, "error": 截图失败原因}
+        """
+        started = time.monotonic()
+        started_at = time.time()
+        previous: Optional[np.ndarray] = None
+        stable_since: Optional[float] = None
+        last_seq: Optional[int] = None
+        last_ratio: Optional[float] = None
+        polls = 0
+        settled = False
+        error = None
+
+        if not GRABBER_AVAILABLE and not get_capture_service().running:
+            error = "没有可用的截图库"
+        while error is None:
+            try:
+                thumbnail, timestamp, last_seq = await run_in_capture_pool(self._poll, last_seq)
+            except Exception as e:
+                error = str(e)
+                break
+            if thumbnail is not None:
+                polls += 1
+                if previous is None:
+                    stable_since = max(timestamp, started_at)
+                else:
+                    last_ratio = changed_ratio(previous, thumbnail)
+                    if last_ratio > self.threshold:
+                        stable_since = timestamp
+                previous = thumbnail
+                if polls > 1 and timestamp - stable_since >= self.stable_window:
+                    settled = True
+                    break
+            if time.monotonic() - started >= self.timeout:
+                break
+            await asyncio.sleep(self.poll_interval)
+
+        result = {
+            "settled": settled,
+            "settle_seconds": round(time.monotonic() - started, 3),
+            "polls": polls,
+            "last_changed_ratio": None if last_ratio is None else round(last_ratio, 5),
+        }
+        if error is not None:
+            result["error"] = error
+            print(f"[画面稳定检测] 截图失败，跳过等待: {error}")
+        elif settled:
+            print(f"[画面稳定检测] 画面已稳定，等待 {result['settle_seconds']}s（轮询 {polls} 次）")
+        else:
+            print(f"[画面稳定检测] 等待画面稳定超时（{self.timeout}s），最后一次变化比例: {result['last_changed_ratio']}")
+        return result
+
+
+# 全局检测器实例
+_settle_detector: ScreenSettleDetector = None
+
+
+def get_settle_detector() -> ScreenSettleDetector:
+    """获取全局画面稳定检测器实例（单例模式）"""
+    global _settle_detector
+    if _settle_detector is None:
+        _settle_detector = ScreenSettleDetector()
+    return _settle_detector
@@ -0,0 +1,16 @@
+"""
+步骤文本规范化
+
+动作回放缓存、验证缓存与画面状态索引都以步骤文本为键，同一步骤的大小写、空白与首尾标点差异不应产生不同的键。
+步骤中间的标点保留：输入值、数字与引号中的内容（如 "1.50" 与 "150"）必须产生不同的键。
+"""
+import re
+
+_WHITESPACE = re.compile(r"\s+")
+# 首尾的空白与标点（如句末的句号、编号后的冒号）
+_EDGE_PUNCTUATION = "，。、；：！？,.;:!? \t"
+
+
+def normalize_step(step: str) -> str:
+    """规范化步骤文本：忽略大小写，合并连续空白，去掉首尾的标点"""
+    return _WHITESPACE.sub(" ", step.lower()).strip(_EDGE_PUNCTUATION)
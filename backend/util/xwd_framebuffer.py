@@ -0,0 +1,118 @@
+"""
+Xvfb 帧缓冲读取
+
+Xvfb 以 `-fbdir <目录>` 启动时会把屏幕帧缓冲以 XWD 格式写入 `<目录>/Xvfb_screen0` 并 mmap 共享。
+直接 mmap 该文件即可得到屏幕像素的 NumPy 视图，截图不需要经过 X 协议，也没有额外拷贝。
+
+用法:
+    Xvfb :99 -screen 0 1920x1080x24 -fbdir /tmp/xvfb
+    SCREENSHOT_XWD_PATH=/tmp/xvfb/Xvfb_screen0
+"""
+import mmap
+import os
+import struct
+from typing import Optional, Tuple
+
+import numpy as np
+
+# XWD 文件头的 25 个 32 位字段（大端序，Xvfb 写入时统一转换为大端）
+_HEADER_FIELDS = (
+    "header_size", "file_version", "pixmap_format", "pixmap_depth", "pixmap_width", "pixmap_height",
+    "xoffset", "byte_order", "bitmap_unit", "bitmap_bit_order", "bitmap_pad", "bits_per_pixel",
+    "bytes_per_line", "visual_class", "red_mask", "green_mask", "blue_mask", "bits_per_rgb",
+    "colormap_entries", "ncolors", "window_width", "window_height", "window_x", "window_y",
+    "window_bdrwidth",
+)
+_HEADER_STRUCT = struct.Struct(">25I")
+# 每个颜色表项的字节数（XWDColor）
+_XWD_COLOR_SIZE = 12
+# Xvfb 默认的帧缓冲文件名
+XVFB_SCREEN_FILE = "Xvfb_screen0"
+
+
+class XwdFramebuffer:
+    """mmap 映射的 XWD 帧缓冲（只读）"""
+
+    def __init__(self, path: str):
+        """
+        打开帧缓冲文件
+
+        Args:
+            path: XWD 文件路径，或 Xvfb -fbdir 指定的目录（自动使用 Xvfb_screen0）
+
+        Raises:
+            ValueError: 文件格式不支持（仅支持 32 位 TrueColor 帧缓冲）
+        """
+        if os.path.isdir(path):
+            path = os.path.join(path, XVFB_SCREEN_FILE)
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.header = dict(zip(_HEADER_FIELDS, _HEADER_STRUCT.unpack_from(self._mmap, 0)))
+            self.channel_order = self._channel_order()
+            width = self.header["pixmap_width"]
+            height = self.header["pixmap_height"]
+            bytes_per_line = self.header["bytes_per_line"]
+            offset = self.header["header_size"] + self.header["ncolors"] * _XWD_COLOR_SIZE
+            if offset + bytes_per_line * height > len(self._mmap):
+                raise ValueError(f"帧缓冲文件不完整: {path}")
+            # (height, bytes_per_line / 4, 4) 的只读视图，截掉每行末尾的填充
+            rows = np.ndarray(
+                shape=(height, bytes_per_line // 4, 4),
+                dtype=np.uint8,
+                buffer=self._mmap,
+                offset=offset,
+            )
+            self.pixels = rows[:, :width, :]
+        except Exception:
+            self.close()
+            raise
+
+    def _channel_order(self) -> str:
+        """根据像素格式确定每个像素 4 个字节的通道顺序（BGRX 或 RGBX）"""
+        header = self.header
+        if header["bits_per_pixel"] != 32:
+            raise ValueError(f"不支持的 XWD 像素位数: {header['bits_per_pixel']}（需要 32 位，Xvfb 请使用 24 位色深）")
+        masks = (header["red_mask"], header["green_mask"], header["blue_mask"])
+        little_endian = header["byte_order"] == 0  # LSBFirst
+        if masks == (0xFF0000, 0x00FF00, 0x0000FF):
+            return "BGRX" if little_endian else "XRGB"
+        if masks == (0x0000FF, 0x00FF00, 0xFF0000):
+            return "RGBX" if little_endian else "XBGR"
+        raise ValueError(f"不支持的 XWD 颜色掩码: {[hex(mask) for mask in masks]}")
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """屏幕尺寸 (width, height)"""
+        return self.header["pixmap_width"], self.header["pixmap_height"]
+
+    def view(self, region: Optional[Tuple[int, int, int, int]] = None) -> np.ndarray:
+        """
+        获取像素视图（不拷贝，Xvfb 写入时内容会随之变化）
+
+        Args:
+            region: 区域 (x, y, width, height)，为 None 时返回整个屏幕
+
+        Returns:
+            (H, W, 4) 的 uint8 数组，通道顺序见 channel_order
+        """
+        if region is None:
+            return self.pixels
+        x, y, width, height = region
+        return self.pixels[y:y + height, x:x + width, :]
+
+    def close(self):
+        """关闭 mmap 与文件"""
+        self.pixels = None
+        mapped = getattr(self, "_mmap", None)
+        if mapped is not None:
+            try:
+                mapped.close()
+            except BufferError:
+                # 仍有外部引用的视图时由垃圾回收释放
+                pass
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None